@@ -0,0 +1,130 @@
+import numpy as np
+
+from engine import NEIGHBOURHOOD
+
+
+class Adjacency:
+    """
+    This class stores who neighbours whom, built once after the persons are
+    placed. It is kept in CSR form: the neighbours of person k are
+    indices[offsets[k]:offsets[k + 1]], so iterating over them is a slice
+    lookup instead of 8 bounds checks and grid lookups.
+    """
+
+    def __init__(self, offsets, indices, items=None):
+        """
+        Adjacency constructor.
+        :param offsets: int array of n + 1 offsets into indices.
+        :param indices: int array of neighbour indices.
+        :param items: optional list of the objects the indices refer to.
+        :return: Adjacency object.
+        """
+        self.offsets = offsets
+        self.indices = indices
+        self.items = items
+
+    @classmethod
+    def from_positions(cls, i, j, shape, items=None):
+        """
+        Builds the adjacency of persons on a grid, where the neighbours of a
+        person are the persons in the 8 cells around it.
+        :param i: int array of the persons' first coordinate.
+        :param j: int array of the persons' second coordinate.
+        :param shape: grid dimensions.
+        :param items: optional list of the objects the indices refer to.
+        :return: Adjacency object.
+        """
+        i = np.asarray(i, dtype=np.int64)
+        j = np.asarray(j, dtype=np.int64)
+
+        # Index of the person in each cell, with a border of empty cells.
+        index = np.full((shape[0] + 2, shape[1] + 2), -1, dtype=np.int32)
+        index[i + 1, j + 1] = np.arange(i.size, dtype=np.int32)
+
+        neighbours = np.stack([index[i + 1 + di, j + 1 + dj] for di, dj in NEIGHBOURHOOD], axis=1)
+        present = neighbours >= 0
+        offsets = np.zeros(i.size + 1, dtype=np.int64)
+        np.cumsum(present.sum(axis=1), out=offsets[1:])
+        return cls(offsets, neighbours[present], items)
+
+    @classmethod
+    def from_cells(cls, cells, shape, items=None):
+        """
+        Builds the same adjacency as from_positions() without a grid, from the
+        persons' sorted cells, so the cost follows the number of persons and
+        not the size of the grid. The cells of a row of 3 neighbours are
+        consecutive, so one binary search per row finds the first of them, and
+        the others can only follow it.
+        :param cells: sorted int array of the persons' flat cells,
+        i * shape[1] + j.
+        :param shape: grid dimensions.
+        :param items: optional list of the objects the indices refer to.
+        :return: Adjacency object.
+        """
+        cells = np.asarray(cells, dtype=np.int64)
+        j = cells % shape[1]
+        last = max(cells.size - 1, 0)
+        index_type = np.int32 if cells.size < 1 << 31 else np.int64
+
+        # A cell outside the grid along i is outside the range of the cells,
+        # so only j needs checking.
+        inside = {-1: j > 0, 0: None, 1: j < shape[1] - 1}
+        neighbours = np.empty((cells.size, len(NEIGHBOURHOOD)), dtype=index_type)
+        column = 0
+        for di in (-1, 0, 1):
+            position = np.searchsorted(cells, cells + di * shape[1] - 1)
+            for dj in (-1, 0, 1):
+                found = np.minimum(position, last)
+                present = cells[found] == cells + di * shape[1] + dj
+                position += present
+                if di or dj:
+                    if inside[dj] is not None:
+                        present &= inside[dj]
+                    neighbours[:, column] = np.where(present, found, -1)
+                    column += 1
+        present = neighbours >= 0
+        offsets = np.zeros(cells.size + 1, dtype=np.int64)
+        np.cumsum(present.sum(axis=1), out=offsets[1:])
+        return cls(offsets, neighbours[present], items)
+
+    @property
+    def size(self):
+        """
+        Number of persons.
+        """
+        return self.offsets.size - 1
+
+    @property
+    def degree(self):
+        """
+        Number of neighbours of each person.
+        """
+        return np.diff(self.offsets)
+
+    def neighbors(self, k):
+        """
+        Returns the indices of the neighbours of person k.
+        """
+        return self.indices[self.offsets[k]:self.offsets[k + 1]]
+
+    def neighbors_of(self, k):
+        """
+        Returns the objects neighbouring person k, in the order of the grid
+        scan of Person.get_neighbors.
+        """
+        items = self.items
+        return [items[m] for m in self.indices[self.offsets[k]:self.offsets[k + 1]].tolist()]
+
+    def gather(self, persons):
+        """
+        Lists every (person, neighbour) pair for the given persons at once.
+        :param persons: int array of person indices.
+        :return: (sources, targets) -- int arrays, one entry per pair.
+        """
+        starts = self.offsets[persons]
+        counts = self.offsets[persons + 1] - starts
+        sources = np.repeat(persons, counts)
+        # Position of each pair in indices: its row's start plus its rank.
+        position = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        position += np.arange(sources.size)
+        return sources, self.indices[position]
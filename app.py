@@ -1,8 +1,12 @@
-from tkinter import Tk, LabelFrame, Label, Entry, Canvas, Button, messagebox
+from tkinter import Tk, LabelFrame, Label, Entry, Canvas, Button, Scale, filedialog, messagebox
 
 import numpy as np
 
 from automat import CellularAutomaton
+from cache import ResultCache
+from replay import DEFAULT_SPEED, Replay
+from simulation import VECTOR_ENGINE
+from trend import TrendPlot
 from style import palette, fonts
 
 
@@ -38,9 +42,9 @@ class App(Tk):
 
         # Inherit Tkinter class and configure it.
         super().__init__()
-        self.geometry('1100x650')
-        self.minsize(1100, 650)
-        self.maxsize(1100, 650)
+        self.geometry('1100x850')
+        self.minsize(1100, 850)
+        self.maxsize(1100, 850)
         self.configure(background=palette.bg, highlightcolor=palette.fg)
         self.title('Spreading Rumours')
         # close window event
@@ -57,8 +61,13 @@ class App(Tk):
             highlightbackground=palette.canvas_outline,
             width=800,
             height=600)
-        self.frame.place(relx=0.26, rely=0.015)
-        self.cellular_automaton = CellularAutomaton(self)
+        self.frame.place(relx=0.26, rely=0.0115)
+
+        # Create the chart of the run, under the grid and the replay controls.
+        self.trend = TrendPlot(self, width=800, height=180)
+        self.trend.widget.place(relx=0.26, rely=0.77)
+        self.cellular_automaton = CellularAutomaton(self, engine=VECTOR_ENGINE, cache=ResultCache())
+        self.replay = Replay(self)
 
         # Create configurations section with labels, entries and buttons.
         self.configuration = LabelFrame(
@@ -68,7 +77,7 @@ class App(Tk):
             text='Configuration',
             font=fonts.regular
         )
-        self.configuration.place(relx=0.01, rely=0.015, width=265)
+        self.configuration.place(relx=0.01, rely=0.0115, width=265)
 
         Label(
             master=self.configuration,
@@ -76,9 +85,9 @@ class App(Tk):
             bg=palette.bg,
             fg=palette.fg,
             text='Population density:'
-        ).grid(row=0, column=0, padx=5, pady=5, sticky='w')
+        ).grid(row=0, column=0, padx=5, pady=3, sticky='w')
         self.n_person = create_entry(self.configuration, '0.6')
-        self.n_person.grid(row=0, column=1, padx=5, pady=5, sticky='w')
+        self.n_person.grid(row=0, column=1, padx=5, pady=3, sticky='w')
 
         Label(
             master=self.configuration,
@@ -86,9 +95,9 @@ class App(Tk):
             bg=palette.bg,
             fg=palette.fg,
             text='L:'
-        ).grid(row=1, column=0, padx=5, pady=5, sticky='w')
+        ).grid(row=1, column=0, padx=5, pady=3, sticky='w')
         self.L = create_entry(self.configuration, '2')
-        self.L.grid(row=1, column=1, padx=5, pady=5, sticky='w')
+        self.L.grid(row=1, column=1, padx=5, pady=3, sticky='w')
 
         Label(
             master=self.configuration,
@@ -96,9 +105,9 @@ class App(Tk):
             bg=palette.bg,
             fg=palette.fg,
             text='S1:'
-        ).grid(row=2, column=0, padx=5, pady=5, sticky='w')
+        ).grid(row=2, column=0, padx=5, pady=3, sticky='w')
         self.S1 = create_entry(self.configuration, '0.3')
-        self.S1.grid(row=2, column=1, padx=5, pady=5, sticky='w')
+        self.S1.grid(row=2, column=1, padx=5, pady=3, sticky='w')
 
         Label(
             master=self.configuration,
@@ -106,9 +115,9 @@ class App(Tk):
             bg=palette.bg,
             fg=palette.fg,
             text='S2:'
-        ).grid(row=3, column=0, padx=5, pady=5, sticky='w')
+        ).grid(row=3, column=0, padx=5, pady=3, sticky='w')
         self.S2 = create_entry(self.configuration, '0.25')
-        self.S2.grid(row=3, column=1, padx=5, pady=5, sticky='w')
+        self.S2.grid(row=3, column=1, padx=5, pady=3, sticky='w')
 
         Label(
             master=self.configuration,
@@ -116,9 +125,9 @@ class App(Tk):
             bg=palette.bg,
             fg=palette.fg,
             text='S3:'
-        ).grid(row=4, column=0, padx=5, pady=5, sticky='w')
+        ).grid(row=4, column=0, padx=5, pady=3, sticky='w')
         self.S3 = create_entry(self.configuration, '0.2')
-        self.S3.grid(row=4, column=1, padx=5, pady=5, sticky='w')
+        self.S3.grid(row=4, column=1, padx=5, pady=3, sticky='w')
 
         Label(
             master=self.configuration,
@@ -126,9 +135,19 @@ class App(Tk):
             bg=palette.bg,
             fg=palette.fg,
             text='S4:'
-        ).grid(row=5, column=0, padx=5, pady=5, sticky='w')
+        ).grid(row=5, column=0, padx=5, pady=3, sticky='w')
         self.S4 = create_entry(self.configuration, '0.25')
-        self.S4.grid(row=5, column=1, padx=5, pady=5, sticky='w')
+        self.S4.grid(row=5, column=1, padx=5, pady=3, sticky='w')
+
+        Label(
+            master=self.configuration,
+            font=fonts.regular,
+            bg=palette.bg,
+            fg=palette.fg,
+            text='Grid size:'
+        ).grid(row=6, column=0, padx=5, pady=3, sticky='w')
+        self.grid_size = create_entry(self.configuration, '100x100')
+        self.grid_size.grid(row=6, column=1, padx=5, pady=3, sticky='w')
 
         Label(
             master=self.configuration,
@@ -136,9 +155,9 @@ class App(Tk):
             bg=palette.bg,
             fg=palette.fg,
             text='Generation limit (Optional):'
-        ).grid(row=7, column=0, padx=5, pady=5, sticky='w')
+        ).grid(row=7, column=0, padx=5, pady=3, sticky='w')
         self.gen_limit = create_entry(self.configuration, '')
-        self.gen_limit.grid(row=7, column=1, padx=5, pady=5, sticky='w')
+        self.gen_limit.grid(row=7, column=1, padx=5, pady=3, sticky='w')
 
         Label(
             master=self.configuration,
@@ -146,9 +165,19 @@ class App(Tk):
             bg=palette.bg,
             fg=palette.fg,
             text='Run mode:'
-        ).grid(row=8, column=0, padx=5, pady=5, sticky='w')
+        ).grid(row=8, column=0, padx=5, pady=3, sticky='w')
         self.run_mode = create_entry(self.configuration, 'R')
-        self.run_mode.grid(row=8, column=1, padx=5, pady=5, sticky='w')
+        self.run_mode.grid(row=8, column=1, padx=5, pady=3, sticky='w')
+
+        Label(
+            master=self.configuration,
+            font=fonts.regular,
+            bg=palette.bg,
+            fg=palette.fg,
+            text='Seed (Optional):'
+        ).grid(row=9, column=0, padx=5, pady=3, sticky='w')
+        self.seed = create_entry(self.configuration, '')
+        self.seed.grid(row=9, column=1, padx=5, pady=3, sticky='w')
 
         self.pause_btn = Button(
             master=self,
@@ -160,7 +189,7 @@ class App(Tk):
             text='\u23F8 Pause',
             command=self.pause_btn_action
         )
-        self.pause_btn.place(relx=0.01, rely=0.8, width=125, height=40)
+        self.pause_btn.place(relx=0.01, rely=0.75, width=125, height=40)
 
         self.stop_btn = Button(
             master=self,
@@ -172,7 +201,7 @@ class App(Tk):
             text='\u23F9 Stop',
             command=self.stop_btn_action
         )
-        self.stop_btn.place(relx=0.137, rely=0.8, width=125, height=40)
+        self.stop_btn.place(relx=0.137, rely=0.75, width=125, height=40)
 
         self.run_btn = Button(
             master=self,
@@ -184,7 +213,53 @@ class App(Tk):
             text='\u23F5 Start   ',
             command=self.run_btn_action
         )
-        self.run_btn.place(relx=0.01, rely=0.8, width=265, height=40)
+        self.run_btn.place(relx=0.01, rely=0.75, width=265, height=40)
+
+        self.replay_btn = Button(
+            master=self,
+            width=27,
+            bg=palette.btn_bg,
+            fg=palette.btn_fg,
+            relief='groove',
+            font=fonts.bold,
+            text='\u23CF Replay a recording',
+            command=self.replay_btn_action
+        )
+        self.replay_btn.place(relx=0.01, rely=0.81, width=265, height=40)
+
+        # Create the replay controls under the grid, shown while replaying.
+        self.seek_scale = Scale(
+            master=self,
+            orient='horizontal',
+            bg=palette.bg,
+            fg=palette.fg,
+            troughcolor=palette.btn_bg,
+            highlightthickness=0,
+            font=fonts.regular,
+            from_=1,
+            to=1,
+            command=self.seek_action
+        )
+        self.speed_label = Label(
+            master=self,
+            font=fonts.regular,
+            bg=palette.bg,
+            fg=palette.fg,
+            text='Generations/s:'
+        )
+        self.speed_scale = Scale(
+            master=self,
+            orient='horizontal',
+            bg=palette.bg,
+            fg=palette.fg,
+            troughcolor=palette.btn_bg,
+            highlightthickness=0,
+            font=fonts.regular,
+            from_=1,
+            to=500,
+            command=self.speed_action
+        )
+        self.speed_scale.set(DEFAULT_SPEED)
 
         # Create information section with labels and entries.
         self.information = LabelFrame(
@@ -194,7 +269,7 @@ class App(Tk):
             text='Information',
             font=fonts.regular
         )
-        self.information.place(relx=0.01, rely=0.48, width=265)
+        self.information.place(relx=0.01, rely=0.382, width=265)
 
         Label(
             master=self.information,
@@ -205,6 +280,7 @@ class App(Tk):
         ).grid(row=0, column=0, padx=5, pady=5, sticky='w')
         self.generation = create_entry(self.information, 'n/a')
         self.generation.grid(row=0, column=1, padx=5, pady=5, sticky='w')
+        self.generation.bind('<Return>', self.generation_action)
 
         Label(
             master=self.information,
@@ -226,6 +302,23 @@ class App(Tk):
         self.distribution = create_entry(self.information, 'n/a')
         self.distribution.grid(row=2, column=1, padx=5, pady=5, sticky='w')
 
+        Label(
+            master=self.information,
+            font=fonts.regular,
+            bg=palette.bg,
+            fg=palette.fg,
+            text='Mean time per phase (ms):'
+        ).grid(row=3, column=0, columnspan=2, padx=5, pady=0, sticky='w')
+        self.timings = Label(
+            master=self.information,
+            font=fonts.regular,
+            bg=palette.bg,
+            fg=palette.btn_fg,
+            justify='left',
+            text='n/a'
+        )
+        self.timings.grid(row=4, column=0, columnspan=2, padx=5, pady=5, sticky='w')
+
         # Create Legend section.
         self.legend = LabelFrame(
             master=self,
@@ -234,7 +327,7 @@ class App(Tk):
             text='Legend',
             font=fonts.regular
         )
-        self.legend.place(relx=0.01, rely=0.68, width=265)
+        self.legend.place(relx=0.01, rely=0.675, width=265)
 
         Label(
             master=self.legend,
@@ -270,7 +363,7 @@ class App(Tk):
         """
 
         error_messages = []
-        P, L, S1, S2, S3, S4, GL = 0, 0, 0, 0, 0, 0, 0
+        P, L, S1, S2, S3, S4, GL, WIDTH, HEIGHT = 0, 0, 0, 0, 0, 0, 0, 0, 0
 
         try:
             L = int(self.L.get().strip())
@@ -332,16 +425,44 @@ class App(Tk):
                 msg = 'Generation limit must be a positive integer (or empty).'
                 error_messages.append(msg)
 
+        try:
+            size = self.grid_size.get().strip().lower().split('x')
+            WIDTH = int(size[0])
+            HEIGHT = int(size[-1])
+            if len(size) > 2 or WIDTH <= 0 or HEIGHT <= 0:
+                raise ValueError
+        except ValueError:
+            msg = 'Grid size must be WIDTHxHEIGHT, or one positive int for a square grid.'
+            error_messages.append(msg)
+
         RUNMODE= self.run_mode.get().strip()
         if RUNMODE != "R" and RUNMODE != "F" and RUNMODE != "S":
             msg = 'Run mode must be R (for regular mode) or F (for fast mode) or S (for slow mode)'
             error_messages.append(msg)
 
         if len(error_messages) == 0:
-            return P, L, S1, S2, S3, S4, GL, RUNMODE
+            return P, L, S1, S2, S3, S4, GL, RUNMODE, WIDTH, HEIGHT
         messagebox.showerror('Input Error', '\n'.join(error_messages))
         return None
 
+    def get_seed(self):
+        """
+        Get the seed from the app's entry and validates it. Runs with a seed
+        can be repeated, so they are looked up in the result cache.
+        :return: (valid, seed) -- seed is an int, or None for a fresh run.
+        """
+        seed = self.seed.get().strip()
+        if seed == '':
+            return True, None
+        try:
+            seed = int(seed)
+            if seed < 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror('Input Error', 'Seed must be a non-negative integer (or empty).')
+            return False, None
+        return True, seed
+
     def run_btn_action(self):
         """
         Defines the action to be taken when user clicks the "Start"/"Resume"
@@ -349,17 +470,16 @@ class App(Tk):
         :return: None.
         """
 
-        if self.cellular_automaton.state.is_stopped:
+        if self.replay.is_open:
+            if self.replay.state.is_paused:
+                self.run_btn.place_forget()
+                self.replay.run()
+        elif self.cellular_automaton.state.is_stopped:
             params = self.get_input()
-            if params:
-                P, L, S1, S2, S3, S4, GL, RUNMODE = params
+            valid, seed = self.get_seed() if params else (False, None)
+            if valid and not self.cellular_automaton.recall(params, seed):
                 self.run_btn.place_forget()
-                if RUNMODE == "R":
-                    self.cellular_automaton.set(P, L, S1, S2, S3, S4, GL)
-                elif RUNMODE == "S":
-                    self.cellular_automaton.set_slow(P, L, S1, S2, S3, S4, GL)
-                elif RUNMODE == "F":
-                    self.cellular_automaton.set_fast(P, L, S1, S2, S3, S4, GL)
+                self.cellular_automaton.reset(params, seed)
                 self.cellular_automaton.run()
         elif self.cellular_automaton.state.is_paused:
             self.run_btn.place_forget()
@@ -370,15 +490,82 @@ class App(Tk):
         Defines the action to be taken when user clicks the "Pause" button.
         :return: None.
         """
-        self.run_btn.place(relx=0.01, rely=0.8, width=265, height=40)
+        self.run_btn.place(relx=0.01, rely=0.75, width=265, height=40)
         self.run_btn.configure(text='\u23F5 Resume  ', font=fonts.bold)
-        self.cellular_automaton.pause()
+        if self.replay.is_open:
+            self.replay.pause()
+        else:
+            self.cellular_automaton.pause()
 
     def stop_btn_action(self):
         """
         Defines the action to be taken when user click the "Stop" button.
         :return: None.
         """
-        self.run_btn.place(relx=0.01, rely=0.8, width=265, height=40)
+        self.run_btn.place(relx=0.01, rely=0.75, width=265, height=40)
         self.run_btn.configure(text='\u23F5 Start   ', font=fonts.bold)
-        self.cellular_automaton.stop()
\ No newline at end of file
+        if self.replay.is_open:
+            self.replay.stop()
+            self.seek_scale.place_forget()
+            self.speed_label.place_forget()
+            self.speed_scale.place_forget()
+        else:
+            self.cellular_automaton.stop()
+
+    def replay_btn_action(self):
+        """
+        Defines the action to be taken when user clicks the "Replay" button:
+        asks for a recording file (see Simulation.record) and plays it, with
+        the Pause and Stop buttons, the slider under the grid to seek and the
+        speed slider next to it.
+        :return: None.
+        """
+        if not self.cellular_automaton.state.is_stopped:
+            messagebox.showerror('Replay Error', 'Stop the simulation before replaying a recording.')
+            return
+        path = filedialog.askopenfilename(title='Replay a recording',
+                                          filetypes=[('Recordings', '*.rec'), ('All files', '*')])
+        if not path:
+            return
+        if self.replay.is_open:
+            self.stop_btn_action()
+        try:
+            self.replay.open(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror('Replay Error', str(e))
+            return
+        self.seek_scale.configure(from_=self.replay.generation, to=self.replay.last_generation)
+        self.seek_scale.place(relx=0.26, rely=0.72, width=470, height=36)
+        self.speed_label.place(relx=0.695, rely=0.73)
+        self.speed_scale.place(relx=0.79, rely=0.72, width=220, height=36)
+        self.run_btn.place_forget()
+        self.replay.run()
+
+    def seek_action(self, value):
+        """
+        Defines the action to be taken when the replay slider moves.
+        :param value: the generation on the slider, as a string.
+        :return: None.
+        """
+        if self.replay.is_open:
+            self.replay.seek(int(float(value)))
+
+    def speed_action(self, value):
+        """
+        Defines the action to be taken when the speed slider moves.
+        :param value: generations per second, as a string.
+        :return: None.
+        """
+        self.replay.speed = int(float(value))
+
+    def generation_action(self, event):
+        """
+        Defines the action to be taken when user presses Enter in the
+        "Generation" entry: while replaying, shows that generation.
+        :return: None.
+        """
+        if self.replay.is_open:
+            try:
+                self.replay.seek(int(self.generation.get().strip()))
+            except ValueError:
+                self.replay.show(self.replay.position)
\ No newline at end of file
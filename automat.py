@@ -1,602 +1,348 @@
-import numpy as np
-from random import random, randint, shuffle
-from matplotlib import pyplot as plt
-from state import State
-import random
-from style import palette
-
-DIM = 100
+import queue
+import threading
+import time
+from collections import namedtuple
+from tkinter import messagebox
 
+from cache import run_key, summarize
+from state import State
+from render import POINTS, RECTANGLES, CanvasRenderer, make_renderer
+from simulation import OBJECT_ENGINE, Simulation
+from timing import Timing
 
-class Cell:
-    """
-    This class defines a cell in the automat, which is a place-holder for a
-    Person. One can put a person in the cell, and check if the cell is empty.
-    """
 
-    def __init__(self):
-        self.person = None
+# Time between two frames drawn by the app, in milliseconds.
+FRAME_DELAY = 40
 
-    def put(self, person):
-        self.person = person
+# Time between two checks that a halted worker finished its generation, in
+# milliseconds.
+HALT_POLL_DELAY = 10
 
-    def get(self):
-        return self.person
+# Snapshots the simulation may publish ahead of the app; older ones are dropped.
+SNAPSHOT_QUEUE_SIZE = 2
 
-    def is_empty(self):
-        return True if self.person is None else False
+# State of the simulation after a generation, as published for the app.
+Snapshot = namedtuple('Snapshot', ['generation', 'infected_persons', 'has_rumor', 'done'])
 
 
-class Person:
+class Worker(threading.Thread):
     """
-        This class defines a person that can populate a cell.
+    This class advances a simulation in a background thread, so the speed of
+    the simulation does not depend on the app, nor the other way around. At
+    most once per frame it publishes a Snapshot in a bounded queue; when the
+    app does not keep up, the oldest snapshots are dropped. If the simulation
+    raises, the worker stops and keeps the error for the app.
     """
 
-    def __init__(self, skepticism, i, j, L):
-        self.skepticism = skepticism
-        self.has_rumor = False
-        self.received_rumor_from = 0
-        self.generations_since_transmission = np.inf
-        self.pos = (i, j)
-        self.L = L
-        self.is_spreading = False
-        self.wait_to_spread = False
-
-    def get_pos(self):
-        return self.pos
-
-    def set_has_rumor(self):
-        if self.has_rumor:
-            self.has_rumor = False
-        else:
-            self.has_rumor = True
-
-    # this bool function checks if the person is ready to spread the rumor to its neighbors according to the L parameter
-    # if the person is ready to spread the rumor, it returns True, otherwise it returns False
-    def check_spread(self):
+    def __init__(self, simulation, points=False):
         """
-    The check_spread function is used to determine whether or not a virus should be able to spread.
-        If the virus has been transmitted within the last L generations, it will not be allowed to spread.
-        This function returns True if the virus can spread and False otherwise.
-    :return bool:
-    """
-        if self.wait_to_spread:
-            if self.generations_since_transmission <= self.L - 1:
-                self.generations_since_transmission += 1
-                self.is_spreading = False
-                return False
-            else:
-                self.generations_since_transmission = np.inf
-                self.wait_to_spread = False
-                return True
-        return True
-
-    # this function spreads the rumor to the neighbors of the person
-    # it also updates the rumor's generation
-    def spread_rumor(self, grid):
+        Worker constructor.
+        :param simulation: Simulation object to advance, already reset.
+        :param points: True to publish who heard the rumor per person (see
+        Simulation.rumor_points) instead of as a grid.
+        :return: Worker object.
         """
-    The spread_rumor function is called by the spread_rumor method of a Person object. The function takes in a grid
-    parameter, which is the list of lists that represents the grid. It then sets its own generations_since_transmission
-    attribute to 0 and creates an empty list for next generation rumor spreaders. It then iterates through all of its
-    neighbors and checks their skepticism level to see if they will become rumor spreaders in the next generation (if they
-    will receive and pass on rumors). If so, it adds them to this list. Finally, it sets itself as waiting to pass on rumors
-
-    :param self: Refer to the object that is calling the function
-    :param grid: Access the neighbors of a cell
-    :return: A list of the neighbors that will spread the rumor in the next generation
-    """
-        self.generations_since_transmission = 0  # set the rumor's generation to 0
-        next_generation_rumor_spreaders = []  # list of the neighbors that will spread the rumor in the next generation
-        for neighbor in self.get_neighbors(grid):
-            neighbor.has_rumor = True
-            neighbor.received_rumor_from += 1
-            # the following if-else statements check the neighbor's skepticism level and decide if the neighbor will
-            # spread the rumor to its neighbors
-            if neighbor.skepticism == "S4":
-                if neighbor.received_rumor_from >= 2 and random.random() < 1 / 3:
-                    next_generation_rumor_spreaders.append(neighbor)
-            elif neighbor.skepticism == "S3":
-                if neighbor.received_rumor_from < 2 and random.random() < 1 / 3:
-                    next_generation_rumor_spreaders.append(neighbor)
-                elif neighbor.received_rumor_from >= 2 and random.random() < 2 / 3:
-                    next_generation_rumor_spreaders.append(neighbor)
-            elif neighbor.skepticism == "S2":
-                if neighbor.received_rumor_from < 2 and random.random() < 2 / 3:
-                    next_generation_rumor_spreaders.append(neighbor)
-                elif neighbor.received_rumor_from >= 2:
-                    next_generation_rumor_spreaders.append(neighbor)
-            elif neighbor.skepticism == "S1":
-                next_generation_rumor_spreaders.append(neighbor)
-        # set the rumor_spreader's is_spreading attribute to True so it will spread the rumor in the next generation
-        for rumor_spreader in next_generation_rumor_spreaders:
-            rumor_spreader.is_spreading = True
-        # set the rumor_spreader's wait_to_spread attribute to True so it will wait to spread the rumor in the next
-        # generation
-        # the wait_to_spread attribute is used to make sure that the rumor will spread only after the L generations
-        self.wait_to_spread = True
-        self.is_spreading = False
-
-
-    # this function returns a list of the neighbors of the person
-    def get_neighbors(self, grid):
-        '''
-            This function returns a list of the neighbors of the person
-            :param self:
-            :param grid:
-            :return: neighbors
-            '''
-        position = self.pos
-        i, j = position
-        neighbors = []
-        # the following for loop checks the neighbors of the person and adds them to the neighbors list
-        for di in range(-1, 2):
-            for dj in range(-1, 2):
-                if di == 0 and dj == 0:
-                    continue
-                neighbor_i, neighbor_j = i + di, j + dj
-                if neighbor_i < 0 or neighbor_i >= DIM or \
-                        neighbor_j < 0 or neighbor_j >= DIM:
-                    continue
-                if grid[neighbor_i][neighbor_j].get() is not None:
-                    neighbors.append(grid[neighbor_i][neighbor_j].get())  # add the neighbor to the neighbors list
-        return neighbors
+        super().__init__(daemon=True)
+        self.simulation = simulation
+        self.points = points
+        self.snapshots = queue.Queue(maxsize=SNAPSHOT_QUEUE_SIZE)
+        self.halt = threading.Event()
+        self.error = None  # What the simulation raised, if it did.
+
+    def running(self):
+        """
+        Tells if the simulation goes on: it did not stop on its own (see
+        Simulation.step), reach the generation limit, or get halted.
+        """
+        simulation = self.simulation
+        return (not self.halt.is_set() and simulation.stop_reason is None
+                and simulation.generation <= simulation.gen_limit)
 
+    def run(self):
+        simulation = self.simulation
+        published = time.perf_counter()
+        try:
+            while self.running():
+                simulation.step()
+                if time.perf_counter() - published >= FRAME_DELAY / 1000:
+                    self.publish(False)
+                    published = time.perf_counter()
+        except Exception as error:
+            self.error = error
+            return
+        self.publish(not self.halt.is_set())
+
+    def publish(self, done):
+        """
+        Puts a snapshot of the simulation in the queue, dropping the oldest
+        one if it is full.
+        :param done: True if the simulation will not go on.
+        :return: None.
+        """
+        simulation = self.simulation
+        if self.points:
+            occupied, has_rumor = simulation.rumor_points()
+        else:
+            occupied, has_rumor = simulation.rumor_grid()
+        snapshot = Snapshot(simulation.generation, simulation.infected_persons, has_rumor.copy(), done)
+        while True:
+            try:
+                self.snapshots.put_nowait(snapshot)
+                return
+            except queue.Full:
+                try:
+                    self.snapshots.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def latest(self):
+        """
+        Takes all the snapshots out of the queue.
+        :return: the newest Snapshot, or None if there was none.
+        """
+        snapshot = None
+        while True:
+            try:
+                snapshot = self.snapshots.get_nowait()
+            except queue.Empty:
+                return snapshot
 
 
 class CellularAutomaton:
     """
-    This class implements the required cellular automat for the experiment.
+    This class connects a Simulation to the App: the generations run in a
+    Worker thread, and the app draws the latest snapshot and updates the
+    information entries once per frame, scheduled with Tkinter. The
+    simulation itself does not know about the App.
     """
 
-    def __init__(self, app):
+    def __init__(self, app, engine=OBJECT_ENGINE, render_mode=RECTANGLES, flat_window=None, timing=True, cache=None):
         """
         Cellular constructor. An automat object contains a state, a pointer
-        to the containing App object, dimensions, parameters, a grid as a 2d
-        list, a list of people in the automat and a list named "trand" that
-        stores the number of the persons that heard the romer in each generation.
+        to the containing App object and the observed simulation.
         :param app: a pointer to the containing App object.
+        :param engine: OBJECT_ENGINE or one of the array engines, such as
+        VECTOR_ENGINE or SPARSE_ENGINE, see Simulation.
+        :param render_mode: RECTANGLES to draw a rectangle per person, RASTER
+        to draw the grid as one image, which scales to large grids, or POINTS
+        to draw that image from the persons' coordinates, without building
+        grids, which suits SPARSE_ENGINE. Grids too large for rectangles are
+        always drawn as an image.
+        :param flat_window: see Simulation.
+        :param timing: True to time the phases of each generation and show
+        their means in the app, see Simulation.timing; only the totals are
+        kept, so long runs do not grow the memory.
+        :param cache: ResultCache to look runs with a seed up in and store
+        them in, or None.
         :return: Automata object.
         """
 
         # Basic attributes.
         self.state = State()
-        self.generation = 0
         self.app = app
-
-        # Experiment's parameters -- initializes later by set() function.
-        self.p = 0.0
-        self.l = 0
-        self.s1 = 0.0
-        self.s2 = 0.0
-        self.s3 = 0.0
-        self.s4 = 0.0
-        self.gen_limit = 0
-        self.infected_persons = 0
-        self.n_persons = 0
-
-        self.n_s1 = 0
-        self.n_s2 = 0
-        self.n_s3 = 0
-        self.n_s4 = 0
-
-        # Data-structures.
-        self.grid = []  # Provides a way for cell occupancy check.
-        self.persons = []  # Store all the persons.
-        self.trand = []  # Store number of infected in each generation.
-
-    def __advance(self):
+        self.simulation = Simulation(engine, flat_window)
+        self.simulation.timing = Timing(timing, keep=0)
+        self.render_timing = Timing(timing)  # The drawing, timed in the app's thread.
+        self.cache = cache
+        self.key = None  # Key of the run in the cache, if it has one.
+        self.render_mode = render_mode
+        self.renderer = CanvasRenderer(app.frame)
+        self.occupied = None
+        self.worker = None
+        self.loop_id = None  # Tkinter id of the next call to __loop.
+        self.halted = None  # What to call once the halted worker ended, see halt().
+        self.plotted = 0  # Generations of trand already on the chart.
+
+    def reset(self, params, seed=None):
         """
-        This method defines the changes taking place in the transition between
-        two generations in the automata.
-        :return: None, but it updates attributes and frame.
+        Places a new population in the observed simulation.
+        :param params: simulation's input, as returned by App.get_input.
+        :param seed: seed for the random numbers, or None for a fresh run;
+        the seed used is kept in simulation.seed.
+        :return: None.
         """
+        simulation = self.simulation
+        simulation.reset(params, seed)
+        self.key = self.__key(params, seed)
+        if self.render_mode == POINTS:
+            occupied, has_rumor = simulation.rumor_points()
+        else:
+            occupied, has_rumor = simulation.rumor_grid()
+            occupied = occupied.copy()
+        self.occupied = occupied
+        self.renderer = make_renderer(self.app.frame, (simulation.width, simulation.height), self.render_mode)
+        self.renderer.setup(occupied, has_rumor)
+        self.render_timing.clear()
+        self.plotted = 0
+        self.app.trend.reset(self.simulation.n_persons)
+
+    def __key(self, params, seed):
+        """
+        This private method names a run in the cache. The worker runs up to
+        and including the generation limit, one generation more than a
+        headless run.
+        :return: hex string, or None without a cache or a seed.
+        """
+        if self.cache is None or seed is None:
+            return None
+        simulation = self.simulation
+        return run_key(params, seed, simulation.engine, simulation.flat_window, params[6] + 1)
 
-        # Advance generation.
-        self.generation += 1
-
-        # Clear canvas.
-        self.app.frame.delete('all')
-
-        # Create a new rectangle for each person according to state and type.
-        for person in self.persons:
-
-            # Select color.
-            if person.has_rumor:
-                color = palette.red
-            else:
-                color =palette.orange
-
-            i, j = person.pos
-            x0 = i * 8
-            y0 = j * 6
-            x1 = (i + 1) * 8
-            y1 = (j + 1) * 6
-            self.app.frame.create_rectangle(x0, y0, x1, y1, fill=color)
-
-        # Update each person's infection(hearding the romer).
-        count_infected = 0
-        for person in self.persons:
-            if person.has_rumor:
-                count_infected += 1
-
-        # spreading the rumer (only the relevant persons).
-        self.infected_persons = count_infected
-        for person in self.persons:
-            if person.check_spread() and person.is_spreading:
-                person.spread_rumor(self.grid)
+    def recall(self, params, seed=None):
+        """
+        Shows a run from the cache, without running it: the chart of the run
+        and the information entries of its last generation.
+        :param params: simulation's input, as returned by App.get_input.
+        :param seed: seed of the run, or None.
+        :return: True if the run was in the cache, else False.
+        """
+        key = self.__key(params, seed)
+        cached = None if key is None else self.cache.get(key)
+        if cached is None:
+            return False
+        trand, summary = cached
+        self.renderer.clear()
+        self.app.trend.reset(summary['n_persons'])
+        self.app.trend.extend(1, trand)
+        self.__show_counts(summary['generations'], summary['final_infected'], summary['n_persons'])
+        self.app.timings.configure(text=self.__cache_line())
+        return True
 
-        # init the received_rumor_from for all persons.
-        for person in self.persons:
-            person.received_rumor_from = 0
+    def __draw(self, snapshot):
+        """
+        This private method brings the canvas up to date with the state of each
+        person.
+        :param snapshot: Snapshot to draw.
+        :return: None, but it updates the frame.
+        """
+        with self.render_timing.phase('render'):
+            self.renderer.draw(self.occupied, snapshot.has_rumor)
 
-    def __update_info(self):
+    def __update_info(self, snapshot):
         """
         This private method updates information entries in the app.
+        :param snapshot: Snapshot to show.
+        :return: None.
+        """
+        self.__show_counts(snapshot.generation, snapshot.infected_persons, self.simulation.n_persons)
+        if self.simulation.timing.enabled:
+            self.app.timings.configure(text=self.__timings())
+
+    def __show_counts(self, generation, infected_persons, n_persons):
+        """
+        This private method writes a generation and how many persons heard
+        the rumor in the information entries of the app.
         :return: None.
         """
-        # Update entries.
         self.app.generation.delete(0, 'end')
-        self.app.generation.insert(0, self.generation)
+        self.app.generation.insert(0, generation)
         self.app.h_rumor.delete(0, 'end')
-        self.app.h_rumor.insert(0, self.infected_persons)
+        self.app.h_rumor.insert(0, infected_persons)
         self.app.distribution.delete(0, 'end')
-        dist = str(int((self.infected_persons / self.n_persons) * 100)) + '%'
+        dist = str(int((infected_persons / n_persons) * 100)) + '%'
         self.app.distribution.insert(0, dist)
 
+    def __timings(self):
+        """
+        This private method sums up the timing of the simulation for the app:
+        the mean time of each phase of a generation, of the drawing, and the
+        whole set-up.
+        :return: str.
+        """
+        lines = []
+        setup = 0.0
+        for name, calls, total, mean, longest in self.simulation.timing.summary() + self.render_timing.summary():
+            if name.startswith('setup'):
+                setup += total
+            else:
+                lines.append('%-10s %8.3f' % (name, mean * 1e3))
+        lines.append('%-10s %8.3f' % ('setup', setup * 1e3))
+        if self.cache is not None:
+            lines.append(self.__cache_line())
+        return '\n'.join(lines)
+
+    def __cache_line(self):
+        """
+        This private method counts the hits and misses of the cache for the
+        app.
+        :return: str.
+        """
+        return 'cache %d hits, %d misses' % (self.cache.hits, self.cache.misses)
+
+    def __plot(self):
+        """
+        This private method adds the generations run since the last call to
+        the chart of the app.
+        :return: None.
+        """
+        new = self.simulation.trand[self.plotted:]
+        self.app.trend.extend(self.plotted + 1, new)
+        self.plotted += len(new)
+
     def __loop(self):
         """
-        This private method implements the simulation itself. It updates
-        entries, save current number of infected, advance the automata, and then
-        schedule an async call to itself to the next 100 milliseconds (using
-        Tkinter), if there is no generation limitation.
+        This private method implements the display loop. It draws the latest
+        snapshot of the worker, if there is a new one, and then schedules an
+        async call to itself to the next frame (using Tkinter), until the
+        simulation is done: there is no generation limitation and it did not
+        stop on its own (see Simulation.step). If the simulation raised, the
+        run stops and the error is shown.
         :return: None.
         """
+        self.loop_id = None
         if self.state.is_running:
-            self.__update_info()
-            self.trand.append(self.infected_persons)
-            self.__advance()
-            if self.generation <= self.gen_limit:
-                self.app.after(100, self.__loop)
-            else:
+            error = self.worker.error
+            snapshot = self.worker.latest()
+            if snapshot is not None:
+                self.__update_info(snapshot)
+                self.__draw(snapshot)
+                self.__plot()
+            if error is not None:
                 self.app.stop_btn_action()
+                messagebox.showerror('Simulation Error', str(error))
+            elif snapshot is not None and snapshot.done:
+                if self.key is not None:
+                    self.cache.put(self.key, self.simulation.trand, summarize(self.simulation))
+                self.app.stop_btn_action()
+            else:
+                self.loop_id = self.app.after(FRAME_DELAY, self.__loop)
 
-    def plot(self):
-        """
-        This private method creates a plot and show it.
-        :return: None, but it outputs a plot.
-        """
-        plt.figure()
-        plt.title('Number of persons who heard the rumor per generation')
-        plt.xlabel('Generation')
-        plt.ylabel('percentage of listeners')
-        percentage = [(x * 100) / len(self.persons) for x in self.trand]
-        plt.plot([i + 1 for i in range(len(self.trand))], percentage)
-        plt.show()
-
-    def set(self, P, L, S1, S2, S3, S4, GL):
-        # Set parameters.
-        """
-        The set function initializes the grid with a given number of persons,
-        and sets their skepticism levels. It also randomly selects one person to be
-        the spreader of the rumor.
-        :param P: the percentage of the grid that is occupied by persons.
-        :param L: the number of neighbors that each person can hear.
-        :param S1: the percentage of the population that is skeptical level 1.
-        :param S2: the percentage of the population that is skeptical level 2.
-        :param S3: the percentage of the population that is skeptical level 3.
-        :param S4: the percentage of the population that is skeptical level 4.
-        :param GL: the generation limit.
+    def halt(self, then):
+        """
+        Halts the display loop, and the worker after the generation it is
+        running. The app does not wait for the worker: it is checked every
+        HALT_POLL_DELAY milliseconds, and then is called once it ended. Until
+        then the state stays running, so the run cannot be resumed or reset
+        under the worker; halting again only replaces then.
+        :param then: function receiving the last Snapshot the worker
+        published, or None.
         :return: None.
         """
-        self.p = P
-        self.l = L
-        self.s1 = S1
-        self.s2 = S2
-        self.s3 = S3
-        self.s4 = S4
-        self.gen_limit = GL
-        self.n_persons = int(DIM * DIM * P)
-        self.n_s1 = int(self.n_persons * self.s1)
-        self.n_s2 = int(self.n_persons * self.s2)
-        self.n_s3 = int(self.n_persons * self.s3)
-        self.n_s4 = int(self.n_persons * self.s4)
-
-        # Initialize a grid.
-        self.grid = [[Cell() for j in range(DIM)] for i in range(DIM)]
-
-        # Select random positions.
-        positions = [(i, j) for j in range(DIM) for i in range(DIM)]
-        shuffle(positions)
-        positions = positions[:self.n_persons]
-
-        probabilities = [self.s1, self.s2, self.s3, self.s4]
-        skepticism = ""
-        # Create and place persons.
-        for (i, j) in positions:
-            type_of_person = random.choices(range(1, 5), weights=probabilities)[0]
-            if type_of_person == 1:
-                skepticism = "S1"
-            elif type_of_person == 2:
-                skepticism = "S2"
-            elif type_of_person == 3:
-                skepticism = "S3"
-            elif type_of_person == 4:
-                skepticism = "S4"
-
-            person = Person(skepticism, i, j, L)
-            self.grid[i][j].put(person)
-            self.persons.append(person)
-
-        chosen = self.persons
-        shuffle(chosen)
-        spreader = chosen[0]
-        spreader.set_has_rumor()
-        spreader.spread_rumor(self.grid)
-
-    # def set_slow(self, P, L, S1, S2, S3, S4, GL):
-    #     """
-    # The set_slow function is used to set the parameters of the simulation.
-    # It takes in 7 arguments: P, L, S_i for i = 1,...4 and GL.
-    # P is a float between 0 and 1 that represents the population density of persons on a grid.
-    # L is an integer that represents how many steps each person can take before they die out (or leave).
-    # S_i for i = 1,...4 are floats between 0 and 1 that represent what percentage of people have skepticism level S_i.  The sum of these 4 values must be equal to one (otherwise there will be some people who don't
-    #
-    # :param self: Refer to the instance of the class
-    # :param P: Determine the number of persons in the grid
-    # :param L: Set the length of time a person will stay in one cell
-    # :param S1: Set the number of people who are skeptical about the rumor
-    # :param S2: Determine the number of people who are skeptical
-    # :param S3: Determine the number of people who are skeptical
-    # :param S4: Set the number of people who are skeptical about the rumor
-    # :param GL: Set the generation limit
-    # :return: A list of persons who are labeled s2
-    # """
-    #     # Set parameters.
-    #     self.p = P
-    #     self.l = L
-    #     self.s1 = S1
-    #     self.s2 = S2
-    #     self.s3 = S3
-    #     self.s4 = S4
-    #     self.gen_limit = GL
-    #     self.n_persons = int(DIM * DIM * P)
-    #     self.n_s1 = int(self.n_persons * self.s1)
-    #     self.n_s2 = int(self.n_persons * self.s2)
-    #     self.n_s3 = int(self.n_persons * self.s3)
-    #     self.n_s4 = int(self.n_persons * self.s4)
-    #
-    #     # Initialize a grid.
-    #     self.grid = [[Cell() for j in range(DIM)] for i in range(DIM)]
-    #
-    #     # Select random positions.
-    #     positions = [(i, j) for j in range(DIM) for i in range(DIM)]
-    #     shuffle(positions)
-    #     positions = positions[:self.n_persons]
-    #
-    #     # Create and place persons.
-    #     for (i, j) in positions:
-    #         person = Person("S1", i, j, L)
-    #         self.grid[i][j].put(person)
-    #         self.persons.append(person)
-    #     # sort the list of persons by their x and y coordinates
-    #     sorted_persons_1 = sorted(self.persons, key=lambda p: p.pos[1])
-    #     sorted_persons = sorted(sorted_persons_1, key=lambda p: p.pos[0])
-    #     list3 = []
-    #     half = self.n_s4 / 2
-    #     half2 = self.n_s4 / 2
-    #     # assign the skepticism level to each person in the list of persons
-    #     for person in sorted_persons:
-    #         if half > 0:
-    #             half = half - 1
-    #             person.skepticism = "S4"
-    #             continue
-    #         if self.n_s1 > 0:
-    #             self.n_s1 = self.n_s1 - 1
-    #             person.skepticism = "S1"
-    #             continue
-    #         if self.n_s1 == 0 and half2 > 0:
-    #             half2 = half2 - 1
-    #             person.skepticism = "S4"
-    #             continue
-    #         if self.n_s3 > 0:
-    #             self.n_s3 = self.n_s3 - 1
-    #             person.skepticism = "S3"
-    #             continue
-    #
-    #         self.n_s2 = self.n_s2 - 1
-    #         person.skepticism = "S2"
-    #         list3.append(person)
-    #
-    #     chosen = list3
-    #     shuffle(chosen)
-    #     spreader = chosen[0]
-    #     spreader.set_has_rumor()
-    #     spreader.spread_rumor(self.grid)
-
-    def count_neighbors(self, person):
-        return len(person.get_neighbors(self.grid))
-
-    def set_slow(self, P, L, S1, S2, S3, S4, GL):
-        # Set parameters.
-        self.p = P
-        self.l = L
-        self.s1 = S1
-        self.s2 = S2
-        self.s3 = S3
-        self.s4 = S4
-        self.gen_limit = GL
-        self.n_persons = int(DIM * DIM * P)
-        self.n_s1 = int(self.n_persons * self.s1)
-        self.n_s2 = int(self.n_persons * self.s2)
-        self.n_s3 = int(self.n_persons * self.s3)
-        self.n_s4 = int(self.n_persons * self.s4)
-
-        # Initialize a grid.
-        self.grid = [[Cell() for j in range(DIM)] for i in range(DIM)]
-
-        # Select random positions.
-        positions = [(i, j) for j in range(DIM) for i in range(DIM)]
-        shuffle(positions)
-        positions = positions[:self.n_persons]
-
-        # Create and place persons.
-        for (i, j) in positions:
-            person = Person("S1", i, j, L)
-            self.grid[i][j].put(person)
-            self.persons.append(person)
-
-        shuffle(self.persons)
-
-        outer_list = []
-        for person in self.persons:
-            inner_list = [person, self.count_neighbors(person)]
-            outer_list.append(inner_list)
-
-        sorted_list = sorted(outer_list,  key=lambda x: -x[1])
-
-        list3=[]
-
-        for inner_list in sorted_list:
-            if self.n_s4 > 0:
-                self.n_s4 = self.n_s4 - 1
-                inner_list[0].skepticism = "S4"
-                continue
-            elif self.n_s3 > 0:
-                self.n_s3 = self.n_s3 - 1
-                inner_list[0].skepticism = "S3"
-                continue
-            elif self.n_s2 > 0:
-                self.n_s2 = self.n_s2 - 1
-                inner_list[0].skepticism = "S2"
-                continue
-            elif self.n_s1 > 0:
-                list3.append(inner_list[0])
-                self.n_s1 = self.n_s1 - 1
-                inner_list[0].skepticism = "S1"
-
-        chosen = list3
-        shuffle(chosen)
-        spreader = chosen[0]
-        spreader.set_has_rumor()
-        spreader.spread_rumor(self.grid)
-
-    def set_fast(self, P, L, S1, S2, S3, S4, GL):
-        """
-    The set_fast function is a faster way to set up the simulation.
-    It takes in all of the parameters that are needed for the simulation, and then sets them up.
-    The function also creates a grid with cells, and places persons on it randomly.
-    Then it sorts these persons by their position (x-coordinate first), so that they can be placed into groups based on their skepticism level.
-
-    :param self: Refer to the object itself
-    :param P: Determine the density of people in the grid
-    :param L: Set the limit of how many times a person can spread the rumor
-    :param S1: Set the number of people with skepticism level 1
-    :param S2: Determine the number of people with skepticism level s2
-    :param S3: Set the amount of people with skepticism level 3
-    :param S4: Set the number of people that are skeptical about the rumor
-    :param GL: Set the generation limit
-    :return: A list of the persons that have skepticism 1
-    """
-        # Set parameters.
-        self.p = P
-        self.l = L
-        self.s1 = S1
-        self.s2 = S2
-        self.s3 = S3
-        self.s4 = S4
-        self.gen_limit = GL
-        self.n_persons = int(DIM * DIM * P)
-        self.n_s1 = int(self.n_persons * self.s1)
-        self.n_s2 = int(self.n_persons * self.s2)
-        self.n_s3 = int(self.n_persons * self.s3)
-        self.n_s4 = int(self.n_persons * self.s4)
-
-        # Initialize a grid.
-        self.grid = [[Cell() for j in range(DIM)] for i in range(DIM)]
-
-        # Select random positions.
-        positions = [(i, j) for j in range(DIM) for i in range(DIM)]
-        shuffle(positions)
-        positions = positions[:self.n_persons]
-
-        # Create and place persons.
-        for (i, j) in positions:
-            person = Person("S3", i, j, L)
-            self.grid[i][j].put(person)
-            self.persons.append(person)
-
-        sorted_persons_1 = sorted(self.persons, key=lambda p: p.pos[1])
-        sorted_persons = sorted(sorted_persons_1, key=lambda p: p.pos[0])
-        list1 = []
-        turn = 1
-        print(len(sorted_persons))
-        for person in sorted_persons:
-            if turn == 1:
-                if self.n_s1 > 0:
-                    person.skepticism = "S1"
-                    list1.append(person)
-                    self.n_s1 = self.n_s1 - 1
-                elif self.n_s4 > 0:
-                    person.skepticism = "S4"
-                    self.n_s4 -= 1
-                elif self.n_s2 > 0:
-                    person.skepticism = "S2"
-                    self.n_s2 -= 1
-                elif self.n_s3 > 0:
-                    person.skepticism = "S3"
-                    self.n_s3 -= 1
-            elif turn == 2:
-                if self.n_s4 > 0:
-                    person.skepticism = "S4"
-                    self.n_s4 -= 1
-                elif self.n_s2 > 0:
-                    person.skepticism = "S2"
-                    self.n_s2 -= 1
-                elif self.n_s3 > 0:
-                    person.skepticism = "S3"
-                    self.n_s3 -= 1
-                elif self.n_s1 > 0:
-                    person.skepticism = "S1"
-                    list1.append(person)
-                    self.n_s1 = self.n_s1 - 1
-            elif turn == 3:
-                if self.n_s2 > 0:
-                    person.skepticism = "S2"
-                    self.n_s2 -= 1
-                elif self.n_s3 > 0:
-                    person.skepticism = "S3"
-                    self.n_s3 -= 1
-                elif self.n_s1 > 0:
-                    person.skepticism = "S1"
-                    list1.append(person)
-                    self.n_s1 = self.n_s1 - 1
-                elif self.n_s4 > 0:
-                    person.skepticism = "S4"
-                    self.n_s4 -= 1
-            elif turn == 4:
-                if self.n_s3 > 0:
-                    person.skepticism = "S3"
-                    self.n_s3 -= 1
-                elif self.n_s1 > 0:
-                    person.skepticism = "S1"
-                    list1.append(person)
-                    self.n_s1 = self.n_s1 - 1
-                elif self.n_s4 > 0:
-                    person.skepticism = "S4"
-                    self.n_s4 -= 1
-                elif self.n_s2 > 0:
-                    person.skepticism = "S2"
-                    self.n_s2 -= 1
-                turn = 1
-                continue
-
-            turn = turn + 1
-
-        chosen = self.persons
-        shuffle(chosen)
-        spreader = chosen[0]
-        spreader.set_has_rumor()
-        spreader.spread_rumor(self.grid)
+        if self.loop_id is not None:
+            self.app.after_cancel(self.loop_id)
+            self.loop_id = None
+        if self.worker is None:
+            then(None)
+            return
+        if self.halted is None:
+            self.worker.halt.set()
+            self.app.after(0, self.__wait_worker)
+        self.halted = then
+
+    def __wait_worker(self):
+        """
+        This private method checks if the halted worker ended, and schedules a
+        call to itself until it did.
+        :return: None.
+        """
+        if self.worker.is_alive():
+            self.app.after(HALT_POLL_DELAY, self.__wait_worker)
+            return
+        snapshot = self.worker.latest()
+        then = self.halted
+        self.worker = None
+        self.halted = None
+        then(snapshot)
 
     def run(self):
         """
@@ -604,7 +350,9 @@ class CellularAutomaton:
         :return: None.
         """
         self.state.set_running()
-        self.app.after(0, self.__loop)
+        self.worker = Worker(self.simulation, self.render_mode == POINTS)
+        self.worker.start()
+        self.loop_id = self.app.after(0, self.__loop)
 
     def pause(self):
         """
@@ -612,18 +360,34 @@ class CellularAutomaton:
         the running from the point she paused it.
         :return: None.
         """
+        self.halt(self.__paused)
+
+    def __paused(self, snapshot):
+        """
+        This private method shows where the paused simulation stopped.
+        :param snapshot: the last Snapshot of the worker, or None.
+        :return: None.
+        """
         self.state.set_paused()
+        if snapshot is not None:
+            self.__update_info(snapshot)
+            self.__draw(snapshot)
+        self.__plot()
 
     def stop(self):
         """
         This method stops the simulation running.
         :return: None.
         """
-        self.app.frame.delete('all')
+        self.halt(self.__stopped)
+
+    def __stopped(self, snapshot):
+        """
+        This private method clears the stopped simulation.
+        :param snapshot: the last Snapshot of the worker, unused.
+        :return: None.
+        """
+        self.__plot()
+        self.renderer.clear()
         self.state.set_stopped()
-        self.plot()
-        self.grid = []
-        self.persons = []
-        self.trand = []
-        self.generation = 0
-        self.infected_persons = 0
+        self.simulation.clear()
@@ -0,0 +1,227 @@
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from simulation import (BITBOARD_ENGINE, FRONTIER_ENGINE, GRAPH_ENGINE, OBJECT_ENGINE, SPARSE_ENGINE, TILED_ENGINE,
+                        VECTOR_ENGINE, Params, Simulation)
+from sweep import parse_mix
+
+# Fields that identify a benchmark case.
+CASE_FIELDS = ['engine', 'WIDTH', 'HEIGHT', 'P', 'L', 'S1', 'S2', 'S3', 'S4', 'RUNMODE']
+
+# Measures compared between two benchmark files, for all of which lower is
+# better, with the smallest change that is not taken for noise.
+COMPARED = {'setup_seconds': 1e-3, 'step_seconds': 1e-4, 'peak_memory': 1 << 20}
+
+
+def make_cases(engines, sizes, P, L, mixes, modes):
+    """
+    Builds every combination of the benchmark parameters.
+    :param engines: list of engine names.
+    :param sizes: list of grid sizes, the cells per side.
+    :param P: list of population densities.
+    :param L: list of L values.
+    :param mixes: list of (S1, S2, S3, S4) tuples.
+    :param modes: list of run modes ("R", "S", "F").
+    :return: list of dicts with the CASE_FIELDS.
+    """
+    cases = []
+    for engine, size, p, l, mix, mode in itertools.product(engines, sizes, P, L, mixes, modes):
+        cases.append(dict(zip(CASE_FIELDS, (engine, size, size, p, l, *mix, mode))))
+    return cases
+
+
+def case_key(case):
+    """
+    Identifies a case, to match it between two benchmark files.
+    :return: tuple of strings.
+    """
+    return tuple(str(case[field]) for field in CASE_FIELDS)
+
+
+def case_params(case, generations):
+    return Params(case['P'], case['L'], case['S1'], case['S2'], case['S3'], case['S4'], generations,
+                  case['RUNMODE'], case['WIDTH'], case['HEIGHT'])
+
+
+def run_case(case, generations, seed):
+    """
+    Sets up a simulation and steps it a fixed number of generations, also
+    after the rumor stopped spreading, so every run of a case does the same
+    work.
+    :return: (simulation, setup seconds, step seconds).
+    """
+    simulation = Simulation(case['engine'])
+    simulation.timing.enabled = True
+    start = time.perf_counter()
+    simulation.reset(case_params(case, generations), seed)
+    setup = time.perf_counter() - start
+    start = time.perf_counter()
+    for generation in range(generations):
+        simulation.step()
+    return simulation, setup, time.perf_counter() - start
+
+
+def measure(case, generations, repeats, seed=0):
+    """
+    Benchmarks one case. The times are the best of several runs; the peak
+    memory is measured by one more run with tracemalloc, which slows it down.
+    :param case: dict with the CASE_FIELDS.
+    :param generations: generations stepped per run.
+    :param repeats: number of timed runs.
+    :param seed: seed of every run.
+    :return: dict with the case and its measures.
+    """
+    setups = []
+    steps = []
+    for repeat in range(repeats):
+        simulation, setup, step = run_case(case, generations, seed)
+        setups.append(setup)
+        steps.append(step)
+
+    tracemalloc.start()
+    run_case(case, generations, seed)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    cells = case['WIDTH'] * case['HEIGHT']
+    step = min(steps) / generations
+    result = dict(case)
+    result.update(
+        generations=generations,
+        n_persons=simulation.n_persons,
+        final_infected=simulation.trand[-1],
+        setup_seconds=min(setups),
+        step_seconds=step,
+        throughput=cells / step if step > 0 else float('inf'),
+        peak_memory=peak,
+        phases={name: mean for name, calls, total, mean, longest in simulation.timing.summary()},
+    )
+    return result
+
+
+def environment():
+    """
+    Describes the machine and the code the benchmark ran on.
+    :return: dict.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=sys.path[0] or None).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.platform(),
+        'processor': platform.processor(),
+    }
+
+
+def benchmark(cases, generations, repeats, path, seed=0, report=print):
+    """
+    Benchmarks all the cases and writes the results to a JSON file.
+    :param cases: list of cases, see make_cases().
+    :param generations: generations stepped per run.
+    :param repeats: number of timed runs per case.
+    :param path: path of the JSON file.
+    :param seed: seed of every run.
+    :param report: function receiving progress messages.
+    :return: the results, as written.
+    """
+    results = {'environment': environment(), 'seed': seed, 'results': []}
+    for number, case in enumerate(cases, start=1):
+        result = measure(case, generations, repeats, seed)
+        results['results'].append(result)
+        report('%d/%d %s %dx%d P=%s L=%s %s: setup %.4f s, step %.6f s, %.3g cells*generations/s, %.1f MB'
+               % (number, len(cases), case['engine'], case['WIDTH'], case['HEIGHT'], case['P'], case['L'],
+                  case['RUNMODE'], result['setup_seconds'], result['step_seconds'], result['throughput'],
+                  result['peak_memory'] / 1e6))
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=1)
+    return results
+
+
+def compare(baseline, current, threshold=0.1, report=print):
+    """
+    Compares two benchmark results and reports the cases whose measures grew
+    by more than the threshold (and more than the noise, see COMPARED), or
+    whose final number of persons who heard the rumor changed, which means
+    the runs no longer do the same thing.
+    :param baseline: results of the reference commit, as read from JSON.
+    :param current: results to check.
+    :param threshold: allowed relative growth, 0.1 for 10%.
+    :param report: function receiving the messages.
+    :return: list of (case key, measure, baseline value, current value).
+    """
+    reference = {case_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        key = case_key(result)
+        base = reference.get(key)
+        if base is None:
+            continue
+        if base['final_infected'] != result['final_infected'] and base['generations'] == result['generations']:
+            regressions.append((key, 'final_infected', base['final_infected'], result['final_infected']))
+        for measure, noise in COMPARED.items():
+            if result[measure] > base[measure] * (1 + threshold) and result[measure] - base[measure] > noise:
+                regressions.append((key, measure, base[measure], result[measure]))
+    for key, measure, before, after in regressions:
+        report('%s: %s %.6g -> %.6g' % (' '.join(key), measure, before, after))
+    report('%d regressions beyond %d%%.' % (len(regressions), round(threshold * 100)))
+    return regressions
+
+
+def main():
+    """
+    Command line entry point, for example:
+    python benchmark.py --sizes 100 1000 --out after.json --baseline before.json
+    """
+    parser = argparse.ArgumentParser(description='Benchmarks the engines of the rumor automat.')
+    parser.add_argument('--engines', nargs='+', default=[VECTOR_ENGINE, FRONTIER_ENGINE],
+                        choices=[OBJECT_ENGINE, VECTOR_ENGINE, FRONTIER_ENGINE, BITBOARD_ENGINE, SPARSE_ENGINE,
+                                 TILED_ENGINE, GRAPH_ENGINE])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 500, 1000, 3000], help='cells per side')
+    parser.add_argument('--P', type=float, nargs='+', default=[0.3, 0.6, 0.9], help='population densities')
+    parser.add_argument('--L', type=int, nargs='+', default=[0, 2], help='L values')
+    parser.add_argument('--mix', type=parse_mix, nargs='+', default=[(0.3, 0.25, 0.2, 0.25)],
+                        help='skepticism mixes, each as S1,S2,S3,S4')
+    parser.add_argument('--modes', nargs='+', default=['R', 'S', 'F'], choices=['R', 'S', 'F'],
+                        help='run modes')
+    parser.add_argument('--generations', type=int, default=50, help='generations stepped per run')
+    parser.add_argument('--repeats', type=int, default=3, help='timed runs per case, the best is kept')
+    parser.add_argument('--seed', type=int, default=0, help='seed of every run')
+    parser.add_argument('--out', default='benchmark.json', help='JSON file the results are written to')
+    parser.add_argument('--baseline', help='JSON file of an earlier benchmark to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed relative slowdown')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='only compare two JSON files, without running anything')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+    else:
+        cases = make_cases(args.engines, args.sizes, args.P, args.L, args.mix, args.modes)
+        current = benchmark(cases, args.generations, args.repeats, args.out, args.seed)
+        if not args.baseline:
+            return
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if compare(baseline, current, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+import numpy as np
+
+from engine import NEIGHBOURHOOD, convince, sort_deliveries
+from recorder import row_bytes
+from timing import OFF
+
+# Bit planes of a BitboardEngine, the first axis of its planes array. A person's
+# skepticism code is 1 + LOW + 2 * HIGH. HEARD marks received_rumor_from > 0,
+# which is all the rules need of it, and SPREAD is scratch of propagate(). The
+# cooldown follows as one plane per bit, the least significant first.
+OCCUPIED, LOW, HIGH, HAS_RUMOR, IS_SPREADING, WAIT_TO_SPREAD, HEARD, SPREAD, COOLDOWN = range(9)
+
+# Cells per word of a plane.
+WORD = 64
+
+ONE = np.uint64(1)
+
+# Set bits of each byte value, to count bits on NumPy versions before 2.0,
+# which have no np.bitwise_count.
+BYTE_BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1, dtype=np.uint8)
+
+
+def pack(grid):
+    """
+    Packs a bool array row by row, 64 cells per word, the first cell of a word
+    in its least significant bit.
+    :param grid: bool array whose rows are a multiple of 64 cells long.
+    :return: uint64 array.
+    """
+    return np.packbits(grid, axis=-1, bitorder='little').view('<u8')
+
+
+def popcount(words):
+    """
+    Counts the set bits of a plane.
+    :param words: contiguous uint64 array.
+    :return: int.
+    """
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(words).sum())
+    return int(BYTE_BITS[words.view(np.uint8)].sum(dtype=np.int64))
+
+
+class BitboardEngine:
+    """
+    This class advances the automat like VectorEngine, with the same results
+    for the same random generator, but keeps each boolean field of the
+    persons as a bit plane: one bit per cell, 64 cells per word. The cooldown
+    is bit-sliced, one plane per bit, and counted down for all the cells at
+    once with word-wide logic. Only the turns, which fix the order of the
+    per-person pass, take a 16-bit number per cell; in all, a cell takes about
+    3 bytes instead of the 8 of VectorEngine.
+
+    Spreading stays per delivery, as in VectorEngine: the rules depend on the
+    turn of each spreader reaching a person, not only on how many reach it,
+    and random numbers are drawn only for the persons who hear the rumor.
+    """
+
+    # Names of the arrays that hold the whole state, see adopt().
+    state_arrays = ('turn', 'planes')
+
+    def __init__(self, shape, L, rng=None):
+        """
+        Engine constructor. Creates an empty grid; persons are added with
+        place().
+        :param shape: grid dimensions.
+        :param L: number of generations a person waits after spreading.
+        :param rng: numpy random generator.
+        :return: BitboardEngine object.
+        """
+        self.shape = shape
+        self.L = int(L)
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        # A row of cells is a row of words ending with at least one empty
+        # cell, and there is an empty row above and below the grid, so the
+        # neighbours of any cell are found by adding fixed offsets to its bit
+        # index, (i + 1) * stride + j.
+        self.stride = -(-(shape[1] + 1) // WORD) * WORD
+        self.offsets = np.array([di * self.stride + dj for di, dj in NEIGHBOURHOOD])
+        planes = COOLDOWN + max(self.L.bit_length(), 1)
+        self._planes = np.zeros((planes, shape[0] + 2, self.stride // WORD), dtype='<u8')
+        self._turn = np.zeros((shape[0] + 2, self.stride), dtype=np.uint16)
+        self.adopt({'turn': self._turn, 'planes': self._planes})
+
+    def adopt(self, arrays):
+        """
+        Takes over state arrays, for example arrays memory-mapped from a
+        checkpoint, instead of the engine's own.
+        :param arrays: dict with an array for each name in state_arrays.
+        :return: None.
+        """
+        self._turn = arrays['turn']
+        self._planes = arrays['planes']
+        self.words = self._planes.reshape(self._planes.shape[0], -1)
+        self.turns = self._turn.ravel()
+
+    @property
+    def nbytes(self):
+        """
+        Memory taken by the state arrays, in bytes.
+        """
+        return self._planes.nbytes + self._turn.nbytes
+
+    def get(self, plane, cells):
+        """
+        Reads the bits of some cells.
+        :param plane: index of the plane.
+        :param cells: int array of bit indices.
+        :return: bool array.
+        """
+        return ((self.words[plane][cells >> 6] >> (cells & 63).astype(np.uint64)) & ONE).astype(bool)
+
+    def set(self, plane, cells, value=True):
+        """
+        Sets or clears the bits of some cells.
+        :param plane: index of the plane.
+        :param cells: int array of bit indices.
+        :param value: True to set the bits, False to clear them.
+        :return: None.
+        """
+        bits = ONE << (cells & 63).astype(np.uint64)
+        if value:
+            np.bitwise_or.at(self.words[plane], cells >> 6, bits)
+        else:
+            np.bitwise_and.at(self.words[plane], cells >> 6, ~bits)
+
+    def cells(self, plane):
+        """
+        Lists the cells whose bit is set.
+        :param plane: index of the plane.
+        :return: sorted int array of bit indices.
+        """
+        words = self.words[plane]
+        nonzero = np.flatnonzero(words)
+        bits = np.unpackbits(words[nonzero].view(np.uint8), bitorder='little').reshape(-1, WORD)
+        word, bit = np.nonzero(bits)
+        return nonzero[word] * WORD + bit
+
+    def grid(self, plane):
+        """
+        Unpacks a plane.
+        :param plane: index of the plane.
+        :return: bool array indexed [i][j].
+        """
+        bits = np.unpackbits(self._planes[plane, 1:-1].view(np.uint8), axis=-1, bitorder='little')
+        return bits[:, :self.shape[1]].view(bool)
+
+    def place(self, i, j, skepticism, turn):
+        """
+        Puts persons on empty cells.
+        :param i: int array of the persons' first coordinate.
+        :param j: int array of the persons' second coordinate.
+        :param skepticism: uint8 array of skepticism codes (1..4).
+        :param turn: uint16 array, the order in which the persons are visited.
+        :return: None.
+        """
+        i = np.asarray(i) + 1
+        code = np.asarray(skepticism, dtype=np.uint8) - 1
+        grid = np.zeros(self._turn.shape, dtype=bool)
+        for plane, persons in ((OCCUPIED, Ellipsis), (LOW, code & 1 == 1), (HIGH, code & 2 == 2)):
+            grid[...] = False
+            grid[i[persons], j[persons]] = True
+            self._planes[plane] |= pack(grid)
+        self._turn[i, j] = turn
+
+    def skepticism_of(self, cells):
+        """
+        Returns the skepticism codes (1..4) of occupied cells.
+        """
+        return (1 + self.get(LOW, cells) + 2 * self.get(HIGH, cells).astype(np.uint8)).astype(np.uint8)
+
+    def start_cooldown(self, cells):
+        """
+        Sets the cooldown of some cells to L.
+        """
+        for bit in range(self._planes.shape[0] - COOLDOWN):
+            self.set(COOLDOWN + bit, cells, self.L >> bit & 1)
+
+    def start_rumor(self, i, j):
+        """
+        Makes the person on [i][j] hear the rumor and spread it to its
+        neighbours, like set() does with the chosen spreader.
+        :param i: first coordinate of the person.
+        :param j: second coordinate of the person.
+        :return: None.
+        """
+        cell = np.array([(i + 1) * self.stride + j])
+        self.set(HAS_RUMOR, cell)
+        targets = cell + self.offsets
+        targets = targets[self.get(OCCUPIED, targets)]
+        receivers, convinced, _ = self.deliver(targets, np.repeat(self.turns[cell], targets.size))
+        self.set(HAS_RUMOR, receivers)
+        self.set(IS_SPREADING, convinced)
+        self.set(WAIT_TO_SPREAD, cell)
+        self.start_cooldown(cell)
+
+    @property
+    def occupied(self):
+        return self.grid(OCCUPIED)
+
+    def packed(self, name):
+        """
+        Packs a field of the persons for a recording. The rows of a
+        recording have the bit order of the planes, so they are the first
+        bytes of each row of words, and the cells past the grid are empty.
+        :param name: 'has_rumor' or 'is_spreading'.
+        :return: uint8 array.
+        """
+        plane = HAS_RUMOR if name == 'has_rumor' else IS_SPREADING
+        return self._planes[plane, 1:-1].view(np.uint8)[:, :row_bytes(self.shape)].ravel()
+
+    @property
+    def has_rumor(self):
+        return self.grid(HAS_RUMOR)
+
+    @property
+    def is_spreading(self):
+        return self.grid(IS_SPREADING)
+
+    @property
+    def wait_to_spread(self):
+        return self.grid(WAIT_TO_SPREAD)
+
+    @property
+    def absorbed(self):
+        """
+        Tells if the automat can no longer change: nobody is spreading the
+        rumor or waiting after spreading it.
+        """
+        return not (self.words[IS_SPREADING].any() or self.words[WAIT_TO_SPREAD].any())
+
+    def count_infected(self):
+        return popcount(self.words[HAS_RUMOR])
+
+    def uniforms(self, targets):
+        """
+        Draws one uniform random number for each delivery.
+        :param targets: sorted bit indices of the receivers.
+        :return: float array.
+        """
+        return self.rng.random(targets.size)
+
+    def deliver(self, targets, turns):
+        """
+        Delivers a batch of rumors, see engine.deliver().
+        :param targets: int array, bit index of the receiver of each delivery.
+        :param turns: int array, turn of the spreader of each delivery.
+        :return: (receivers, convinced, convinced_at), see engine.deliver().
+        """
+        if targets.size == 0:
+            return targets, targets, targets
+        targets, turns, starts = sort_deliveries(targets, turns)
+        receivers = targets[starts]
+        convinced, convinced_at = convince(targets, turns, starts, self.skepticism_of(targets),
+                                           ~self.get(HEARD, receivers), self.uniforms)
+        self.set(HEARD, receivers)
+        return receivers, convinced, convinced_at
+
+    def propagate(self, fire):
+        """
+        Runs the spreading waves of a generation, like VectorEngine.propagate.
+        :param fire: bit indices of the persons spreading at their turn.
+        :return: number of persons who heard the rumor for the first time.
+        """
+        spread_lists = []
+        newly = 0
+        while fire.size:
+            self.set(SPREAD, fire)
+            spread_lists.append(fire)
+            self.set(WAIT_TO_SPREAD, fire)
+            self.start_cooldown(fire)
+            self.set(IS_SPREADING, fire, False)
+
+            # Deliver the rumor to the occupied neighbours of the spreaders.
+            sources = np.repeat(fire, self.offsets.size)
+            targets = (fire[:, None] + self.offsets).ravel()
+            occupied = self.get(OCCUPIED, targets)
+            receivers, convinced, convinced_at = self.deliver(targets[occupied], self.turns[sources[occupied]])
+            newly += receivers.size - int(np.count_nonzero(self.get(HAS_RUMOR, receivers)))
+            self.set(HAS_RUMOR, receivers)
+            before_turn = convinced_at < self.turns[convinced]
+
+            # Convinced after their turn: they spread next generation.
+            self.set(IS_SPREADING, convinced[~before_turn])
+            # Convinced before their turn: they spread in this generation,
+            # unless they are still waiting or spread already.
+            early = convinced[before_turn]
+            fire = early[~self.get(WAIT_TO_SPREAD, early) & ~self.get(SPREAD, early)]
+
+        for fire in spread_lists:
+            self.set(SPREAD, fire, False)
+        return newly
+
+    def step(self, timing=OFF):
+        """
+        Advances the engine by one generation, following Population.check_spread
+        and Population.spread_rumor.
+        :param timing: Timing to record the phases of the generation in.
+        :return: number of persons who heard the rumor before the spreading.
+        """
+        with timing.phase('count'):
+            infected = self.count_infected()
+
+        words = self.words
+        with timing.phase('spread'):
+            # Persons that spread lately wait L generations (check_spread):
+            # the cooldown of those still waiting is counted down by one,
+            # borrowing from bit to bit.
+            cooldown = words[COOLDOWN:]
+            blocked = words[WAIT_TO_SPREAD] & np.bitwise_or.reduce(cooldown, axis=0)
+            borrow = blocked
+            for bit in cooldown:
+                was = bit.copy()
+                bit ^= borrow
+                borrow = borrow & ~was
+            words[IS_SPREADING] &= ~blocked
+            words[WAIT_TO_SPREAD] = blocked
+
+            self.propagate(self.cells(IS_SPREADING))
+
+        # init the received_rumor_from for all persons.
+        with timing.phase('reset'):
+            words[HEARD] = 0
+        return infected
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from simulation import VECTOR_ENGINE, Params, Simulation, seed_sequence
+
+# Directory and size limit of the cache, unless told otherwise.
+CACHE_DIR = '.rumor_cache'
+MAX_BYTES = 256 * 1024 * 1024
+
+# Modules whose code decides the result of a run. Changing any of them changes
+# the keys, so results of older code are never returned.
+CODE_MODULES = ('simulation', 'engine', 'population', 'adjacency', 'bitboard', 'sparse', 'tiles', 'graph')
+
+# Summary metrics stored with each run, the result columns of a sweep.
+SUMMARY_FIELDS = ['n_persons', 'final_infected', 'final_reach', 'gen_to_half', 'gen_to_90', 'generations',
+                  'stop_reason', 'seconds']
+
+
+def code_version():
+    """
+    Fingerprints the code that runs the simulation, and the NumPy version,
+    whose random streams it relies on.
+    :return: hex string.
+    """
+    digest = hashlib.sha256(np.__version__.encode())
+    folder = os.path.dirname(os.path.abspath(__file__))
+    for name in CODE_MODULES:
+        with open(os.path.join(folder, name + '.py'), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+CODE_VERSION = code_version()
+
+
+def plain(value):
+    """
+    Writes a parameter the same way whatever its type, so 1, 1.0 and
+    np.float64(1) give the same key.
+    """
+    return value if isinstance(value, str) else float(value)
+
+
+def run_key(params, seed, engine=VECTOR_ENGINE, flat_window=None, limit=None):
+    """
+    Names a run by everything that decides its result: the parameters, the
+    seed, the engine, when the run stops and the code version.
+    :param params: Params, or a tuple in the same order.
+    :param seed: int or SeedSequence; runs with fresh entropy cannot be
+    repeated, so they have no key.
+    :param engine: engine of the run, see Simulation.
+    :param flat_window: see Simulation.
+    :param limit: number of generations the run may take, defaults to the
+    generation limit of the parameters.
+    :return: hex string.
+    """
+    if seed is None:
+        raise ValueError('A run without a seed cannot be repeated, so it cannot be cached.')
+    params = Params(*params)
+    seed = seed_sequence(seed)
+    content = {
+        'params': [plain(value) for value in params],
+        'seed': [seed.entropy, list(seed.spawn_key), seed.pool_size],
+        'engine': engine,
+        'flat_window': flat_window,
+        'limit': plain(params.GL if limit is None else limit),
+        'code': CODE_VERSION,
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+def generation_reaching(trand, fraction):
+    """
+    Returns the first generation (counted from 1) in which the number of
+    persons who heard the rumor reached the given fraction of its final value.
+    """
+    target = fraction * trand[-1]
+    for generation, infected in enumerate(trand, start=1):
+        if infected >= target:
+            return generation
+    return len(trand)
+
+
+def summarize(simulation, seconds=None):
+    """
+    Sums up a finished run.
+    :param simulation: Simulation object that ran.
+    :param seconds: time the run took, if known.
+    :return: dict with the SUMMARY_FIELDS.
+    """
+    trand = simulation.trand
+    return {
+        'n_persons': int(simulation.n_persons),
+        'final_infected': int(trand[-1]),
+        'final_reach': trand[-1] / simulation.n_persons if simulation.n_persons else 0.0,
+        'gen_to_half': generation_reaching(trand, 0.5),
+        'gen_to_90': generation_reaching(trand, 0.9),
+        'generations': simulation.generation,
+        'stop_reason': simulation.stop_reason,
+        'seconds': seconds,
+    }
+
+
+class ResultCache:
+    """
+    This class keeps the results of finished runs on disk, one small JSON
+    file per run named by its run_key(), holding the trand series and the
+    summary metrics. A run that is in the cache does not need to be set up or
+    run again. When the files take more than max_bytes, the least recently
+    used ones are removed; the modification time of a file is its last use.
+    The hits and misses of get() are counted.
+    """
+
+    def __init__(self, path=CACHE_DIR, max_bytes=MAX_BYTES):
+        """
+        ResultCache constructor. The directory is created if needed.
+        :param path: directory of the cache.
+        :param max_bytes: most bytes the cached files may take.
+        :return: ResultCache object.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.size = None  # Bytes taken by the files, counted on the first put().
+        os.makedirs(path, exist_ok=True)
+
+    def file(self, key):
+        """
+        Returns the path of the file of a run.
+        """
+        return os.path.join(self.path, key + '.json')
+
+    def get(self, key):
+        """
+        Looks up a run, and marks it as used.
+        :param key: see run_key().
+        :return: (trand, summary) -- the list of the number of persons who
+        heard the rumor in each generation, and a dict with the
+        SUMMARY_FIELDS; or None if the run is not in the cache.
+        """
+        try:
+            with open(self.file(key)) as f:
+                entry = json.load(f)
+            os.utime(self.file(key))
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry['trand'], entry['summary']
+
+    def put(self, key, trand, summary):
+        """
+        Stores a finished run, and removes the least recently used runs if the
+        cache grew too large. The file is written next to its place and then
+        moved there, so a cached run is always complete.
+        :param key: see run_key().
+        :param trand: number of persons who heard the rumor in each generation.
+        :param summary: dict with the SUMMARY_FIELDS, see summarize().
+        :return: None.
+        """
+        data = json.dumps({'trand': [int(infected) for infected in trand], 'summary': summary}).encode()
+        path = self.file(key)
+        temporary = path + '.tmp'
+        try:
+            replaced = os.stat(path).st_size  # A run stored again replaces its file.
+        except FileNotFoundError:
+            replaced = 0
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+
+        if self.size is None:
+            self.evict()
+        else:
+            self.size += len(data) - replaced
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used runs until the files take at most
+        max_bytes, and counts what is left.
+        :return: None.
+        """
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith('.json'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.size = total
+
+    def run(self, params, seed, engine=VECTOR_ENGINE, flat_window=None):
+        """
+        Runs a simulation headless to its generation limit, like
+        Simulation.run(), unless the same run is in the cache already.
+        :param params: Params, or a tuple in the same order.
+        :param seed: int or SeedSequence.
+        :param engine: see Simulation.
+        :param flat_window: see Simulation.
+        :return: (trand, summary), see get().
+        """
+        key = run_key(params, seed, engine, flat_window)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        start = time.perf_counter()
+        simulation = Simulation(engine, flat_window)
+        simulation.reset(params, seed)
+        trand = simulation.run()
+        summary = summarize(simulation, time.perf_counter() - start)
+        self.put(key, trand, summary)
+        return trand, summary
@@ -0,0 +1,165 @@
+import json
+import os
+
+import numpy as np
+
+from population import PERSON_ARRAYS, Population
+from simulation import ARRAY_ENGINES, GENERATION_LIMIT, Simulation
+
+# A checkpoint file starts with MAGIC and the length of a JSON header, followed
+# by the header and by the raw arrays. Each array starts at a multiple of
+# ALIGNMENT bytes, so it can be memory-mapped straight from the file.
+MAGIC = b'RUMORCKP'
+VERSION = 1
+ALIGNMENT = 64
+
+# Attributes of a Simulation stored in the header.
+SCALARS = ['engine', 'flat_window', 'stop_reason', 'generation', 'width', 'height', 'p', 'l', 's1', 's2', 's3', 's4',
+           'gen_limit', 'infected_persons', 'n_persons', 'n_s1', 'n_s2', 'n_s3', 'n_s4']
+
+
+def aligned(size):
+    """
+    Rounds a size up to a multiple of ALIGNMENT.
+    """
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+def plain(value):
+    """
+    Converts NumPy scalars to Python ones, for the JSON header.
+    """
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def save(simulation, path):
+    """
+    Writes the whole state of a simulation to a checkpoint file: the
+    parameters, the generation, the trand history, the state of the random
+    generator and the state of every person. The file is written next to path
+    and then moved over it, so a crash while saving leaves the previous
+    checkpoint intact.
+    :param simulation: Simulation object.
+    :param path: path of the checkpoint file.
+    :return: None.
+    """
+    arrays = {'trand': np.array(simulation.trand, dtype=np.int64)}
+    if simulation.vector is not None:
+        for name in simulation.vector.state_arrays:
+            arrays['engine/' + name] = getattr(simulation.vector, '_' + name)
+    else:
+        for name in PERSON_ARRAYS:
+            arrays['population/' + name] = getattr(simulation.population, name)
+
+    # Offsets are counted from the end of the header.
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': array.dtype.str, 'shape': array.shape, 'offset': offset}
+        offset = aligned(offset + array.nbytes)
+
+    seed = simulation.seed
+    header = {
+        'version': VERSION,
+        'simulation': {name: plain(getattr(simulation, name)) for name in SCALARS},
+        'seed': {'entropy': seed.entropy, 'spawn_key': seed.spawn_key, 'pool_size': seed.pool_size},
+        'rng': simulation.rng.bit_generator.state,
+        'arrays': layout,
+    }
+    header = json.dumps(header).encode()
+    start = aligned(len(MAGIC) + 8 + len(header))
+
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(start + layout[name]['offset'])
+            np.ascontiguousarray(array).tofile(f)
+        f.truncate(start + offset)
+    os.replace(temporary, path)
+
+
+def read(path, mode='r'):
+    """
+    Opens a checkpoint file without reading the arrays: they are memory-mapped,
+    so only the parts that are used are loaded.
+    :param path: path of the checkpoint file.
+    :param mode: memory-map mode, 'r' to read only or 'c' for copy-on-write
+    arrays that can be changed without changing the file.
+    :return: (header, arrays) -- the header as a dict, and a dict of arrays.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('%s is not a checkpoint file.' % path)
+        length = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+        header = json.loads(f.read(length))
+    if header['version'] != VERSION:
+        raise ValueError('Unsupported checkpoint version: %s' % header['version'])
+
+    start = aligned(len(MAGIC) + 8 + length)
+    arrays = {}
+    for name, entry in header['arrays'].items():
+        shape = tuple(entry['shape'])
+        if np.prod(shape) == 0:
+            arrays[name] = np.zeros(shape, dtype=entry['dtype'])
+        else:
+            arrays[name] = np.memmap(path, dtype=entry['dtype'], mode=mode, offset=start + entry['offset'],
+                                     shape=shape)
+    return header, arrays
+
+
+def load(path):
+    """
+    Rebuilds a simulation from a checkpoint file, ready to go on from the
+    generation it was saved at, exactly as it would have without stopping.
+    The grids of the array engines stay memory-mapped (copy-on-write), so
+    loading a large grid is quick.
+    :param path: path of the checkpoint file.
+    :return: Simulation object.
+    """
+    header, arrays = read(path, mode='c')
+    scalars = header['simulation']
+    simulation = Simulation(scalars['engine'], scalars['flat_window'])
+    for name in SCALARS:
+        setattr(simulation, name, scalars[name])
+
+    seed = header['seed']
+    simulation.reseed(np.random.SeedSequence(seed['entropy'], spawn_key=tuple(seed['spawn_key']),
+                                             pool_size=seed['pool_size']))
+    simulation.rng.bit_generator.state = header['rng']
+    simulation.trand = arrays['trand'].tolist()
+
+    shape = (simulation.width, simulation.height)
+    engine_class = ARRAY_ENGINES.get(simulation.engine)
+    if engine_class is not None:
+        simulation.vector = engine_class(shape, simulation.l, simulation.rng)
+        simulation.vector.adopt({name: arrays['engine/' + name] for name in engine_class.state_arrays})
+    else:
+        people = {name: arrays['population/' + name] for name in PERSON_ARRAYS}
+        simulation.population = Population(people['i'], people['j'], people['skepticism'], shape, simulation.l)
+        simulation.population.restore(people)
+    return simulation
+
+
+def run_with_checkpoints(simulation, path, every, max_generations=None):
+    """
+    Runs a simulation like Simulation.run(), saving a checkpoint every few
+    generations and at the end. If the checkpoint file exists, the run goes
+    on from it instead, so a job that was interrupted can simply be started
+    again, also on another machine.
+    :param simulation: Simulation object, already reset.
+    :param path: path of the checkpoint file.
+    :param every: number of generations between checkpoints.
+    :param max_generations: see Simulation.run().
+    :return: the Simulation object that ran, loaded from path if it existed.
+    """
+    if os.path.exists(path):
+        simulation = load(path)
+    limit = simulation.gen_limit if max_generations is None else max_generations
+    while True:
+        simulation.run(min(simulation.generation + every, limit))
+        save(simulation, path)
+        if simulation.stop_reason != GENERATION_LIMIT or simulation.generation >= limit:
+            return simulation
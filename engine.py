@@ -0,0 +1,584 @@
+import numpy as np
+
+from recorder import pack_grid
+from timing import OFF
+
+# Skepticism levels are stored as small integer codes: 0 marks an empty cell,
+# and 1..4 stand for "S1".."S4".
+EMPTY = 0
+SKEPTICISM_CODES = {"S1": 1, "S2": 2, "S3": 3, "S4": 4}
+
+# Turns are stored as 16-bit keys that keep the order of the persons' list.
+TURN_BITS = 16
+TURN_KEYS = 1 << TURN_BITS
+
+# The arrays holding the state of an engine. Each is kept with a border as
+# _name, and without it as name.
+STATE_ARRAYS = ('skepticism', 'turn', 'has_rumor', 'is_spreading', 'wait_to_spread', 'cooldown', 'received')
+
+# The 8 neighbours of a cell, as (di, dj) offsets.
+NEIGHBOURHOOD = [(di, dj) for di in range(-1, 2) for dj in range(-1, 2) if di or dj]
+
+
+def build_belief_table():
+    """
+    Builds the odds of Population.spread_rumor: table[code, heard] is the chance
+    that a person of the given skepticism code decides to spread the rumor when
+    hearing it, where heard is 1 for the first time in a generation and 2 from
+    the second time on.
+    :return: float array of shape (5, 3).
+    """
+    table = np.zeros((5, 3))
+    table[1, 1:] = 1, 1
+    table[2, 1:] = 2 / 3, 1
+    table[3, 1:] = 1 / 3, 2 / 3
+    table[4, 1:] = 0, 1 / 3
+    return table
+
+
+BELIEF = build_belief_table()
+
+# The odds of BELIEF for hearing the rumor twice or more, then once, so that
+# code * 2 + once indexes them.
+ODDS = BELIEF[:, :0:-1].ravel()
+
+
+def visiting_turns(n_persons):
+    """
+    Turn keys for persons visited in the order they are listed.
+    :param n_persons: number of persons.
+    :return: uint16 array.
+    """
+    return (np.arange(n_persons, dtype=np.int64) * TURN_KEYS // max(n_persons, 1)).astype(np.uint16)
+
+
+def delivery_keys(targets, turns):
+    """
+    Packs a batch of deliveries into single keys, target * TURN_KEYS + turn,
+    which sort by target, then by turn.
+    :param targets: int array, flat index of the receiver of each delivery.
+    :param turns: int array, turn of the spreader of each delivery.
+    :return: int64 array.
+    """
+    return (targets.astype(np.int64, copy=False) << TURN_BITS) | turns
+
+
+def sort_deliveries(targets, turns):
+    """
+    Sorts a batch of deliveries by target, then by turn, with a single key.
+    :param targets: int array, flat index of the receiver of each delivery.
+    :param turns: int array, turn of the spreader of each delivery.
+    :return: (targets, turns, starts) -- the sorted deliveries, and the
+    position of the first delivery to each receiver.
+    """
+    return split_keys(np.sort(delivery_keys(targets, turns)))
+
+
+def split_keys(keys):
+    """
+    Unpacks sorted delivery keys, see sort_deliveries().
+    :param keys: sorted int array, see delivery_keys().
+    :return: (targets, turns, starts), see sort_deliveries().
+    """
+    # Indexing with any other type than intp goes through a copy.
+    targets = (keys >> TURN_BITS).astype(np.intp, copy=False)
+    return targets, keys & (TURN_KEYS - 1), firsts(targets).nonzero()[0]
+
+
+def firsts(values):
+    """
+    Marks the first of each run of equal values.
+    :param values: array.
+    :return: bool array.
+    """
+    first = np.empty(values.size, dtype=bool)
+    first[:1] = True
+    first[1:] = values[1:] != values[:-1]
+    return first
+
+
+def convince(targets, turns, starts, codes, fresh, uniforms):
+    """
+    Decides who is convinced by a batch of sorted deliveries, see deliver().
+    :param targets: sorted deliveries, see sort_deliveries().
+    :param turns: sorted deliveries, see sort_deliveries().
+    :param starts: see sort_deliveries().
+    :param codes: skepticism code of the target of each delivery.
+    :param fresh: bool array, for each receiver whether it heard nothing yet
+    in this generation.
+    :param uniforms: see deliver().
+    :return: (convinced, convinced_at), see deliver().
+    """
+    # Only the first delivery to a fresh receiver counts as hearing the rumor
+    # once; any other counts as twice or more.
+    heard = codes * 2
+    heard[starts] += fresh
+    success = (uniforms(targets) < ODDS.take(heard)).nonzero()[0]
+    # The deliveries to a receiver are in the order of turns, so the first
+    # that succeeds is the one that convinces it.
+    convinced = targets[success]
+    first = firsts(convinced)
+    return convinced.compress(first), turns.take(success.compress(first))
+
+
+def deliver(targets, turns, skepticism, received, uniforms):
+    """
+    Delivers a batch of rumors and decides who is convinced by them. Each
+    delivery is a (target, turn) pair, where turn is the position of the
+    spreader in the per-person pass. Like Population.spread_rumor, every delivery
+    draws its own coin, with odds that depend on how many times the target
+    heard the rumor so far; deliveries reach a target in the order of turns.
+    :param targets: int array, flat index of the receiver of each delivery.
+    :param turns: int array, turn of the spreader of each delivery.
+    :param skepticism: flat uint8 array of skepticism codes.
+    :param received: flat array of received_rumor_from, updated in place;
+    only whether it is 0 matters to the rules, so it is set to 1 instead of
+    counting the deliveries.
+    :param uniforms: function returning one uniform random number for each
+    delivery, given the sorted targets.
+    :return: (receivers, convinced, convinced_at) -- every receiver once, the
+    receivers who were convinced, and for each of them the turn of the
+    delivery that convinced it.
+    """
+    return deliver_keys(delivery_keys(targets, turns), skepticism, received, uniforms)
+
+
+def deliver_keys(keys, skepticism, received, uniforms):
+    """
+    Delivers a batch of rumors packed as keys, see deliver().
+    :param keys: int array, see delivery_keys(), in any order.
+    :return: (receivers, convinced, convinced_at), see deliver().
+    """
+    if keys.size == 0:
+        return keys, keys, keys
+
+    targets, turns, starts = split_keys(np.sort(keys))
+    receivers = targets[starts]
+    convinced, convinced_at = convince(targets, turns, starts, skepticism[targets], received[receivers] == 0,
+                                       uniforms)
+    received[receivers] = 1
+    return receivers, convinced, convinced_at
+
+
+class VectorEngine:
+    """
+    This class advances the automat with NumPy array operations instead of
+    walking the persons one by one. Every field of a Population is kept as an
+    array indexed like the grid, i.e. [i][j], and a "turn" array remembers the
+    position of each person in the list of persons. The arrays have a border
+    of empty cells, so the neighbours of any cell are found by adding fixed
+    offsets to its flat index.
+
+    The per-person engine visits the persons in list order, so a person who is
+    convinced before its turn spreads in the same generation. This engine
+    replays that by spreading in waves: the spreaders of a wave deliver the
+    rumor to their neighbours at once, and whoever was convinced before its own
+    turn spreads in the next wave of the same generation.
+    """
+
+    # Names of the arrays that hold the whole state, see adopt().
+    state_arrays = STATE_ARRAYS
+
+    def __init__(self, shape, L, rng=None):
+        """
+        Engine constructor. Creates an empty grid; persons are added with
+        from_population() or place().
+        :param shape: grid dimensions.
+        :param L: number of generations a person waits after spreading.
+        :param rng: numpy random generator.
+        :return: VectorEngine object.
+        """
+        self.shape = shape
+        self.L = L
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.allocate((shape[0] + 2, shape[1] + 2))
+
+    def allocate(self, padded):
+        """
+        Creates the state arrays with their border of empty cells. The arrays
+        use the smallest types that fit, about 8 bytes per cell in total.
+        :param padded: shape of the arrays, including the border.
+        :return: None.
+        """
+        self.padded = padded
+        self.offsets = np.array([di * padded[-1] + dj for di, dj in NEIGHBOURHOOD])
+        # Delivery keys of small grids fit in 32 bits, which sort twice as fast.
+        self.key_type = np.int32 if np.prod(padded) < 1 << (31 - TURN_BITS) else np.int64
+        self.key_offsets = (self.offsets << TURN_BITS).astype(self.key_type)
+        self._skepticism = np.zeros(padded, dtype=np.uint8)
+        self._turn = np.zeros(padded, dtype=np.uint16)
+        self._has_rumor = np.zeros(padded, dtype=bool)
+        self._is_spreading = np.zeros(padded, dtype=bool)
+        self._wait_to_spread = np.zeros(padded, dtype=bool)
+        self._cooldown = np.zeros(padded, dtype=np.min_scalar_type(self.L))
+        self._received = np.zeros(padded, dtype=np.uint8)
+
+        # Views of the arrays without the border, indexed [i][j].
+        self.skepticism = self._skepticism[..., 1:-1, 1:-1]
+        self.turn = self._turn[..., 1:-1, 1:-1]
+        self.has_rumor = self._has_rumor[..., 1:-1, 1:-1]
+        self.is_spreading = self._is_spreading[..., 1:-1, 1:-1]
+        self.wait_to_spread = self._wait_to_spread[..., 1:-1, 1:-1]
+        self.cooldown = self._cooldown[..., 1:-1, 1:-1]
+        self.received = self._received[..., 1:-1, 1:-1]
+
+    @property
+    def nbytes(self):
+        """
+        Memory taken by the state arrays, in bytes.
+        """
+        return sum(getattr(self, '_' + name).nbytes for name in self.state_arrays)
+
+    def adopt(self, arrays):
+        """
+        Takes over state arrays with their border, for example arrays
+        memory-mapped from a checkpoint, instead of the engine's own.
+        :param arrays: dict with an array for each name in state_arrays.
+        :return: None.
+        """
+        for name in self.state_arrays:
+            setattr(self, '_' + name, arrays[name])
+            setattr(self, name, arrays[name][..., 1:-1, 1:-1])
+
+    @classmethod
+    def from_population(cls, population, rng=None):
+        """
+        Builds an engine holding the same state as a Population, so a run
+        started person by person can go on with arrays.
+        :param population: Population object.
+        :param rng: numpy random generator.
+        :return: VectorEngine object.
+        """
+        engine = cls(population.shape, population.L, rng)
+        engine.load(population)
+        return engine
+
+    def load(self, population, replicate=Ellipsis):
+        """
+        Copies the state of a Population into the arrays. The persons keep
+        their order through the turn keys.
+        :param population: Population object.
+        :param replicate: index of the grid to fill, for engines holding many.
+        :return: None.
+        """
+        i, j = population.i, population.j
+        self.skepticism[replicate][i, j] = population.skepticism
+        self.turn[replicate][i, j] = visiting_turns(len(population))
+        self.has_rumor[replicate][i, j] = population.has_rumor
+        self.is_spreading[replicate][i, j] = population.is_spreading
+        self.wait_to_spread[replicate][i, j] = population.wait_to_spread
+        self.cooldown[replicate][i, j] = population.cooldown
+        self.received[replicate][i, j] = population.received
+
+    def place(self, i, j, skepticism, turn):
+        """
+        Puts persons on empty cells.
+        :param i: int array of the persons' first coordinate.
+        :param j: int array of the persons' second coordinate.
+        :param skepticism: uint8 array of skepticism codes (1..4).
+        :param turn: uint16 array, the order in which the persons are visited.
+        :return: None.
+        """
+        self.skepticism[i, j] = skepticism
+        self.turn[i, j] = turn
+
+    def start_rumor(self, i, j):
+        """
+        Makes the person on [i][j] hear the rumor and spread it to its
+        neighbours, like set() does with the chosen spreader.
+        :param i: first coordinate of the person.
+        :param j: second coordinate of the person.
+        :return: None.
+        """
+        skepticism = self._skepticism.ravel()
+        received = self._received.ravel()
+        cell = (i + 1) * self.padded[-1] + j + 1
+
+        self._has_rumor.ravel()[cell] = True
+        targets = cell + self.offsets
+        targets = targets[skepticism[targets] != EMPTY]
+        turns = np.full(targets.size, self._turn.ravel()[cell])
+        receivers, convinced, _ = deliver(targets, turns, skepticism, received, self.uniforms)
+        self._has_rumor.ravel()[receivers] = True
+        self._is_spreading.ravel()[convinced] = True
+        self._wait_to_spread.ravel()[cell] = True
+        self._cooldown.ravel()[cell] = self.L
+
+    @property
+    def occupied(self):
+        return self.skepticism != EMPTY
+
+    @property
+    def absorbed(self):
+        """
+        Tells if the automat can no longer change: nobody is spreading the
+        rumor or waiting after spreading it.
+        """
+        return not (self._is_spreading.any() or self._wait_to_spread.any())
+
+    def count_infected(self):
+        return int(np.count_nonzero(self._has_rumor))
+
+    def packed(self, name):
+        """
+        Packs a field of the persons for a recording, see recorder.pack_grid.
+        :param name: 'has_rumor' or 'is_spreading'.
+        :return: uint8 array.
+        """
+        return pack_grid(getattr(self, name))
+
+    def uniforms(self, targets):
+        """
+        Draws one uniform random number for each delivery.
+        :param targets: sorted flat indices of the receivers.
+        :return: float array.
+        """
+        return self.rng.random(targets.size)
+
+    def deliveries(self, persons):
+        """
+        Lists the deliveries of some persons spreading the rumor: one to each
+        of their occupied neighbours, built right away as keys.
+        :param persons: flat indices of the persons.
+        :return: array of delivery keys, see delivery_keys(), of key_type.
+        """
+        keys = np.left_shift(persons, TURN_BITS, dtype=self.key_type)
+        keys |= self._turn.ravel()[persons]
+        # A row for each neighbour rather than for each person: NumPy works
+        # through long rows much faster than through rows of 8.
+        keys = self.key_offsets[:, None] + keys
+        occupied = self._skepticism.ravel()[self.offsets[:, None] + persons] != EMPTY
+        return keys.ravel().compress(occupied.ravel())
+
+    def propagate(self, fire):
+        """
+        Runs the spreading waves of a generation, following
+        Population.spread_rumor.
+        :param fire: flat indices of the persons spreading at their turn.
+        :return: (spread, heard, later, newly) -- lists of flat index arrays of
+        the persons who spread, who heard the rumor, and who were convinced
+        after their turn and spread next generation; and the number of persons
+        who heard the rumor for the first time.
+        """
+        skepticism = self._skepticism.ravel()
+        turn = self._turn.ravel()
+        has_rumor = self._has_rumor.ravel()
+        is_spreading = self._is_spreading.ravel()
+        wait_to_spread = self._wait_to_spread.ravel()
+        cooldown = self._cooldown.ravel()
+        received = self._received.ravel()
+
+        spread_lists = []
+        heard_lists = []
+        later_lists = []
+        newly = 0
+        while fire.size:
+            spread_lists.append(fire)
+            wait_to_spread[fire] = True
+            cooldown[fire] = self.L
+            is_spreading[fire] = False
+
+            # Deliver the rumor to the occupied neighbours of the spreaders.
+            receivers, convinced, convinced_at = deliver_keys(self.deliveries(fire), skepticism, received,
+                                                              self.uniforms)
+            heard_lists.append(receivers)
+            newly += receivers.size - int(np.count_nonzero(has_rumor[receivers]))
+            has_rumor[receivers] = True
+
+            # Convinced after their turn: they spread next generation.
+            before_turn = convinced_at < turn[convinced]
+            later_lists.append(convinced.compress(~before_turn))
+            is_spreading[later_lists[-1]] = True
+            # Convinced before their turn: they spread in this generation,
+            # unless they are still waiting, as everyone who spread already is.
+            fire = convinced.compress(before_turn > wait_to_spread[convinced])
+        return spread_lists, heard_lists, later_lists, newly
+
+    def step(self, timing=OFF):
+        """
+        Advances the engine by one generation, following Population.check_spread
+        and Population.spread_rumor.
+        :param timing: Timing to record the phases of the generation in.
+        :return: number of persons who heard the rumor before the spreading.
+        """
+        with timing.phase('count'):
+            infected = self.count_infected()
+
+        is_spreading = self._is_spreading.ravel()
+        wait_to_spread = self._wait_to_spread.ravel()
+        cooldown = self._cooldown.ravel()
+
+        with timing.phase('spread'):
+            # Persons that spread lately wait L generations (check_spread).
+            waiting = np.flatnonzero(wait_to_spread)
+            blocked = waiting[cooldown[waiting] > 0]
+            cooldown[blocked] -= 1
+            is_spreading[blocked] = False
+            wait_to_spread[waiting] = False
+            wait_to_spread[blocked] = True
+
+            self.propagate(np.flatnonzero(is_spreading))
+
+        # init the received_rumor_from for all persons.
+        with timing.phase('reset'):
+            self._received[...] = 0
+        return infected
+
+
+class FrontierEngine(VectorEngine):
+    """
+    This class advances the automat like VectorEngine, but keeps explicit lists
+    of the persons who are spreading and of those who are waiting after
+    spreading, and a running count of the persons who heard the rumor. A
+    generation touches only these persons and their neighbours, so its cost
+    follows the size of the rumor's frontier rather than the population.
+    """
+
+    def __init__(self, shape, L, rng=None):
+        """
+        Engine constructor, see VectorEngine. The lists are built from the
+        arrays on the first step.
+        :return: FrontierEngine object.
+        """
+        super().__init__(shape, L, rng)
+        self.spreading = None  # Flat indices of the persons with is_spreading.
+        self.waiting = None  # Flat indices of the persons with wait_to_spread.
+        self.touched = None  # Flat indices of non-zero received_rumor_from.
+        self.infected = 0  # Number of persons with has_rumor.
+
+    def track(self):
+        """
+        Builds the lists and the count from the arrays. This scans the whole
+        grid once.
+        :return: None.
+        """
+        self.spreading = np.flatnonzero(self._is_spreading)
+        self.waiting = np.flatnonzero(self._wait_to_spread)
+        self.touched = np.flatnonzero(self._received)
+        self.infected = int(np.count_nonzero(self._has_rumor))
+
+    def adopt(self, arrays):
+        super().adopt(arrays)
+        self.spreading = None
+
+    def count_infected(self):
+        if self.spreading is None:
+            self.track()
+        return self.infected
+
+    @property
+    def absorbed(self):
+        if self.spreading is None:
+            self.track()
+        return self.waiting.size == 0 and not self._is_spreading.ravel()[self.spreading].any()
+
+    def step(self, timing=OFF):
+        """
+        Advances the engine by one generation, following Population.check_spread
+        and Population.spread_rumor.
+        :param timing: Timing to record the phases of the generation in.
+        :return: number of persons who heard the rumor before the spreading.
+        """
+        with timing.phase('count'):
+            infected = self.count_infected()
+
+        is_spreading = self._is_spreading.ravel()
+        wait_to_spread = self._wait_to_spread.ravel()
+        cooldown = self._cooldown.ravel()
+
+        with timing.phase('spread'):
+            # Persons that spread lately wait L generations (check_spread).
+            waiting = self.waiting
+            still = cooldown[waiting] > 0
+            blocked = waiting[still]
+            cooldown[blocked] -= 1
+            is_spreading[blocked] = False
+            wait_to_spread[waiting[~still]] = False
+
+            fire = self.spreading[is_spreading[self.spreading]]
+            spread, heard, later, newly = self.propagate(fire)
+            self.infected += newly
+
+            self.waiting = np.concatenate([blocked] + spread)
+            later = np.unique(np.concatenate([self.spreading[:0]] + later))
+            self.spreading = later[is_spreading[later]]
+
+        # init the received_rumor_from for the persons who heard the rumor.
+        with timing.phase('reset'):
+            received = self._received.ravel()
+            received[self.touched] = 0
+            for receivers in heard:
+                received[receivers] = 0
+            self.touched = self.touched[:0]
+        return infected
+
+
+class BatchEngine(VectorEngine):
+    """
+    This class advances K independent grids at once: the arrays of VectorEngine
+    get a leading replicate axis, i.e. [k][i][j]. Each grid keeps its own border
+    of empty cells, so the rumor never crosses from one grid to another, and
+    each grid draws from its own random generator.
+    """
+
+    def __init__(self, replicates, shape, L, rngs=None):
+        """
+        Engine constructor. Creates K empty grids; they are filled by
+        from_engines().
+        :param replicates: number of grids, K.
+        :param shape: dimensions of each grid.
+        :param L: number of generations a person waits after spreading.
+        :param rngs: list of K numpy random generators.
+        :return: BatchEngine object.
+        """
+        self.shape = shape
+        self.L = L
+        self.rngs = rngs if rngs is not None else [np.random.default_rng() for _ in range(replicates)]
+        self.allocate((replicates, shape[0] + 2, shape[1] + 2))
+        self.cells_per_replicate = (shape[0] + 2) * (shape[1] + 2)
+
+    @classmethod
+    def from_engines(cls, engines):
+        """
+        Builds an engine holding a copy of the grid of each VectorEngine. Each
+        grid goes on with the random generator of its engine, so it evolves
+        exactly as it would have in its own engine.
+        :param engines: list of K VectorEngine objects with the same shape and L.
+        :return: BatchEngine object.
+        """
+        engine = cls(len(engines), engines[0].shape, engines[0].L, [single.rng for single in engines])
+        for replicate, single in enumerate(engines):
+            engine._skepticism[replicate] = single._skepticism
+            engine._turn[replicate] = single._turn
+            engine._has_rumor[replicate] = single._has_rumor
+            engine._is_spreading[replicate] = single._is_spreading
+            engine._wait_to_spread[replicate] = single._wait_to_spread
+            engine._cooldown[replicate] = single._cooldown
+            engine._received[replicate] = single._received
+        return engine
+
+    def count_infected(self):
+        return np.count_nonzero(self._has_rumor, axis=(1, 2))
+
+    @property
+    def absorbed(self):
+        """
+        Tells for each grid if it can no longer change.
+        :return: bool array of K values.
+        """
+        return ~(self._is_spreading.any(axis=(1, 2)) | self._wait_to_spread.any(axis=(1, 2)))
+
+    def uniforms(self, targets):
+        """
+        Draws one uniform random number for each delivery, from the generator
+        of the grid receiving it. The targets are sorted, so the deliveries of
+        every grid are contiguous.
+        :param targets: sorted flat indices of the receivers.
+        :return: float array.
+        """
+        bounds = np.searchsorted(targets, np.arange(len(self.rngs) + 1) * self.cells_per_replicate)
+        draws = np.empty(targets.size)
+        for rng, start, stop in zip(self.rngs, bounds[:-1], bounds[1:]):
+            if stop > start:
+                draws[start:stop] = rng.random(stop - start)
+        return draws
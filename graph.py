@@ -0,0 +1,236 @@
+import numpy as np
+
+from adjacency import Adjacency
+from engine import FrontierEngine
+from sparse import SPARSE_ARRAYS, SparseEngine
+
+# The arrays holding the state of a GraphEngine: the graph in CSR form, then
+# one entry per person like a SparseEngine.
+GRAPH_ARRAYS = ('offsets', 'indices') + SPARSE_ARRAYS
+
+# Lines of an edge list file starting with these are comments.
+COMMENTS = (b'#', b'%')
+
+
+def from_edges(sources, targets, n_nodes=None):
+    """
+    Builds an undirected graph from a list of edges. Each edge links its two
+    nodes both ways; edges from a node to itself and repeated edges are
+    dropped.
+    :param sources: int array, the first node of each edge.
+    :param targets: int array, the second node of each edge.
+    :param n_nodes: number of nodes, defaults to the largest node + 1.
+    :return: Adjacency object, the neighbours of each node sorted.
+    """
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    if n_nodes is None:
+        n_nodes = int(max(sources.max(), targets.max())) + 1 if sources.size else 0
+    if sources.size and (min(sources.min(), targets.min()) < 0 or max(sources.max(), targets.max()) >= n_nodes):
+        raise ValueError('Edges must link nodes 0..%d.' % (n_nodes - 1))
+
+    # One key per direction, source first, so sorting them lays out the rows.
+    keep = sources != targets
+    sources = sources[keep]
+    targets = targets[keep]
+    keys = np.concatenate([sources * n_nodes + targets, targets * n_nodes + sources])
+    del sources, targets
+    keys.sort()
+    first = np.ones(keys.size, dtype=bool)
+    np.not_equal(keys[1:], keys[:-1], out=first[1:])
+    keys = keys[first]
+    rows = keys // n_nodes
+    index_type = np.int32 if n_nodes < 1 << 31 else np.int64
+    indices = (keys - rows * n_nodes).astype(index_type)
+    offsets = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_nodes), out=offsets[1:])
+    return Adjacency(offsets, indices)
+
+
+def read_edges(path, n_nodes=None):
+    """
+    Reads a graph from an edge list file in one pass: either a text file with
+    the two nodes of an edge on each line, separated by white space, after
+    optional comment lines starting with # or %, or a .npy file holding an
+    int array of shape (edges, 2).
+    :param path: path of the file.
+    :param n_nodes: see from_edges().
+    :return: Adjacency object.
+    """
+    if path.endswith('.npy'):
+        edges = np.load(path, mmap_mode='r')
+        return from_edges(edges[:, 0], edges[:, 1], n_nodes)
+
+    with open(path, 'rb') as f:
+        header = 0
+        for line in f:
+            if not line.lstrip().startswith(COMMENTS):
+                break
+            header += len(line)
+        f.seek(header)
+        numbers = np.fromfile(f, dtype=np.int64, sep=' ')
+    if numbers.size % 2:
+        raise ValueError('%s does not hold pairs of nodes.' % path)
+    return from_edges(numbers[0::2], numbers[1::2], n_nodes)
+
+
+def lattice(shape, cells=None):
+    """
+    Builds the graph of the grid: persons are nodes, linked to the persons in
+    the 8 cells around them.
+    :param shape: grid dimensions.
+    :param cells: sorted int array of the persons' flat cells,
+    i * shape[1] + j, defaults to every cell.
+    :return: Adjacency object, node k being the person on cells[k].
+    """
+    if cells is None:
+        cells = np.arange(shape[0] * shape[1])
+    return Adjacency.from_cells(cells, shape)
+
+
+def small_world(n_nodes, k, p, rng):
+    """
+    Builds a Watts-Strogatz small-world graph: a ring where each node is
+    linked to its k nearest nodes, k / 2 on each side, after which each link
+    is moved to a random node with probability p. Links moved onto an
+    existing one, or onto their own node, are dropped.
+    :param n_nodes: number of nodes.
+    :param k: even number of neighbours of each node on the ring.
+    :param p: probability of moving a link.
+    :param rng: numpy random generator.
+    :return: Adjacency object.
+    """
+    sources = np.repeat(np.arange(n_nodes), k // 2)
+    targets = (sources + np.tile(np.arange(1, k // 2 + 1), n_nodes)) % n_nodes
+    moved = rng.random(targets.size) < p
+    targets[moved] = rng.integers(n_nodes, size=int(np.count_nonzero(moved)))
+    return from_edges(sources, targets, n_nodes)
+
+
+def scale_free(n_nodes, mean_degree, exponent, rng):
+    """
+    Builds a Chung-Lu graph whose degrees follow a power law: node k gets a
+    weight (k + 1) ** (-1 / (exponent - 1)), and each end of each of the
+    n_nodes * mean_degree / 2 edges is drawn with odds following the weights,
+    so the expected degree of a node follows its weight. Repeated edges and
+    edges from a node to itself are dropped, which lowers the degrees of the
+    largest hubs a little.
+    :param n_nodes: number of nodes.
+    :param mean_degree: expected mean number of neighbours.
+    :param exponent: exponent of the degree distribution, above 2.
+    :param rng: numpy random generator.
+    :return: Adjacency object.
+    """
+    if exponent <= 2:
+        raise ValueError('The exponent of a scale-free graph must be above 2.')
+    weights = np.arange(1, n_nodes + 1) ** (-1 / (exponent - 1))
+    cdf = np.cumsum(weights)
+    cdf /= cdf[-1]
+    n_edges = int(n_nodes * mean_degree / 2)
+
+    # Sorted draws are found many times faster; shuffling one end of the
+    # edges pairs them at random again.
+    ends = [np.minimum(np.searchsorted(cdf, np.sort(rng.random(n_edges)), side='right'), n_nodes - 1)
+            for _ in range(2)]
+    return from_edges(ends[0], rng.permutation(ends[1]), n_nodes)
+
+
+class GraphEngine(FrontierEngine, SparseEngine):
+    """
+    This class advances the automat on any graph instead of the grid: a
+    person hears the rumor from the persons it is linked to, with the same
+    skepticism and waiting rules. The graph is kept in CSR form (see
+    Adjacency) and the persons like in a SparseEngine, node k being person k.
+    Each person also has a cell, where it is drawn; with lattice() the graph
+    is the grid itself and the results are the same as VectorEngine's.
+
+    Like FrontierEngine, a generation touches only the persons spreading or
+    waiting and their links, so its cost follows the active edges and not
+    the size of the graph.
+    """
+
+    # Names of the arrays that hold the whole state, see adopt().
+    state_arrays = GRAPH_ARRAYS
+
+    def __init__(self, shape, L, rng=None, graph=None):
+        """
+        Engine constructor, see SparseEngine.
+        :param shape: dimensions of the grid the persons are drawn on.
+        :param graph: Adjacency object with a node per person, or None for the
+        grid of the persons placed.
+        :return: GraphEngine object.
+        """
+        self.graph = graph
+        super().__init__(shape, L, rng)
+
+    def allocate(self, n_persons):
+        """
+        Creates the state arrays for a number of persons without links.
+        :param n_persons: number of persons.
+        :return: None.
+        """
+        self.build(Adjacency(np.zeros(n_persons + 1, dtype=np.int64), np.zeros(0, dtype=np.int32)),
+                   np.zeros(n_persons, dtype=np.int64), np.zeros(n_persons, dtype=np.uint8),
+                   np.zeros(n_persons, dtype=np.uint16))
+
+    @property
+    def nbytes(self):
+        """
+        Memory taken by the state arrays, with the graph, in bytes.
+        """
+        return sum(getattr(self, '_' + name).nbytes for name in self.state_arrays)
+
+    def adopt(self, arrays):
+        """
+        Takes over state arrays, for example arrays memory-mapped from a
+        checkpoint, instead of the engine's own.
+        :param arrays: dict with an array for each name in state_arrays.
+        :return: None.
+        """
+        for name in self.state_arrays:
+            setattr(self, '_' + name, arrays[name])
+        self.adjacency = Adjacency(self._offsets, self._indices)
+        self.spreading = None
+
+    def build(self, graph, cells, skepticism, turn):
+        """
+        Creates the state of persons on a graph, none of whom heard the rumor.
+        :param graph: Adjacency object with a node per person.
+        :param cells: sorted int array, the flat cell each person is drawn on.
+        :param skepticism: uint8 array of skepticism codes (1..4).
+        :param turn: uint16 array, the order in which the persons are visited.
+        :return: None.
+        """
+        n_persons = cells.size
+        self.adopt({
+            'offsets': graph.offsets,
+            'indices': graph.indices,
+            'cell': cells,
+            'skepticism': np.asarray(skepticism, dtype=np.uint8),
+            'turn': np.asarray(turn, dtype=np.uint16),
+            'has_rumor': np.zeros(n_persons, dtype=bool),
+            'is_spreading': np.zeros(n_persons, dtype=bool),
+            'wait_to_spread': np.zeros(n_persons, dtype=bool),
+            'cooldown': np.zeros(n_persons, dtype=np.min_scalar_type(self.L)),
+            'received': np.zeros(n_persons, dtype=np.uint8),
+        })
+
+    def place(self, i, j, skepticism, turn):
+        """
+        Puts the persons on their cells, sorted by cell like a SparseEngine,
+        and links them by the engine's graph, or by the grid.
+        :param i: int array of the persons' first coordinate.
+        :param j: int array of the persons' second coordinate.
+        :param skepticism: uint8 array of skepticism codes (1..4).
+        :param turn: uint16 array, the order in which the persons are visited.
+        :return: int array, the index of each sorted person in the arrays
+        given.
+        """
+        cells = np.asarray(i, dtype=np.int64) * self.shape[1] + j
+        order = np.argsort(cells)
+        cells = cells[order]
+        graph = self.graph if self.graph is not None else lattice(self.shape, cells)
+        if graph.size != cells.size:
+            raise ValueError('The graph has %d nodes for %d persons.' % (graph.size, cells.size))
+        self.build(graph, cells, np.asarray(skepticism)[order], np.asarray(turn)[order])
+        return order
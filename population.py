@@ -0,0 +1,400 @@
+import heapq
+
+import numpy as np
+
+from adjacency import Adjacency
+from recorder import pack_cells
+from timing import OFF
+
+
+# The arrays holding the state of a population, one entry per person.
+PERSON_ARRAYS = ('i', 'j', 'skepticism', 'has_rumor', 'is_spreading', 'wait_to_spread', 'cooldown', 'received')
+
+# Order in which set_fast() tries the skepticism levels, for each of the 4
+# turns of its walk over the grid.
+STRIPE_PRIORITIES = ((1, 4, 2, 3), (4, 2, 3, 1), (2, 3, 1, 4), (3, 1, 4, 2))
+
+# Density up to which the set-up helpers work with the persons' cells instead
+# of a list or a grid of all the cells, which would take memory for every cell.
+SPARSE_DENSITY = 0.1
+
+
+def scatter(shape, n_persons, rng):
+    """
+    Chooses the cells of the persons at random. The cells come in a random
+    order, which is used as the order in which the persons are visited.
+    :param shape: grid dimensions.
+    :param n_persons: number of persons.
+    :param rng: numpy random generator.
+    :return: (i, j) -- int arrays of the persons' coordinates.
+    """
+    size = shape[0] * shape[1]
+    if n_persons > SPARSE_DENSITY * size:
+        cells = rng.choice(size, n_persons, replace=False)
+        return np.divmod(cells, shape[1])
+
+    # Choosing from all the cells shuffles a list of them, so on a sparse grid
+    # cells are drawn with replacement instead, and only the first draw of
+    # each cell is kept, which gives a random choice in a random order too.
+    # A fifth more draws than needed are usually enough at once.
+    cells = np.empty(0, dtype=np.int64)
+    while cells.size < n_persons:
+        cells = np.concatenate([cells, rng.integers(size, size=(n_persons - cells.size) * 6 // 5 + 16)])
+        first = np.unique(cells, return_index=True)[1]
+        cells = cells[np.sort(first)]
+    return np.divmod(cells[:n_persons], shape[1])
+
+
+def mixed_skepticism(n_persons, weights, rng):
+    """
+    Draws a skepticism level for each person independently, with the given
+    weights, as set() does.
+    :param n_persons: number of persons.
+    :param weights: (S1, S2, S3, S4) weights.
+    :param rng: numpy random generator.
+    :return: uint8 array of skepticism codes (1..4).
+    """
+    weights = np.asarray(weights, dtype=float)
+    return rng.choice(4, size=n_persons, p=weights / weights.sum()).astype(np.uint8) + 1
+
+
+def count_neighbors(i, j, shape):
+    """
+    Counts the persons around each person with a 3x3 stencil over the grid,
+    or on a sparse grid by searching the persons' sorted cells.
+    :param i: int array of the persons' first coordinate.
+    :param j: int array of the persons' second coordinate.
+    :param shape: grid dimensions.
+    :return: uint8 array, the number of neighbours of each person.
+    """
+    if i.size <= SPARSE_DENSITY * shape[0] * shape[1]:
+        cells = np.asarray(i, dtype=np.int64) * shape[1] + j
+        order = np.argsort(cells)
+        counts = np.empty(i.size, dtype=np.uint8)
+        counts[order] = Adjacency.from_cells(cells[order], shape).degree
+        return counts
+
+    occupied = np.zeros((shape[0] + 2, shape[1] + 2), dtype=np.uint8)
+    occupied[i + 1, j + 1] = 1
+    counts = np.zeros(shape, dtype=np.uint8)
+    for di in range(3):
+        for dj in range(3):
+            if di != 1 or dj != 1:
+                counts += occupied[di:di + shape[0], dj:dj + shape[1]]
+    return counts[i, j]
+
+
+def ranked_skepticism(degree, counts):
+    """
+    Gives the most skeptical levels to the persons with the most neighbours,
+    as set_slow() does: the first n_s4 persons get S4, the next n_s3 S3, and so
+    on. Ties keep the order of the persons.
+    :param degree: int array, the number of neighbours of each person.
+    :param counts: (n_s1, n_s2, n_s3, n_s4), persons of each level.
+    :return: (skepticism, candidates) -- uint8 array of skepticism codes, and
+    the persons who were given S1 by the ranking, from which the spreader is
+    chosen. Persons left over get S1 too, but are not candidates.
+    """
+    ranked = np.argsort(-degree.astype(np.int64), kind='stable')
+    skepticism = np.ones(degree.size, dtype=np.uint8)
+    start = 0
+    for code in (4, 3, 2):
+        end = start + counts[code - 1]
+        skepticism[ranked[start:end]] = code
+        start = end
+    return skepticism, ranked[start:start + counts[0]]
+
+
+def striped_skepticism(i, j, shape, counts):
+    """
+    Assigns skepticism levels walking the persons by position, row by row, as
+    set_fast() does: the walk cycles through 4 turns, and in each turn a person
+    gets the first level of STRIPE_PRIORITIES that has persons left. Once all
+    the levels are used up, the rest get S3. The walk is done in phases in
+    which the levels left do not change, so each phase is filled at once.
+    :param i: int array of the persons' first coordinate.
+    :param j: int array of the persons' second coordinate.
+    :param shape: grid dimensions.
+    :param counts: (n_s1, n_s2, n_s3, n_s4), persons of each level.
+    :return: uint8 array of skepticism codes (1..4).
+    """
+    n = i.size
+    left = np.array(counts, dtype=np.int64)
+    walk = np.full(n, 3, dtype=np.uint8)
+    start = 0
+    while start < n and left.any():
+        # The level each turn picks while the levels left stay the same.
+        picks = np.array([next(code for code in priority if left[code - 1] > 0) for priority in STRIPE_PRIORITIES],
+                         dtype=np.uint8)
+        phase = picks[np.arange(start, n) % 4]
+
+        # The phase ends where a level runs out.
+        end = n
+        for code in np.unique(picks):
+            uses = np.flatnonzero(phase == code)
+            if uses.size > left[code - 1]:
+                end = min(end, start + uses[left[code - 1]])
+        walk[start:end] = phase[:end - start]
+        left -= np.bincount(phase[:end - start], minlength=5)[1:]
+        start = end
+
+    # Reading the grid row by row lists the persons by position, as does
+    # sorting their cells, which is cheaper on a sparse grid.
+    skepticism = np.empty(n, dtype=np.uint8)
+    if n <= SPARSE_DENSITY * shape[0] * shape[1]:
+        skepticism[np.argsort(np.asarray(i, dtype=np.int64) * shape[1] + j)] = walk
+        return skepticism
+    index = np.full(shape, -1, dtype=np.int64)
+    index[i, j] = np.arange(n)
+    index = index.ravel()
+    skepticism[index[index >= 0]] = walk
+    return skepticism
+
+
+class Population:
+    """
+    This class stores the persons of the automat as typed arrays, one entry per
+    person, in the order the persons are visited in a generation. Skepticism is
+    kept as a code 1..4 (for "S1".."S4"), and the generations since a person
+    spread as a cooldown counting down from L, so no strings or floats are
+    involved. Per-person access is available through Person views.
+    """
+
+    def __init__(self, i, j, skepticism, shape, L):
+        """
+        Population constructor.
+        :param i: the persons' first coordinate.
+        :param j: the persons' second coordinate.
+        :param skepticism: the persons' skepticism codes (1..4).
+        :param shape: grid dimensions.
+        :param L: number of generations a person waits after spreading.
+        :return: Population object.
+        """
+        self.shape = shape
+        self.L = int(L)
+        self.i = np.asarray(i, dtype=np.int32)
+        self.j = np.asarray(j, dtype=np.int32)
+        self.skepticism = np.asarray(skepticism, dtype=np.uint8)
+        n = self.i.size
+        self.has_rumor = np.zeros(n, dtype=bool)
+        self.is_spreading = np.zeros(n, dtype=bool)
+        self.wait_to_spread = np.zeros(n, dtype=bool)
+        self.cooldown = np.zeros(n, dtype=np.min_scalar_type(self.L))  # Generations left to wait.
+        self.received = np.zeros(n, dtype=np.uint8)  # received_rumor_from.
+        self.adjacency = Adjacency.from_positions(self.i, self.j, shape)
+
+        # The per-person pass reads and writes single entries, which is much
+        # faster through memoryviews of the arrays than through NumPy.
+        self._has_rumor = self.has_rumor.data
+        self._is_spreading = self.is_spreading.data
+        self._wait_to_spread = self.wait_to_spread.data
+        self._cooldown = self.cooldown.data
+        self._received = self.received.data
+        self._skepticism = self.skepticism.data
+        self._offsets = self.adjacency.offsets.data
+        self._neighbors = self.adjacency.indices.data
+
+    def __len__(self):
+        return self.i.size
+
+    def restore(self, arrays):
+        """
+        Copies the state of the persons from saved arrays, for example from a
+        checkpoint. The positions are given to the constructor.
+        :param arrays: dict with an array for each name in PERSON_ARRAYS.
+        :return: None.
+        """
+        for name in PERSON_ARRAYS[2:]:
+            getattr(self, name)[...] = arrays[name]
+
+    def __getitem__(self, k):
+        return Person(self, k)
+
+    def __iter__(self):
+        return (Person(self, k) for k in range(len(self)))
+
+    @property
+    def nbytes(self):
+        """
+        Memory taken by the persons' state and their adjacency, in bytes.
+        """
+        arrays = (self.i, self.j, self.skepticism, self.has_rumor, self.is_spreading, self.wait_to_spread,
+                  self.cooldown, self.received, self.adjacency.offsets, self.adjacency.indices)
+        return sum(array.nbytes for array in arrays)
+
+    @property
+    def absorbed(self):
+        """
+        Tells if the population can no longer change: nobody is spreading the
+        rumor or waiting after spreading it.
+        """
+        return not (self.is_spreading.any() or self.wait_to_spread.any())
+
+    def check_spread(self, k):
+        """
+        Tells if person k may spread the rumor according to the L parameter:
+        a person who spread lately waits L generations before it may again.
+        :param k: index of the person.
+        :return: bool.
+        """
+        wait_to_spread = self._wait_to_spread
+        cooldown = self._cooldown
+        if wait_to_spread[k]:
+            if cooldown[k] > 0:
+                cooldown[k] -= 1
+                self._is_spreading[k] = False
+                return False
+            wait_to_spread[k] = False
+        return True
+
+    def spread_rumor(self, k, random):
+        """
+        Person k tells the rumor to its neighbours. Each neighbour decides,
+        according to its skepticism and to how many times it heard the rumor,
+        if it will spread the rumor too.
+        :param k: index of the person.
+        :param random: function returning a uniform random number in [0, 1).
+        :return: list of the neighbours who will spread the rumor.
+        """
+        has_rumor = self._has_rumor
+        received = self._received
+        skepticism = self._skepticism
+        is_spreading = self._is_spreading
+        self._cooldown[k] = self.L
+        spreaders = []
+        for neighbor in self._neighbors[self._offsets[k]:self._offsets[k + 1]]:
+            has_rumor[neighbor] = True
+            heard = received[neighbor] + 1
+            received[neighbor] = heard
+            code = skepticism[neighbor]
+            if code == 4:
+                if heard >= 2 and random() < 1 / 3:
+                    spreaders.append(neighbor)
+            elif code == 3:
+                if heard < 2 and random() < 1 / 3:
+                    spreaders.append(neighbor)
+                elif heard >= 2 and random() < 2 / 3:
+                    spreaders.append(neighbor)
+            elif code == 2:
+                if heard < 2 and random() < 2 / 3:
+                    spreaders.append(neighbor)
+                elif heard >= 2:
+                    spreaders.append(neighbor)
+            elif code == 1:
+                spreaders.append(neighbor)
+        for spreader in spreaders:
+            is_spreading[spreader] = True
+        self._wait_to_spread[k] = True
+        is_spreading[k] = False
+        return spreaders
+
+    def start_rumor(self, k, random):
+        """
+        Makes person k hear the rumor and spread it to its neighbours.
+        :param k: index of the person.
+        :param random: function returning a uniform random number in [0, 1).
+        :return: None.
+        """
+        self.has_rumor[k] = True
+        self.spread_rumor(k, random)
+
+    def step(self, random, timing=OFF):
+        """
+        Visits the persons in order, and lets each one that is spreading and
+        done waiting spread the rumor. Only persons who are spreading or
+        waiting have anything to do, so they are the only ones visited; a
+        person convinced before its turn is visited in the same generation.
+        :param random: function returning a uniform random number in [0, 1).
+        :param timing: Timing to record the phases of the generation in.
+        :return: number of persons who heard the rumor before the generation.
+        """
+        with timing.phase('count'):
+            count_infected = int(np.count_nonzero(self.has_rumor))
+        with timing.phase('spread'):
+            visits = np.flatnonzero(self.is_spreading | self.wait_to_spread).tolist()
+            queued = set(visits)
+            while visits:
+                k = heapq.heappop(visits)
+                if self.check_spread(k) and self._is_spreading[k]:
+                    for spreader in self.spread_rumor(k, random):
+                        if spreader > k and spreader not in queued:
+                            queued.add(spreader)
+                            heapq.heappush(visits, spreader)
+        with timing.phase('reset'):
+            self.received[:] = 0
+        return count_infected
+
+    def grids(self):
+        """
+        Returns the population as grids, for drawing it.
+        :return: (occupied, has_rumor) -- two bool arrays indexed [i][j].
+        """
+        return self.grid(True), self.grid(self.has_rumor)
+
+    def packed(self, name):
+        """
+        Packs a field of the persons for a recording from their positions,
+        without building a grid, see recorder.pack_cells.
+        :param name: 'has_rumor' or 'is_spreading'.
+        :return: uint8 array.
+        """
+        values = getattr(self, name)
+        cells = self.i[values].astype(np.int64) * self.shape[1] + self.j[values]
+        return pack_cells(np.sort(cells), self.shape)
+
+    def grid(self, values):
+        """
+        Lays out one value per person on the grid.
+        :param values: bool array with an entry per person, or one bool.
+        :return: bool array indexed [i][j], False where nobody lives.
+        """
+        grid = np.zeros(self.shape, dtype=bool)
+        grid[self.i, self.j] = values
+        return grid
+
+
+class Person:
+    """
+    A view of one person of a Population, for code that wants per-person
+    access. It holds no state of its own.
+    """
+
+    __slots__ = ('population', 'index')
+
+    def __init__(self, population, index):
+        self.population = population
+        self.index = index
+
+    @property
+    def pos(self):
+        return int(self.population.i[self.index]), int(self.population.j[self.index])
+
+    def get_pos(self):
+        return self.pos
+
+    @property
+    def skepticism(self):
+        return "S%d" % self.population.skepticism[self.index]
+
+    @property
+    def has_rumor(self):
+        return bool(self.population.has_rumor[self.index])
+
+    @property
+    def is_spreading(self):
+        return bool(self.population.is_spreading[self.index])
+
+    @property
+    def wait_to_spread(self):
+        return bool(self.population.wait_to_spread[self.index])
+
+    @property
+    def received_rumor_from(self):
+        return int(self.population.received[self.index])
+
+    @property
+    def cooldown(self):
+        return int(self.population.cooldown[self.index])
+
+    def get_neighbors(self):
+        return [Person(self.population, k) for k in self.population.adjacency.neighbors(self.index).tolist()]
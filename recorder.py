@@ -0,0 +1,192 @@
+import json
+import time
+
+import numpy as np
+
+# A recording file starts with MAGIC and the length of a JSON header, followed
+# by the header, the occupied cells, and one frame per recorded generation.
+# Every grid is stored bit-packed, one bit per cell, and a frame holds the
+# PLANES in order, so all frames have the same size and are found by their
+# position. The index file next to it has a (generation, infected) row per
+# frame; a frame without its row, from a run that crashed while writing, is
+# ignored.
+#
+# Each row of a grid starts on a byte, the first cell of a byte in its least
+# significant bit, as in the words of a BitboardEngine, so the engines pack
+# their own state without building grids.
+MAGIC = b'RUMORREC'
+VERSION = 2
+PLANES = ('has_rumor', 'is_spreading')
+INDEX = '.idx'
+
+# Seconds between two flushes of the files; a crash loses at most the frames
+# of the last interval.
+FLUSH_INTERVAL = 1.0
+
+
+def row_bytes(shape):
+    """
+    Number of bytes of a row of a bit-packed grid.
+    """
+    return -(-shape[1] // 8)
+
+
+def packed_size(shape):
+    """
+    Number of bytes of a bit-packed grid.
+    """
+    return shape[0] * row_bytes(shape)
+
+
+def pack_grid(grid):
+    """
+    Packs a grid for a recording.
+    :param grid: bool array indexed [i][j].
+    :return: uint8 array of packed_size(grid.shape) bytes.
+    """
+    return np.packbits(grid, axis=-1, bitorder='little').ravel()
+
+
+def pack_cells(cells, shape):
+    """
+    Packs a grid for a recording from the cells that are set, without
+    building the grid.
+    :param cells: sorted int array of flat cells, i * shape[1] + j.
+    :param shape: grid dimensions.
+    :return: uint8 array of packed_size(shape) bytes.
+    """
+    packed = np.zeros(packed_size(shape), dtype=np.uint8)
+    if cells.size:
+        i, j = np.divmod(cells, shape[1])
+        byte = i * row_bytes(shape) + (j >> 3)
+        bits = np.left_shift(1, j & 7).astype(np.uint8)
+        first = np.flatnonzero(np.concatenate([[True], byte[1:] != byte[:-1]]))
+        packed[byte[first]] = np.bitwise_or.reduceat(bits, first)
+    return packed
+
+
+class Recorder:
+    """
+    This class appends the state of the grid of each generation to a
+    recording file, see Recording for reading it back. The files are flushed
+    once every FLUSH_INTERVAL seconds, and the index rows are written only
+    after the frames they refer to.
+    """
+
+    def __init__(self, path, occupied, every=1):
+        """
+        Recorder constructor. Creates the file and writes the occupied cells.
+        :param path: path of the recording file.
+        :param occupied: bool array indexed [i][j], True where a person lives.
+        :param every: record one generation out of every this many.
+        :return: Recorder object.
+        """
+        self.path = path
+        self.shape = occupied.shape
+        self.every = every
+        header = json.dumps({'version': VERSION, 'shape': self.shape, 'planes': PLANES}).encode()
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.file.write(np.uint64(len(header)).tobytes())
+        self.file.write(header)
+        self.file.write(pack_grid(occupied).tobytes())
+        self.index = open(path + INDEX, 'wb')
+        self.rows = []  # Index rows of the frames not flushed yet.
+        self.flush()
+
+    def wants(self, generation):
+        """
+        Tells if a generation is one to record.
+        """
+        return (generation - 1) % self.every == 0
+
+    def record(self, generation, infected, has_rumor, is_spreading):
+        """
+        Appends a frame, if the generation is one to record.
+        :param generation: generation number.
+        :param infected: number of persons who heard the rumor.
+        :param has_rumor: packed grid, see pack_grid() and pack_cells().
+        :param is_spreading: packed grid.
+        :return: None.
+        """
+        if not self.wants(generation):
+            return
+        self.file.write(has_rumor)
+        self.file.write(is_spreading)
+        self.rows.append((generation, infected))
+        if time.perf_counter() - self.flushed >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        # The frames must reach the file before the index refers to them.
+        self.file.flush()
+        if self.rows:
+            self.index.write(np.array(self.rows, dtype=np.int64).tobytes())
+            self.rows = []
+        self.index.flush()
+        self.flushed = time.perf_counter()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        self.index.close()
+
+
+class Recording:
+    """
+    This class reads a recording file. The frames are memory-mapped, so any
+    generation can be read without loading the others.
+    """
+
+    def __init__(self, path):
+        """
+        Recording constructor.
+        :param path: path of the recording file.
+        :return: Recording object.
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError('%s is not a recording file.' % path)
+            length = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            header = json.loads(f.read(length))
+        if header['version'] != VERSION:
+            raise ValueError('Unsupported recording version: %s' % header['version'])
+
+        self.shape = tuple(header['shape'])
+        size = packed_size(self.shape)
+        start = len(MAGIC) + 8 + length
+        index = np.fromfile(path + INDEX, dtype=np.int64).reshape(-1, 2)
+        self.generations = index[:, 0]
+        self.infected = index[:, 1]
+        data = np.memmap(path, dtype=np.uint8, mode='r', offset=start)
+        self.packed_occupied = data[:size]
+        self.frames = data[size:size + len(index) * len(PLANES) * size].reshape(len(index), len(PLANES), size)
+
+    def __len__(self):
+        return len(self.generations)
+
+    def unpack(self, packed):
+        """
+        Unpacks a bit-packed grid.
+        :return: bool array indexed [i][j].
+        """
+        rows = packed.reshape(self.shape[0], row_bytes(self.shape))
+        return np.unpackbits(rows, axis=-1, count=self.shape[1], bitorder='little').view(bool)
+
+    @property
+    def occupied(self):
+        return self.unpack(self.packed_occupied)
+
+    def frame(self, k):
+        """
+        Reads the k-th recorded frame.
+        :param k: index of the frame, not the generation; see find().
+        :return: (has_rumor, is_spreading) -- two bool arrays indexed [i][j].
+        """
+        return tuple(self.unpack(plane) for plane in self.frames[k])
+
+    def find(self, generation):
+        """
+        Returns the index of the last frame recorded at or before a generation.
+        """
+        return max(int(np.searchsorted(self.generations, generation, side='right')) - 1, 0)
@@ -0,0 +1,279 @@
+from tkinter import PhotoImage
+
+import numpy as np
+
+from style import palette
+
+# Ways of drawing the grid.
+RECTANGLES = 'rectangles'
+RASTER = 'raster'
+POINTS = 'points'
+
+# Smallest cell, in pixels, that is still drawn as a rectangle of its own.
+MIN_CELL_SIZE = 2
+
+
+class CanvasRenderer:
+    """
+    This class draws the grid on a Tkinter Canvas. Each person gets one
+    rectangle, created once when the population is placed; afterwards only the
+    rectangles of persons whose state changed are recolored.
+    """
+
+    def __init__(self, canvas):
+        """
+        Renderer constructor.
+        :param canvas: the Canvas to draw on.
+        :return: CanvasRenderer object.
+        """
+        self.canvas = canvas
+        self.items = None  # Canvas item id of each cell, -1 for empty cells.
+        self.shown = None  # The has_rumor state currently on the canvas.
+
+    def setup(self, occupied, has_rumor):
+        """
+        Creates a rectangle for each person.
+        :param occupied: bool array indexed [i][j], True where a person lives.
+        :param has_rumor: bool array indexed [i][j].
+        :return: None.
+        """
+        self.canvas.delete('all')
+        cell_width = max(int(self.canvas['width']) // occupied.shape[0], 1)
+        cell_height = max(int(self.canvas['height']) // occupied.shape[1], 1)
+        self.items = np.full(occupied.shape, -1, dtype=np.int64)
+        for i, j in zip(*np.nonzero(occupied)):
+            color = palette.red if has_rumor[i, j] else palette.orange
+            x0 = i * cell_width
+            y0 = j * cell_height
+            x1 = (i + 1) * cell_width
+            y1 = (j + 1) * cell_height
+            self.items[i, j] = self.canvas.create_rectangle(x0, y0, x1, y1, fill=color)
+        self.shown = has_rumor.copy()
+
+    def draw(self, occupied, has_rumor):
+        """
+        Recolors the persons whose has_rumor state changed since the last draw.
+        :param occupied: bool array indexed [i][j], True where a person lives.
+        :param has_rumor: bool array indexed [i][j].
+        :return: None.
+        """
+        if self.items is None:
+            self.setup(occupied, has_rumor)
+            return
+        changed = np.nonzero((has_rumor != self.shown) & occupied)
+        for item, rumor in zip(self.items[changed], has_rumor[changed]):
+            self.canvas.itemconfig(item, fill=palette.red if rumor else palette.orange)
+        self.shown[changed] = has_rumor[changed]
+
+    def clear(self):
+        """
+        Removes everything from the canvas.
+        :return: None.
+        """
+        self.canvas.delete('all')
+        self.items = None
+        self.shown = None
+
+
+def hex_to_rgb(color):
+    """
+    Converts a '#rrggbb' color of the palette to an (r, g, b) tuple.
+    """
+    return tuple(int(color[k:k + 2], 16) for k in (1, 3, 5))
+
+
+def fit(cells, pixels):
+    """
+    Decides how a grid axis is fitted into the canvas.
+    :param cells: number of cells along the axis.
+    :param pixels: number of pixels along the axis.
+    :return: (repeat, block) -- each cell is drawn repeat pixels wide, or each
+    pixel shows a block of cells; one of them is always 1.
+    """
+    if cells <= pixels:
+        return max(pixels // cells, 1), 1
+    return 1, -(-cells // pixels)
+
+
+def block_any(grid, block_i, block_j):
+    """
+    Downsamples a bool grid: each block of block_i x block_j cells becomes one
+    cell, which is True if any of the block's cells is True.
+    """
+    if block_i == 1 and block_j == 1:
+        return grid
+    rows = -(-grid.shape[0] // block_i) * block_i
+    cols = -(-grid.shape[1] // block_j) * block_j
+    padded = np.zeros((rows, cols), dtype=bool)
+    padded[:grid.shape[0], :grid.shape[1]] = grid
+    return padded.reshape(rows // block_i, block_i, cols // block_j, block_j).any(axis=(1, 3))
+
+
+def frame_pixels(occupied, has_rumor, width, height):
+    """
+    Builds the picture of the grid as one RGB pixel buffer, scaled to fit a
+    width x height canvas. Cell [i][j] is drawn at x ~ i and y ~ j, as the
+    rectangles of CanvasRenderer are.
+    :param occupied: bool array indexed [i][j], True where a person lives.
+    :param has_rumor: bool array indexed [i][j].
+    :param width: canvas width in pixels.
+    :param height: canvas height in pixels.
+    :return: uint8 array of shape (rows, columns, 3).
+    """
+    repeat_i, block_i = fit(occupied.shape[0], width)
+    repeat_j, block_j = fit(occupied.shape[1], height)
+    occupied = block_any(occupied, block_i, block_j)
+    has_rumor = block_any(has_rumor, block_i, block_j)
+
+    pixels = np.empty(occupied.shape + (3,), dtype=np.uint8)
+    pixels[...] = hex_to_rgb(palette.canvas_bg)
+    pixels[occupied] = hex_to_rgb(palette.orange)
+    pixels[has_rumor] = hex_to_rgb(palette.red)
+
+    # Image rows go down the canvas, so they follow j.
+    pixels = pixels.transpose(1, 0, 2)
+    return np.repeat(np.repeat(pixels, repeat_j, axis=0), repeat_i, axis=1)
+
+
+def point_pixels(points, has_rumor, shape, width, height):
+    """
+    Builds the picture of the grid like frame_pixels(), from the coordinates
+    of the persons instead of grids, so the cost follows the number of
+    persons and the canvas size, not the size of the grid.
+    :param points: (i, j) -- int arrays of the persons' coordinates.
+    :param has_rumor: bool array with an entry per person.
+    :param shape: grid dimensions.
+    :param width: canvas width in pixels.
+    :param height: canvas height in pixels.
+    :return: uint8 array of shape (rows, columns, 3).
+    """
+    repeat_i, block_i = fit(shape[0], width)
+    repeat_j, block_j = fit(shape[1], height)
+    x = points[0] // block_i
+    y = points[1] // block_j
+
+    # Image rows go down the canvas, so they follow j.
+    pixels = np.empty((-(-shape[1] // block_j), -(-shape[0] // block_i), 3), dtype=np.uint8)
+    pixels[...] = hex_to_rgb(palette.canvas_bg)
+    pixels[y, x] = hex_to_rgb(palette.orange)
+    pixels[y[has_rumor], x[has_rumor]] = hex_to_rgb(palette.red)
+    return np.repeat(np.repeat(pixels, repeat_j, axis=0), repeat_i, axis=1)
+
+
+def to_ppm(pixels):
+    """
+    Encodes an RGB pixel buffer as a binary PPM image, which Tk reads natively.
+    """
+    header = b'P6 %d %d 255\n' % (pixels.shape[1], pixels.shape[0])
+    return header + np.ascontiguousarray(pixels).tobytes()
+
+
+def fits_rectangles(shape, width, height):
+    """
+    Tells if a grid can be drawn as one rectangle per cell on a width x height
+    canvas, which needs at least MIN_CELL_SIZE pixels per cell on each side.
+    """
+    return shape[0] * MIN_CELL_SIZE <= width and shape[1] * MIN_CELL_SIZE <= height
+
+
+def make_renderer(canvas, shape, render_mode):
+    """
+    Chooses the renderer for a grid: rectangles when asked for and the grid
+    fits them, an image otherwise.
+    :param canvas: the Canvas to draw on.
+    :param shape: grid dimensions.
+    :param render_mode: RECTANGLES, RASTER or POINTS.
+    :return: CanvasRenderer, RasterRenderer or PointRenderer object.
+    """
+    if render_mode == POINTS:
+        return PointRenderer(canvas, shape)
+    if render_mode == RASTER or not fits_rectangles(shape, int(canvas['width']), int(canvas['height'])):
+        return RasterRenderer(canvas)
+    return CanvasRenderer(canvas)
+
+
+class RasterRenderer:
+    """
+    This class draws the whole grid as a single image on a Tkinter Canvas, so
+    the cost of a frame depends on the canvas size and not on the number of
+    persons. Grids larger than the canvas are downsampled.
+    """
+
+    def __init__(self, canvas):
+        """
+        Renderer constructor.
+        :param canvas: the Canvas to draw on.
+        :return: RasterRenderer object.
+        """
+        self.canvas = canvas
+        self.image = None
+
+    def setup(self, occupied, has_rumor):
+        """
+        Creates the image and draws the first frame.
+        :param occupied: bool array indexed [i][j], True where a person lives.
+        :param has_rumor: bool array indexed [i][j].
+        :return: None.
+        """
+        self.canvas.delete('all')
+        self.image = PhotoImage(master=self.canvas)
+        self.canvas.create_image(0, 0, image=self.image, anchor='nw')
+        self.draw(occupied, has_rumor)
+
+    def draw(self, occupied, has_rumor):
+        """
+        Replaces the image with the current state of the grid.
+        :param occupied: bool array indexed [i][j], True where a person lives.
+        :param has_rumor: bool array indexed [i][j].
+        :return: None.
+        """
+        if self.image is None:
+            self.setup(occupied, has_rumor)
+            return
+        width = int(self.canvas['width'])
+        height = int(self.canvas['height'])
+        self.image.configure(data=to_ppm(frame_pixels(occupied, has_rumor, width, height)), format='PPM')
+
+    def clear(self):
+        """
+        Removes everything from the canvas.
+        :return: None.
+        """
+        self.canvas.delete('all')
+        self.image = None
+
+
+class PointRenderer(RasterRenderer):
+    """
+    This class draws the grid as one image like RasterRenderer, but from the
+    coordinates of the persons (see Simulation.rumor_points) instead of
+    grids, so nothing the size of the grid is built: it suits sparse
+    populations on very large grids. Its setup() and draw() take the persons'
+    (i, j) coordinates in place of the occupied grid, and has_rumor with an
+    entry per person.
+    """
+
+    def __init__(self, canvas, shape):
+        """
+        Renderer constructor.
+        :param canvas: the Canvas to draw on.
+        :param shape: grid dimensions.
+        :return: PointRenderer object.
+        """
+        super().__init__(canvas)
+        self.shape = shape
+
+    def draw(self, points, has_rumor):
+        """
+        Replaces the image with the current state of the persons.
+        :param points: (i, j) -- int arrays of the persons' coordinates.
+        :param has_rumor: bool array with an entry per person.
+        :return: None.
+        """
+        if self.image is None:
+            self.setup(points, has_rumor)
+            return
+        width = int(self.canvas['width'])
+        height = int(self.canvas['height'])
+        pixels = point_pixels(points, has_rumor, self.shape, width, height)
+        self.image.configure(data=to_ppm(pixels), format='PPM')
@@ -0,0 +1,175 @@
+import numpy as np
+
+from recorder import Recording
+from render import POINTS, RASTER, RECTANGLES, CanvasRenderer, make_renderer
+from state import State
+
+# Generations per second a replay starts at.
+DEFAULT_SPEED = 10
+
+# Shortest time between two frames, in milliseconds. Faster replays skip
+# generations instead of drawing more often than the canvas can keep up with.
+MIN_FRAME_DELAY = 20
+
+
+class Replay:
+    """
+    This class plays a recorded run (see Simulation.record) on the App, the
+    way CellularAutomaton plays a live one, without computing anything: each
+    frame is read from the recording file. Only the frame on screen is held in
+    memory, so a replay may be as long as the file, and any generation can be
+    shown at once.
+    """
+
+    def __init__(self, app, render_mode=RECTANGLES):
+        """
+        Replay constructor.
+        :param app: a pointer to the containing App object.
+        :param render_mode: see CellularAutomaton.
+        :return: Replay object.
+        """
+        self.state = State()
+        self.app = app
+        self.render_mode = render_mode
+        self.renderer = CanvasRenderer(app.frame)
+        self.recording = None
+        self.occupied = None
+        self.n_persons = 0
+        self.position = 0  # Index of the frame on screen.
+        self.speed = DEFAULT_SPEED  # Generations per second.
+        self.loop_id = None  # Tkinter id of the next call to __loop.
+
+    @property
+    def is_open(self):
+        return self.recording is not None
+
+    def open(self, path):
+        """
+        Opens a recording and shows its first generation.
+        :param path: path of the recording file.
+        :return: None.
+        """
+        recording = Recording(path)
+        if len(recording) == 0:
+            raise ValueError('%s: recording has no frames' % path)
+        self.recording = recording
+        self.occupied = self.recording.occupied
+        self.n_persons = int(np.count_nonzero(self.occupied))
+        # Recordings hold grids, so points are drawn from them as an image.
+        render_mode = RASTER if self.render_mode == POINTS else self.render_mode
+        self.renderer = make_renderer(self.app.frame, self.occupied.shape, render_mode)
+        self.position = 0
+        has_rumor, is_spreading = self.recording.frame(0)
+        self.renderer.setup(self.occupied, has_rumor)
+        self.app.trend.reset(self.n_persons)
+        self.app.trend.show(self.recording.generations, self.recording.infected)
+        self.__update_info()
+        self.state.set_paused()
+
+    @property
+    def generation(self):
+        """
+        Generation of the frame on screen.
+        """
+        return int(self.recording.generations[self.position])
+
+    @property
+    def last_generation(self):
+        return int(self.recording.generations[-1])
+
+    def seek(self, generation):
+        """
+        Shows the last recorded frame at or before a generation.
+        :param generation: generation number.
+        :return: None.
+        """
+        position = self.recording.find(generation)
+        if position != self.position:
+            self.show(position)
+
+    def show(self, position):
+        """
+        Draws frame number position.
+        :param position: index of the frame.
+        :return: None.
+        """
+        self.position = position
+        has_rumor, is_spreading = self.recording.frame(position)
+        self.renderer.draw(self.occupied, has_rumor)
+        self.__update_info()
+
+    def __update_info(self):
+        """
+        This private method updates information entries in the app.
+        :return: None.
+        """
+        infected = int(self.recording.infected[self.position])
+
+        # Update entries.
+        self.app.generation.delete(0, 'end')
+        self.app.generation.insert(0, self.generation)
+        self.app.h_rumor.delete(0, 'end')
+        self.app.h_rumor.insert(0, infected)
+        self.app.distribution.delete(0, 'end')
+        dist = str(int((infected / max(self.n_persons, 1)) * 100)) + '%'
+        self.app.distribution.insert(0, dist)
+        self.app.seek_scale.set(self.generation)
+
+    def __loop(self):
+        """
+        This private method plays the recording: it shows the next frame and
+        schedules a call to itself, until the end of the recording, where it
+        pauses. Above 1000 / MIN_FRAME_DELAY generations per second, frames are
+        skipped to keep up.
+        :return: None.
+        """
+        self.loop_id = None
+        if self.state.is_running:
+            if self.position + 1 >= len(self.recording):
+                self.app.pause_btn_action()
+                return
+            delay = max(int(1000 / self.speed), MIN_FRAME_DELAY)
+            frames = max(int(self.speed * delay / 1000), 1)
+            self.show(min(self.position + frames, len(self.recording) - 1))
+            self.loop_id = self.app.after(delay, self.__loop)
+
+    def run(self):
+        """
+        This method plays the recording from the frame on screen, from the
+        start if the end was reached.
+        :return: None.
+        """
+        if self.position + 1 >= len(self.recording):
+            self.show(0)
+        self.halt()
+        self.state.set_running()
+        self.loop_id = self.app.after(0, self.__loop)
+
+    def halt(self):
+        """
+        Cancels the next call to the replay loop, if one is scheduled, so
+        only one loop plays at a time.
+        :return: None.
+        """
+        if self.loop_id is not None:
+            self.app.after_cancel(self.loop_id)
+            self.loop_id = None
+
+    def pause(self):
+        """
+        This method pauses the replay on the frame on screen.
+        :return: None.
+        """
+        self.halt()
+        self.state.set_paused()
+
+    def stop(self):
+        """
+        This method stops the replay and closes the recording.
+        :return: None.
+        """
+        self.halt()
+        self.renderer.clear()
+        self.state.set_stopped()
+        self.recording = None
+        self.occupied = None
@@ -0,0 +1,497 @@
+from collections import namedtuple
+
+import numpy as np
+
+from bitboard import BitboardEngine
+from engine import BatchEngine, FrontierEngine, VectorEngine, visiting_turns
+from graph import GraphEngine
+from population import (Population, count_neighbors, mixed_skepticism, ranked_skepticism, scatter,
+                        striped_skepticism)
+from recorder import Recorder
+from sparse import SparseEngine
+from tiles import TiledEngine
+from timing import Timing
+
+DIM = 100
+
+# Engines that can advance the automat.
+OBJECT_ENGINE = 'object'
+VECTOR_ENGINE = 'vector'
+FRONTIER_ENGINE = 'frontier'
+BITBOARD_ENGINE = 'bitboard'
+SPARSE_ENGINE = 'sparse'
+TILED_ENGINE = 'tiled'
+GRAPH_ENGINE = 'graph'
+
+# Classes of the engines that keep the state in arrays.
+ARRAY_ENGINES = {VECTOR_ENGINE: VectorEngine, FRONTIER_ENGINE: FrontierEngine, BITBOARD_ENGINE: BitboardEngine,
+                 SPARSE_ENGINE: SparseEngine, TILED_ENGINE: TiledEngine, GRAPH_ENGINE: GraphEngine}
+
+# Reasons a run stops, see Simulation.stop_reason.
+GENERATION_LIMIT = 'limit'  # The generation limit was reached.
+ABSORBED = 'absorbed'  # Nobody spreads or waits to spread, so nothing can change.
+FLAT = 'flat'  # The number of persons who heard the rumor did not change for a while.
+
+
+# Parameters of one run, in the order App.get_input returns them. WIDTH and
+# HEIGHT are the grid dimensions, the number of cells along i and along j.
+Params = namedtuple('Params', ['P', 'L', 'S1', 'S2', 'S3', 'S4', 'GL', 'RUNMODE', 'WIDTH', 'HEIGHT'],
+                    defaults=(np.inf, 'R', DIM, DIM))
+
+
+def seed_sequence(seed=None):
+    """
+    Turns a seed into the SeedSequence that drives a run. Without a seed, fresh
+    entropy is drawn and kept in the SeedSequence, so the run can be repeated.
+    :param seed: int, SeedSequence or None.
+    :return: SeedSequence object.
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
+
+
+def replicate_seed(seed, replicate):
+    """
+    Derives an independent stream for one replicate (or worker) of a batch
+    from the batch's seed. It is the same as seed_sequence(seed).spawn(n)[k]
+    for replicate k, but needs no other replicate, so any replicate of a
+    batch can be run again by itself.
+    :param seed: int, SeedSequence or None, the seed of the batch.
+    :param replicate: index of the replicate.
+    :return: SeedSequence object.
+    """
+    root = seed_sequence(seed)
+    return np.random.SeedSequence(root.entropy, spawn_key=root.spawn_key + (replicate,), pool_size=root.pool_size)
+
+
+def run_replicates(params, seeds, generations):
+    """
+    Runs one simulation for each seed, all of them stepped together by a
+    BatchEngine. Replicate k gives the same series as a vector-engine
+    Simulation reset with seeds[k].
+    :param params: Params, or a tuple in the same order.
+    :param seeds: list of K seeds, e.g. replicate_seed(seed, k) for each k.
+    :param generations: number of generations to run.
+    :return: int array of shape (K, generations), the number of persons who
+    heard the rumor in each generation of each replicate. Once every grid is
+    absorbed the remaining generations are filled in without stepping.
+    """
+    engines = []
+    for seed in seeds:
+        simulation = Simulation(VECTOR_ENGINE)
+        simulation.reset(params, seed)
+        engines.append(simulation.vector)
+    engine = BatchEngine.from_engines(engines)
+
+    trand = np.zeros((len(seeds), generations), dtype=np.int64)
+    for generation in range(generations):
+        absorbed = engine.absorbed.all()
+        trand[:, generation] = engine.step()
+        if absorbed:
+            trand[:, generation + 1:] = trand[:, generation, None]
+            break
+    return trand
+
+
+class Simulation:
+    """
+    This class implements the simulation itself, without any user interface, so
+    it can run in a batch job or on a machine without a display. The App only
+    observes it through CellularAutomaton.
+    """
+
+    def __init__(self, engine=OBJECT_ENGINE, flat_window=None):
+        """
+        Simulation constructor. A simulation object contains the parameters, a
+        grid as a 2d list, a list of people in the automat and a list named
+        "trand" that stores the number of the persons that heard the romer in
+        each generation.
+        :param engine: OBJECT_ENGINE to advance person by person,
+        VECTOR_ENGINE to advance the whole grid with NumPy, FRONTIER_ENGINE
+        to advance only the persons spreading the rumor and their neighbours,
+        BITBOARD_ENGINE to keep the grid as bit planes, for very large grids,
+        SPARSE_ENGINE to keep only the occupied cells, for low densities,
+        TILED_ENGINE to split the grid between processes, one per core, or
+        GRAPH_ENGINE to run on any graph, see reset_graph().
+        :param flat_window: stop once the number of persons who heard the
+        rumor stayed the same for this many generations, or None to stop only
+        when nothing can change any more.
+        :return: Simulation object.
+        """
+        self.engine = engine
+        self.flat_window = flat_window
+        self.stop_reason = None  # ABSORBED, FLAT or GENERATION_LIMIT once the run stopped.
+        self.generation = 0
+        self.width = DIM
+        self.height = DIM
+
+        # Experiment's parameters -- initializes later by reset() function.
+        self.p = 0.0
+        self.l = 0
+        self.s1 = 0.0
+        self.s2 = 0.0
+        self.s3 = 0.0
+        self.s4 = 0.0
+        self.gen_limit = 0
+        self.infected_persons = 0
+        self.n_persons = 0
+
+        self.n_s1 = 0
+        self.n_s2 = 0
+        self.n_s3 = 0
+        self.n_s4 = 0
+
+        # Data-structures.
+        self.population = None  # Store all the persons, see place().
+        self.graph = None  # Adjacency linking the persons, when run on a graph, see reset_graph().
+        self.trand = []  # Store number of infected in each generation.
+        self.vector = None  # Engine object, when an array engine is selected.
+        self.recorder = None  # Recorder of the grid in each generation, see record().
+        self.timing = Timing()  # Time spent in each phase, once enabled.
+
+        # Every random number of a run comes from one generator, see reseed().
+        self.seed = None
+        self.rng = None
+        self.reseed()
+
+    def reset(self, params, seed=None):
+        """
+        Places a new population according to the parameters and the run mode,
+        and rewinds the simulation to generation 0.
+        :param params: Params, or a tuple in the same order.
+        :param seed: seed for the random numbers, see seed_sequence().
+        :return: None.
+        """
+        P, L, S1, S2, S3, S4, GL, RUNMODE, WIDTH, HEIGHT = Params(*params)
+        self.clear()
+        self.timing.clear()
+        self.width = WIDTH
+        self.height = HEIGHT
+        self.reseed(seed)
+        if RUNMODE == "R":
+            self.set(P, L, S1, S2, S3, S4, GL)
+        elif RUNMODE == "S":
+            self.set_slow(P, L, S1, S2, S3, S4, GL)
+        elif RUNMODE == "F":
+            self.set_fast(P, L, S1, S2, S3, S4, GL)
+        else:
+            raise ValueError('Unknown run mode: %s' % RUNMODE)
+
+    def reset_graph(self, graph, params, seed=None):
+        """
+        Places a new population on a graph instead of the grid, one person on
+        each node, and rewinds the simulation to generation 0. P, WIDTH and
+        HEIGHT are not used: the persons are drawn on a square grid in the
+        order of the nodes. The run modes work as on the grid, with the nodes
+        visited in a random order: S gives the most skeptical levels to the
+        persons with the most links, F assigns them in stripes along the
+        nodes.
+        :param graph: Adjacency object, see graph.py for ways to build one.
+        :param params: Params, or a tuple in the same order.
+        :param seed: seed for the random numbers, see seed_sequence().
+        :return: None.
+        """
+        P, L, S1, S2, S3, S4, GL, RUNMODE, _, _ = Params(*params)
+        if self.engine != GRAPH_ENGINE:
+            raise ValueError('Only the graph engine runs on a graph.')
+        self.clear()
+        self.timing.clear()
+        self.graph = graph
+        self.height = max(int(np.ceil(np.sqrt(graph.size))), 1)
+        self.width = max(-(-graph.size // self.height), 1)
+        self.reseed(seed)
+        self.set_parameters(P, L, S1, S2, S3, S4, GL, graph.size)
+        counts = [self.n_s1, self.n_s2, self.n_s3, self.n_s4]
+
+        # Visit the nodes in a random order; node k is drawn on cell k.
+        with self.timing.phase('setup: positions'):
+            order = self.rng.permutation(graph.size)
+            i, j = np.divmod(order, self.height)
+
+        with self.timing.phase('setup: skepticism'):
+            if RUNMODE == "R":
+                skepticism = mixed_skepticism(self.n_persons, [self.s1, self.s2, self.s3, self.s4], self.rng)
+            elif RUNMODE == "S":
+                skepticism, list3 = ranked_skepticism(graph.degree[order], counts)
+            elif RUNMODE == "F":
+                skepticism = striped_skepticism(i, j, (self.width, self.height), counts)
+            else:
+                raise ValueError('Unknown run mode: %s' % RUNMODE)
+
+        spreader = list3[self.rng.integers(list3.size)] if RUNMODE == "S" else 0
+        self.place(i, j, skepticism, spreader, L)
+
+    def reseed(self, seed=None):
+        """
+        Restarts the random numbers of the run from a seed. The seed actually
+        used is kept in self.seed, also when fresh entropy was drawn.
+        :param seed: int, SeedSequence or None, see seed_sequence().
+        :return: None.
+        """
+        self.seed = seed_sequence(seed)
+        self.rng = np.random.default_rng(self.seed)
+
+    def clear(self):
+        """
+        Drops the population and the history, and closes the recording.
+        :return: None.
+        """
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        self.population = None
+        self.graph = None
+        self.trand = []
+        self.vector = None
+        self.generation = 0
+        self.infected_persons = 0
+        self.stop_reason = None
+
+    def step(self):
+        """
+        This method defines the changes taking place in the transition between
+        two generations in the automata. If the automat could not change in
+        this generation, or stayed flat for flat_window generations, the run
+        is marked as stopped in stop_reason; the last value of trand is then
+        final.
+        :return: number of persons who heard the rumor at the beginning of the
+        generation.
+        """
+
+        # Advance generation.
+        self.generation += 1
+
+        timing = self.timing
+        timing.begin_generation()
+
+        # Record the grid as the generation begins, as trand counts it.
+        if self.recorder is not None and self.recorder.wants(self.generation):
+            with timing.phase('record'):
+                self.recorder.record(self.generation, *self.packed_state())
+
+        if self.vector is not None:
+            absorbed = self.vector.absorbed
+            self.infected_persons = self.vector.step(timing)
+        else:
+            absorbed = self.population.absorbed
+            self.infected_persons = self.population.step(self.rng.random, timing)
+
+        self.trand.append(self.infected_persons)
+
+        # The counts never decrease, so equal ends mean a flat window.
+        window = self.flat_window
+        if absorbed:
+            self.stop_reason = ABSORBED
+        elif window and len(self.trand) > window and self.trand[-window - 1] == self.infected_persons:
+            self.stop_reason = FLAT
+        timing.end_generation(self.generation)
+        return self.infected_persons
+
+    def run(self, max_generations=None):
+        """
+        Advances the simulation until the generation limit, or until it stops
+        on its own, see step(). The reason is left in stop_reason.
+        :param max_generations: number of generations to run, defaults to the
+        generation limit of the parameters.
+        :return: the trand list, number of infected in each generation.
+        """
+        limit = self.gen_limit if max_generations is None else max_generations
+        if limit == np.inf and not self.flat_window:
+            raise ValueError('A headless run needs a generation limit or a flat window.')
+        if self.stop_reason == GENERATION_LIMIT:
+            self.stop_reason = None
+        while self.stop_reason is None:
+            if self.generation >= limit:
+                self.stop_reason = GENERATION_LIMIT
+                break
+            self.step()
+        return self.trand
+
+    def rumor_grid(self):
+        """
+        Returns the current state of the grid, for drawing it.
+        :return: (occupied, has_rumor) -- two bool arrays indexed [i][j].
+        """
+        if self.vector is not None:
+            return self.vector.occupied, self.vector.has_rumor
+        return self.population.grids()
+
+    def rumor_points(self):
+        """
+        Returns the persons and who heard the rumor, for drawing them without
+        a grid (see render.PointRenderer). The coordinates do not change
+        during a run.
+        :return: ((i, j), has_rumor) -- int arrays of the persons'
+        coordinates, and a bool array with an entry per person.
+        """
+        if isinstance(self.vector, SparseEngine):
+            return self.vector.rumor_points()
+        if self.vector is None:
+            return (self.population.i, self.population.j), self.population.has_rumor
+        occupied, has_rumor = self.rumor_grid()
+        i, j = np.nonzero(occupied)
+        return (i, j), has_rumor[i, j]
+
+    def packed_state(self):
+        """
+        Returns who heard the rumor and who is spreading it, for recording,
+        packed by the engine from its own arrays (see recorder.pack_grid).
+        :return: (infected, has_rumor, is_spreading) -- the number of persons
+        who heard the rumor, and two packed grids.
+        """
+        if self.vector is not None:
+            state = self.vector
+            infected = state.count_infected()
+        else:
+            state = self.population
+            infected = int(np.count_nonzero(state.has_rumor))
+        return infected, state.packed('has_rumor'), state.packed('is_spreading')
+
+    def record(self, path, every=1):
+        """
+        Starts recording the grid of each generation to a file, from the next
+        step on, until the simulation is cleared. See recorder.Recording for
+        reading it back.
+        :param path: path of the recording file.
+        :param every: record one generation out of every this many.
+        :return: Recorder object.
+        """
+        if self.recorder is not None:
+            self.recorder.close()
+        occupied, has_rumor = self.rumor_grid()
+        self.recorder = Recorder(path, occupied, every)
+        return self.recorder
+
+    def set_parameters(self, P, L, S1, S2, S3, S4, GL, n_persons=None):
+        """
+        Stores the experiment's parameters and the number of persons of each
+        skepticism level they imply.
+        :param n_persons: number of persons, defaults to the share P of the
+        grid's cells.
+        :return: None.
+        """
+        self.p = P
+        self.l = L
+        self.s1 = S1
+        self.s2 = S2
+        self.s3 = S3
+        self.s4 = S4
+        self.gen_limit = GL
+        self.n_persons = int(self.width * self.height * P) if n_persons is None else n_persons
+        self.n_s1 = int(self.n_persons * self.s1)
+        self.n_s2 = int(self.n_persons * self.s2)
+        self.n_s3 = int(self.n_persons * self.s3)
+        self.n_s4 = int(self.n_persons * self.s4)
+
+    def place(self, i, j, skepticism, spreader, L):
+        """
+        Creates the population chosen by set(), set_slow() or set_fast(), in
+        the selected engine, and lets the spreader start the rumor.
+        :param i: int array of the persons' first coordinate.
+        :param j: int array of the persons' second coordinate.
+        :param skepticism: uint8 array of skepticism codes (1..4).
+        :param spreader: index of the person who starts the rumor.
+        :param L: number of generations a person waits after spreading.
+        :return: None.
+        """
+        shape = (self.width, self.height)
+        engine_class = ARRAY_ENGINES.get(self.engine)
+        if engine_class is not None:
+            with self.timing.phase('setup: place'):
+                if self.graph is not None:
+                    self.vector = GraphEngine(shape, L, self.rng, self.graph)
+                else:
+                    self.vector = engine_class(shape, L, self.rng)
+                self.vector.place(i, j, skepticism, visiting_turns(i.size))
+            with self.timing.phase('setup: start'):
+                self.vector.start_rumor(i[spreader], j[spreader])
+        else:
+            with self.timing.phase('setup: place'):
+                self.population = Population(i, j, skepticism, shape, L)
+            with self.timing.phase('setup: start'):
+                self.population.start_rumor(spreader, self.rng.random)
+
+    def set(self, P, L, S1, S2, S3, S4, GL, seed=None):
+        # Set parameters.
+        """
+        The set function initializes the grid with a given number of persons,
+        and sets their skepticism levels. It also randomly selects one person to be
+        the spreader of the rumor.
+        :param P: the percentage of the grid that is occupied by persons.
+        :param L: the number of neighbors that each person can hear.
+        :param S1: the percentage of the population that is skeptical level 1.
+        :param S2: the percentage of the population that is skeptical level 2.
+        :param S3: the percentage of the population that is skeptical level 3.
+        :param S4: the percentage of the population that is skeptical level 4.
+        :param GL: the generation limit.
+        :param seed: seed for the random numbers, or None to go on with the
+        current generator.
+        :return: None.
+        """
+        if seed is not None:
+            self.reseed(seed)
+        self.set_parameters(P, L, S1, S2, S3, S4, GL)
+
+        # Select random positions, in a random order, and a skepticism level
+        # for each person.
+        with self.timing.phase('setup: positions'):
+            i, j = scatter((self.width, self.height), self.n_persons, self.rng)
+        with self.timing.phase('setup: skepticism'):
+            skepticism = mixed_skepticism(self.n_persons, [self.s1, self.s2, self.s3, self.s4], self.rng)
+
+        # The first person in the order is the spreader.
+        self.place(i, j, skepticism, 0, L)
+
+    def set_slow(self, P, L, S1, S2, S3, S4, GL, seed=None):
+        # Set parameters.
+        if seed is not None:
+            self.reseed(seed)
+        self.set_parameters(P, L, S1, S2, S3, S4, GL)
+
+        # Select random positions, in a random order.
+        with self.timing.phase('setup: positions'):
+            i, j = scatter((self.width, self.height), self.n_persons, self.rng)
+
+        # The persons with the most neighbours are the most skeptical.
+        with self.timing.phase('setup: skepticism'):
+            degree = count_neighbors(i, j, (self.width, self.height))
+            skepticism, list3 = ranked_skepticism(degree, [self.n_s1, self.n_s2, self.n_s3, self.n_s4])
+
+        spreader = list3[self.rng.integers(list3.size)]
+        self.place(i, j, skepticism, spreader, L)
+
+    def set_fast(self, P, L, S1, S2, S3, S4, GL, seed=None):
+        """
+    The set_fast function is a faster way to set up the simulation.
+    It takes in all of the parameters that are needed for the simulation, and then sets them up.
+    The function also creates a grid with cells, and places persons on it randomly.
+    Then it sorts these persons by their position (x-coordinate first), so that they can be placed into groups based on their skepticism level.
+
+    :param self: Refer to the object itself
+    :param P: Determine the density of people in the grid
+    :param L: Set the limit of how many times a person can spread the rumor
+    :param S1: Set the number of people with skepticism level 1
+    :param S2: Determine the number of people with skepticism level s2
+    :param S3: Set the amount of people with skepticism level 3
+    :param S4: Set the number of people that are skeptical about the rumor
+    :param GL: Set the generation limit
+    :param seed: Seed for the random numbers, or None to go on with the current generator
+    :return: A list of the persons that have skepticism 1
+    """
+        # Set parameters.
+        if seed is not None:
+            self.reseed(seed)
+        self.set_parameters(P, L, S1, S2, S3, S4, GL)
+
+        # Select random positions, in a random order.
+        with self.timing.phase('setup: positions'):
+            i, j = scatter((self.width, self.height), self.n_persons, self.rng)
+
+        # Assign skepticism levels in stripes, walking the persons by position.
+        with self.timing.phase('setup: skepticism'):
+            skepticism = striped_skepticism(i, j, (self.width, self.height),
+                                            [self.n_s1, self.n_s2, self.n_s3, self.n_s4])
+
+        # The first person in the order is the spreader.
+        self.place(i, j, skepticism, 0, L)
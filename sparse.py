@@ -0,0 +1,193 @@
+import numpy as np
+
+from adjacency import Adjacency
+from engine import VectorEngine, deliver, delivery_keys, visiting_turns
+from recorder import pack_cells
+
+# The arrays holding the state of a SparseEngine, one entry per person, the
+# persons sorted by cell.
+SPARSE_ARRAYS = ('cell', 'skepticism', 'turn', 'has_rumor', 'is_spreading', 'wait_to_spread', 'cooldown', 'received')
+
+
+class SparseEngine(VectorEngine):
+    """
+    This class advances the automat like VectorEngine, with the same results
+    for the same random generator, but keeps only the occupied cells: every
+    field is an array with one entry per person, the persons sorted by their
+    flat cell i * shape[1] + j, and the neighbours come from an Adjacency found
+    by binary search in the sorted cells. Memory and the time of a generation
+    follow the number of persons and not the size of the grid, so a sparse
+    population can live on a grid far larger than dense arrays allow.
+    """
+
+    # Names of the arrays that hold the whole state, see adopt().
+    state_arrays = SPARSE_ARRAYS
+
+    def __init__(self, shape, L, rng=None):
+        """
+        Engine constructor. Creates an empty grid; persons are added with
+        place().
+        :param shape: grid dimensions.
+        :param L: number of generations a person waits after spreading.
+        :param rng: numpy random generator.
+        :return: SparseEngine object.
+        """
+        self.shape = shape
+        self.L = L
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.allocate(0)
+
+    def allocate(self, n_persons):
+        """
+        Creates the state arrays for a number of persons, about 17 bytes per
+        person, and the adjacency, up to 4 bytes per neighbour.
+        :param n_persons: number of persons.
+        :return: None.
+        """
+        self.adopt({
+            'cell': np.zeros(n_persons, dtype=np.int64),
+            'skepticism': np.zeros(n_persons, dtype=np.uint8),
+            'turn': np.zeros(n_persons, dtype=np.uint16),
+            'has_rumor': np.zeros(n_persons, dtype=bool),
+            'is_spreading': np.zeros(n_persons, dtype=bool),
+            'wait_to_spread': np.zeros(n_persons, dtype=bool),
+            'cooldown': np.zeros(n_persons, dtype=np.min_scalar_type(self.L)),
+            'received': np.zeros(n_persons, dtype=np.uint8),
+        })
+
+    @property
+    def nbytes(self):
+        """
+        Memory taken by the state arrays and the adjacency, in bytes.
+        """
+        return super().nbytes + self.adjacency.offsets.nbytes + self.adjacency.indices.nbytes
+
+    def adopt(self, arrays):
+        """
+        Takes over state arrays, for example arrays memory-mapped from a
+        checkpoint, instead of the engine's own, and finds the neighbours of
+        the persons.
+        :param arrays: dict with an array for each name in state_arrays.
+        :return: None.
+        """
+        for name in self.state_arrays:
+            setattr(self, '_' + name, arrays[name])
+        self.adjacency = Adjacency.from_cells(self._cell, self.shape)
+
+    def load(self, population, replicate=Ellipsis):
+        """
+        Copies the state of a Population into the arrays, see VectorEngine.
+        :param population: Population object.
+        :param replicate: unused, a SparseEngine holds one grid.
+        :return: None.
+        """
+        i = np.asarray(population.i, dtype=np.int64)
+        j = np.asarray(population.j, dtype=np.int64)
+        order = self.place(i, j, population.skepticism, visiting_turns(len(population)))
+        for name in ('has_rumor', 'is_spreading', 'wait_to_spread', 'cooldown', 'received'):
+            getattr(self, '_' + name)[...] = getattr(population, name)[order]
+
+    def place(self, i, j, skepticism, turn):
+        """
+        Puts the persons on the grid, sorted by cell; the engine holds only
+        these persons.
+        :param i: int array of the persons' first coordinate.
+        :param j: int array of the persons' second coordinate.
+        :param skepticism: uint8 array of skepticism codes (1..4).
+        :param turn: uint16 array, the order in which the persons are visited.
+        :return: int array, the index of each sorted person in the arrays
+        given.
+        """
+        cells = np.asarray(i, dtype=np.int64) * self.shape[1] + j
+        order = np.argsort(cells)
+        arrays = {'cell': cells[order], 'skepticism': np.asarray(skepticism, dtype=np.uint8)[order],
+                  'turn': np.asarray(turn, dtype=np.uint16)[order]}
+        for name in self.state_arrays[3:]:
+            arrays[name] = np.zeros(order.size, dtype=getattr(self, '_' + name).dtype)
+        self.adopt(arrays)
+        return order
+
+    def find(self, i, j):
+        """
+        Returns the index of the person on [i][j].
+        """
+        return int(np.searchsorted(self._cell, i * self.shape[1] + j))
+
+    def start_rumor(self, i, j):
+        """
+        Makes the person on [i][j] hear the rumor and spread it to its
+        neighbours, like set() does with the chosen spreader.
+        :param i: first coordinate of the person.
+        :param j: second coordinate of the person.
+        :return: None.
+        """
+        person = self.find(i, j)
+        self._has_rumor[person] = True
+        targets = self.adjacency.neighbors(person)
+        turns = np.full(targets.size, self._turn[person])
+        receivers, convinced, _ = deliver(targets, turns, self._skepticism, self._received, self.uniforms)
+        self._has_rumor[receivers] = True
+        self._is_spreading[convinced] = True
+        self._wait_to_spread[person] = True
+        self._cooldown[person] = self.L
+
+    def deliveries(self, persons):
+        """
+        Lists the deliveries of some persons spreading the rumor, one to each
+        of their neighbours.
+        :param persons: indices of the persons.
+        :return: int64 array of delivery keys, see engine.delivery_keys().
+        """
+        sources, targets = self.adjacency.gather(persons)
+        return delivery_keys(targets, self._turn[sources])
+
+    @property
+    def points(self):
+        """
+        Coordinates of the persons.
+        :return: (i, j) -- int arrays.
+        """
+        return np.divmod(self._cell, self.shape[1])
+
+    def grid(self, values):
+        """
+        Lays out one value per person on the grid.
+        :param values: bool array with an entry per person, or one bool.
+        :return: bool array indexed [i][j], False where nobody lives.
+        """
+        grid = np.zeros(self.shape, dtype=bool)
+        grid.ravel()[self._cell] = values
+        return grid
+
+    def packed(self, name):
+        """
+        Packs a field of the persons for a recording from their cells,
+        without building a grid, see recorder.pack_cells.
+        :param name: 'has_rumor' or 'is_spreading'.
+        :return: uint8 array.
+        """
+        return pack_cells(self._cell[getattr(self, '_' + name)], self.shape)
+
+    @property
+    def occupied(self):
+        return self.grid(True)
+
+    @property
+    def has_rumor(self):
+        return self.grid(self._has_rumor)
+
+    @property
+    def is_spreading(self):
+        return self.grid(self._is_spreading)
+
+    @property
+    def wait_to_spread(self):
+        return self.grid(self._wait_to_spread)
+
+    def rumor_points(self):
+        """
+        Returns the persons and who heard the rumor, without a grid.
+        :return: ((i, j), has_rumor) -- int arrays of the persons'
+        coordinates, and a bool array with an entry per person.
+        """
+        return self.points, self._has_rumor
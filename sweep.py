@@ -0,0 +1,254 @@
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from cache import CACHE_DIR, MAX_BYTES, SUMMARY_FIELDS, ResultCache, run_key, summarize
+from simulation import (BITBOARD_ENGINE, FRONTIER_ENGINE, GRAPH_ENGINE, OBJECT_ENGINE, SPARSE_ENGINE, TILED_ENGINE,
+                        VECTOR_ENGINE, Params, Simulation, replicate_seed)
+
+# Columns of the results table, one row per run.
+PARAM_COLUMNS = ['P', 'L', 'S1', 'S2', 'S3', 'S4', 'GL', 'RUNMODE', 'WIDTH', 'HEIGHT', 'seed', 'replicate', 'engine']
+RESULT_COLUMNS = SUMMARY_FIELDS
+COLUMNS = PARAM_COLUMNS + RESULT_COLUMNS
+
+
+def make_tasks(P, L, mixes, modes, replicates, generations, engine=VECTOR_ENGINE, seed=0):
+    """
+    Builds the list of runs of a sweep: every combination of the parameter
+    values, each repeated replicates times. Replicate k of every combination
+    draws from the same stream, replicate_seed(seed, k), so combinations are
+    compared on the same random numbers.
+    :param P: list of population densities.
+    :param L: list of L values.
+    :param mixes: list of (S1, S2, S3, S4) tuples.
+    :param modes: list of run modes ("R", "S", "F").
+    :param replicates: number of runs per combination.
+    :param generations: generation limit of every run.
+    :param engine: engine used by the runs.
+    :param seed: seed of the sweep.
+    :return: list of (Params, seed, replicate, engine) tuples.
+    """
+    tasks = []
+    for p, l, mix, mode in itertools.product(P, L, mixes, modes):
+        params = Params(p, l, *mix, generations, mode)
+        for replicate in range(replicates):
+            tasks.append((params, seed, replicate, engine))
+    return tasks
+
+
+def task_key(params, seed, replicate, engine):
+    """
+    Identifies a run in the results table, so finished runs are not repeated.
+    :return: tuple of strings.
+    """
+    return tuple(str(value) for value in (*params, seed, replicate, engine))
+
+
+def cache_key(params, seed, replicate, engine):
+    """
+    Identifies a run in the result cache, see cache.run_key().
+    :return: hex string.
+    """
+    return run_key(params, replicate_seed(seed, replicate), engine)
+
+
+def make_row(task, summary):
+    """
+    Builds the row of a run in the results table.
+    :param task: (Params, seed, replicate, engine) tuple.
+    :param summary: dict with the RESULT_COLUMNS, see cache.summarize().
+    :return: dict with the COLUMNS of the results table.
+    """
+    row = dict(zip(PARAM_COLUMNS, (*task[0], *task[1:])))
+    row.update(summary)
+    return row
+
+
+def run_task(task):
+    """
+    Runs one simulation of a sweep. This is the function executed by the
+    worker processes. A row of the results can be run again by itself with
+    the same seed and replicate.
+    :param task: (Params, seed, replicate, engine) tuple.
+    :return: (row, trand) -- dict with the COLUMNS of the results table, and
+    the number of persons who heard the rumor in each generation.
+    """
+    params, seed, replicate, engine = task
+    start = time.perf_counter()
+    simulation = Simulation(engine)
+    simulation.reset(params, replicate_seed(seed, replicate))
+    trand = simulation.run()
+    return make_row(task, summarize(simulation, time.perf_counter() - start)), trand
+
+
+def finished_keys(path):
+    """
+    Reads the runs already stored in a results file.
+    :param path: path of a CSV results file.
+    :return: set of task keys.
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, newline='') as f:
+        return {tuple(row[column] for column in PARAM_COLUMNS) for row in csv.DictReader(f)}
+
+
+def run_pool(tasks, workers, finish, report):
+    """
+    Runs tasks over a new pool of processes, with no more tasks submitted
+    than there are processes, so the tasks running when a worker dies are
+    known. Finished tasks, and tasks that raise, are removed from the list.
+    :param tasks: list of (Params, seed, replicate, engine) tuples.
+    :param workers: number of processes.
+    :param finish: function receiving each finished task and its (row, trand)
+    result, see run_task().
+    :param report: function receiving progress messages.
+    :return: list of the tasks that were running when the pool broke, empty
+    if it did not break.
+    """
+    waiting = iter(list(tasks))
+    running = {}
+    suspects = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for task in itertools.islice(waiting, workers):
+            running[pool.submit(run_task, task)] = task
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    suspects.append(task)
+                    continue
+                except Exception as error:
+                    report('Run %s failed: %r' % (task_key(*task), error))
+                else:
+                    finish(task, result)
+                tasks.remove(task)
+            if suspects:
+                return suspects + list(running.values())
+            for task in itertools.islice(waiting, len(done)):
+                running[pool.submit(run_task, task)] = task
+    return suspects
+
+
+def sweep(tasks, path, workers=None, report=print, cache=None):
+    """
+    Runs all the tasks over a pool of processes and appends one row per run to
+    a CSV file as soon as it finishes. Runs already in the file are skipped,
+    so an interrupted sweep continues where it stopped, and runs found in the
+    cache are written without running them. If a worker process dies, the
+    runs it may have been running are run again one by one, each in a pool of
+    its own: a run that kills its worker again is skipped, and the pool is
+    restarted for the others.
+    :param tasks: list of (Params, seed, replicate, engine) tuples, see
+    make_tasks().
+    :param path: path of the CSV results file.
+    :param workers: number of processes, defaults to the number of cores.
+    :param report: function receiving progress messages.
+    :param cache: ResultCache to look the runs up in and store them in, or
+    None.
+    :return: (number of finished runs, runs per second).
+    """
+    done = finished_keys(path)
+    pending = [task for task in tasks if task_key(*task) not in done]
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    workers = workers or os.cpu_count() or 1
+    finished = 0
+    start = time.perf_counter()
+
+    with open(path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        if new_file:
+            writer.writeheader()
+
+        def finish(task, result):
+            nonlocal finished
+            row, trand = result
+            writer.writerow(row)
+            f.flush()
+            if cache is not None:
+                cache.put(cache_key(*task), trand, {name: row[name] for name in RESULT_COLUMNS})
+            finished += 1
+            if finished % 100 == 0:
+                report('%d runs, %.2f runs/second' % (finished, finished / (time.perf_counter() - start)))
+
+        # Runs in the cache are written at once; only the parent process uses
+        # the cache, so the workers never write to it at the same time.
+        if cache is not None:
+            missing = []
+            for task in pending:
+                cached = cache.get(cache_key(*task))
+                if cached is None:
+                    missing.append(task)
+                else:
+                    writer.writerow(make_row(task, cached[1]))
+                    finished += 1
+            f.flush()
+            pending = missing
+
+        while pending:
+            suspects = run_pool(pending, workers, finish, report)
+            if suspects:
+                report('A worker died, running its %d possible runs one by one.' % len(suspects))
+            for task in suspects:
+                if run_pool([task], 1, finish, report):
+                    report('Run %s killed its worker twice, skipped.' % (task_key(*task),))
+                pending.remove(task)
+
+    elapsed = time.perf_counter() - start
+    rate = finished / elapsed if elapsed > 0 else 0.0
+    report('%d runs in %.1f seconds, %.2f runs/second' % (finished, elapsed, rate))
+    if cache is not None:
+        report('Result cache: %d hits, %d misses' % (cache.hits, cache.misses))
+    return finished, rate
+
+
+def parse_mix(text):
+    """
+    Parses a skepticism mix given as "S1,S2,S3,S4".
+    """
+    mix = tuple(float(value) for value in text.split(','))
+    if len(mix) != 4:
+        raise argparse.ArgumentTypeError('A mix needs 4 values: S1,S2,S3,S4.')
+    return mix
+
+
+def main():
+    """
+    Command line entry point, for example:
+    python sweep.py --P 0.4 0.6 0.8 --L 0 2 4 --mix 0.3,0.25,0.2,0.25 --replicates 20 --out sweep.csv
+    """
+    parser = argparse.ArgumentParser(description='Runs a parameter sweep of the rumor automat.')
+    parser.add_argument('--P', type=float, nargs='+', default=[0.6], help='population densities')
+    parser.add_argument('--L', type=int, nargs='+', default=[2], help='L values')
+    parser.add_argument('--mix', type=parse_mix, nargs='+', default=[(0.3, 0.25, 0.2, 0.25)],
+                        help='skepticism mixes, each as S1,S2,S3,S4')
+    parser.add_argument('--modes', nargs='+', default=['R', 'S', 'F'], choices=['R', 'S', 'F'],
+                        help='run modes')
+    parser.add_argument('--replicates', type=int, default=10, help='runs per combination')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the sweep')
+    parser.add_argument('--generations', type=int, default=100, help='generations per run')
+    parser.add_argument('--engine', default=VECTOR_ENGINE,
+                        choices=[OBJECT_ENGINE, VECTOR_ENGINE, FRONTIER_ENGINE, BITBOARD_ENGINE, SPARSE_ENGINE,
+                                 TILED_ENGINE, GRAPH_ENGINE])
+    parser.add_argument('--workers', type=int, default=None, help='processes, defaults to all cores')
+    parser.add_argument('--out', default='sweep.csv', help='CSV file the results are appended to')
+    parser.add_argument('--cache', default=CACHE_DIR, help='directory of the result cache')
+    parser.add_argument('--cache-mb', type=float, default=MAX_BYTES / 2 ** 20, help='size limit of the cache, in MB')
+    parser.add_argument('--no-cache', action='store_true', help='run every task, without the result cache')
+    args = parser.parse_args()
+
+    tasks = make_tasks(args.P, args.L, args.mix, args.modes, args.replicates, args.generations,
+                       args.engine, args.seed)
+    cache = None if args.no_cache else ResultCache(args.cache, int(args.cache_mb * 2 ** 20))
+    sweep(tasks, args.out, args.workers, cache=cache)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository, next to this folder.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import simulation
+from tiles import TiledEngine
+
+
+class ThreeTiles(TiledEngine):
+    """
+    The tiled engine on three tiles whatever the number of cores, so the tiles
+    exchange their borders also on one core.
+    """
+
+    def __init__(self, shape, L, rng=None, tiles=3):
+        super().__init__(shape, L, rng, tiles)
+
+
+@pytest.fixture(autouse=True)
+def three_tiles(monkeypatch):
+    monkeypatch.setitem(simulation.ARRAY_ENGINES, simulation.TILED_ENGINE, ThreeTiles)
+
+
+@pytest.fixture
+def simulations():
+    """
+    Makes simulations and closes their engines at the end of the test, so no
+    tile process outlives it.
+    """
+    made = []
+
+    def make(simulation_):
+        made.append(simulation_)
+        return simulation_
+
+    yield make
+    for simulation_ in made:
+        close = getattr(simulation_.vector, 'close', None)
+        if close is not None:
+            close()
+        simulation_.clear()
@@ -0,0 +1,32 @@
+import copy
+import json
+
+from benchmark import benchmark, case_key, compare, make_cases
+from simulation import VECTOR_ENGINE
+
+
+def test_compare_flags_regressions(tmp_path):
+    path = tmp_path / 'before.json'
+    cases = make_cases([VECTOR_ENGINE], [20, 30], [0.6], [1], [(0.3, 0.25, 0.2, 0.25)], ['R'])
+    benchmark(cases, 5, 1, path, report=lambda message: None)
+    with open(path) as f:
+        baseline = json.load(f)
+    assert [case_key(result) for result in baseline['results']] == [case_key(case) for case in cases]
+    messages = []
+    assert compare(baseline, baseline, report=messages.append) == []
+    assert messages == ['0 regressions beyond 10%.']
+
+    current = copy.deepcopy(baseline)
+    slower, other = current['results']
+    slower['step_seconds'] = baseline['results'][0]['step_seconds'] * 1.5 + 1e-3
+    slower['final_infected'] += 1
+    # Growth within the threshold or the noise is not a regression.
+    slower['setup_seconds'] *= 1.05
+    other['peak_memory'] += 1000
+    current['results'].append(dict(other, WIDTH=40, HEIGHT=40))
+
+    regressions = compare(baseline, current, report=messages.append)
+    key = case_key(slower)
+    assert regressions == [(key, 'final_infected', slower['final_infected'] - 1, slower['final_infected']),
+                           (key, 'step_seconds', baseline['results'][0]['step_seconds'], slower['step_seconds'])]
+    assert messages[-1] == '2 regressions beyond 10%.'
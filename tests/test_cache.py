@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pytest
+
+from cache import ResultCache, run_key
+from simulation import FRONTIER_ENGINE, Params
+
+PARAMS = Params(0.7, 1, 0.4, 0.3, 0.2, 0.1, 20, 'R', 20, 20)
+
+
+def test_key_ignores_parameter_types():
+    same = Params(np.float64(0.7), 1.0, 0.4, 0.3, 0.2, 0.1, np.int64(20), 'R', 20.0, 20)
+    assert run_key(same, 4) == run_key(PARAMS, 4)
+
+
+@pytest.mark.parametrize('change', [
+    dict(seed=5),
+    dict(params=PARAMS._replace(P=0.71)),
+    dict(engine=FRONTIER_ENGINE),
+    dict(flat_window=10),
+    dict(limit=21),
+])
+def test_key_changes_with_what_decides_the_run(change):
+    run = dict(params=PARAMS, seed=4)
+    assert run_key(**dict(run, **change)) != run_key(**run)
+
+
+def test_key_needs_seed():
+    with pytest.raises(ValueError):
+        run_key(PARAMS, None)
+
+
+def test_cached_run_is_returned(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    trand, summary = cache.run(PARAMS, 4)
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert cache.run(PARAMS, 4) == (trand, summary)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_runs_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put('a', [1] * 20, {})
+    cache.max_bytes = 2 * cache.size
+    cache.put('b', [1] * 20, {})
+    # Older uses than the clock tells apart; the get below makes 'a' recent.
+    os.utime(cache.file('a'), (1, 1))
+    os.utime(cache.file('b'), (2, 2))
+    cache.get('a')
+    cache.put('c', [1] * 20, {})
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+
+
+def test_storing_a_run_again_counts_its_file_once(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put('a', [1] * 20, {})
+    cache.put('b', [1] * 20, {})
+    size = cache.size
+    for _ in range(3):
+        cache.put('a', [1] * 20, {})
+    assert cache.size == size
+    cache.put('a', [1] * 40, {})
+    assert cache.size == sum(os.path.getsize(cache.file(key)) for key in 'ab')
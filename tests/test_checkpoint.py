@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+import checkpoint
+from simulation import ARRAY_ENGINES, OBJECT_ENGINE, Params, Simulation
+
+PARAMS = Params(0.8, 2, 0.4, 0.3, 0.2, 0.1, 30, 'S', 30, 40)
+
+
+@pytest.mark.parametrize('engine', [OBJECT_ENGINE] + sorted(ARRAY_ENGINES))
+def test_resume_matches_uninterrupted_run(simulations, tmp_path, engine):
+    path = str(tmp_path / 'run.ckpt')
+    simulation = simulations(Simulation(engine))
+    simulation.reset(PARAMS, 3)
+    simulation.run(8)
+    checkpoint.save(simulation, path)
+    simulation.run()
+
+    resumed = simulations(checkpoint.load(path))
+    assert resumed.generation == 8
+    resumed.run()
+    assert resumed.trand == simulation.trand
+    assert resumed.stop_reason == simulation.stop_reason
+    assert np.array_equal(resumed.rumor_grid()[1], simulation.rumor_grid()[1])
+    assert resumed.rng.random() == simulation.rng.random()
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from simulation import ARRAY_ENGINES, OBJECT_ENGINE, VECTOR_ENGINE, Params, Simulation
+
+OTHER_ENGINES = sorted(set(ARRAY_ENGINES) - {VECTOR_ENGINE})
+
+# Small runs covering the run modes, waiting after spreading, a dense and a
+# sparse population (placed in a different way), and a non-square grid.
+CASES = [
+    Params(0.8, 0, 0.5, 0.3, 0.2, 0, 40, 'R', 30, 40),
+    Params(0.7, 2, 0.3, 0.25, 0.2, 0.25, 40, 'S', 40, 30),
+    Params(0.9, 3, 0.4, 0.3, 0.2, 0.1, 40, 'F', 33, 33),
+    Params(0.08, 1, 0.6, 0.2, 0.1, 0.1, 40, 'R', 60, 50),
+]
+
+
+def outcome(simulation):
+    """
+    Sums up the end of a run: everything that must not depend on the engine.
+    """
+    occupied, has_rumor = simulation.rumor_grid()
+    return (simulation.trand, simulation.stop_reason, np.asarray(occupied).tolist(), np.asarray(has_rumor).tolist(),
+            simulation.rng.bit_generator.state)
+
+
+def run(simulations, engine, params, seed):
+    simulation = simulations(Simulation(engine))
+    simulation.reset(params, seed)
+    simulation.run()
+    return simulation
+
+
+@pytest.mark.parametrize('engine', OTHER_ENGINES)
+@pytest.mark.parametrize('params', CASES)
+def test_array_engines_match_vector(simulations, engine, params):
+    seed = 11
+    expected = outcome(run(simulations, VECTOR_ENGINE, params, seed))
+    assert outcome(run(simulations, engine, params, seed)) == expected
+
+
+@pytest.mark.parametrize('engine', [OBJECT_ENGINE] + sorted(ARRAY_ENGINES))
+def test_seed_repeats_run(simulations, engine):
+    params = CASES[1]
+    first = outcome(run(simulations, engine, params, 5))
+    assert outcome(run(simulations, engine, params, 5)) == first
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from graph import from_edges, read_edges
+from simulation import GRAPH_ENGINE, VECTOR_ENGINE, Params, Simulation
+
+# Two triangles, 0-1-2 and 3-4-5 joined by 2-3, with a repeated edge, an edge
+# given both ways and a loop.
+SOURCES = [0, 1, 2, 1, 2, 3, 4, 5, 4]
+TARGETS = [1, 2, 0, 0, 3, 4, 5, 3, 4]
+NEIGHBOURS = [[1, 2], [0, 2], [0, 1, 3], [2, 4, 5], [3, 5], [3, 4]]
+
+
+def rows(graph):
+    return [graph.indices[graph.offsets[k]:graph.offsets[k + 1]].tolist() for k in range(graph.size)]
+
+
+def test_from_edges():
+    assert rows(from_edges(SOURCES, TARGETS)) == NEIGHBOURS
+    # Nodes without edges are kept up to n_nodes.
+    assert rows(from_edges(SOURCES, TARGETS, 8)) == NEIGHBOURS + [[], []]
+    with pytest.raises(ValueError):
+        from_edges(SOURCES, TARGETS, 5)
+    with pytest.raises(ValueError):
+        from_edges([0, -1], [1, 2])
+
+
+def test_read_edges(tmp_path):
+    text = tmp_path / 'edges.txt'
+    text.write_text('# two triangles\n% joined by an edge\n'
+                    + ''.join('%d\t%d\n' % edge for edge in zip(SOURCES, TARGETS)))
+    assert rows(read_edges(str(text))) == NEIGHBOURS
+
+    array = tmp_path / 'edges.npy'
+    np.save(array, np.array([SOURCES, TARGETS]).T)
+    assert rows(read_edges(str(array), 7)) == NEIGHBOURS + [[]]
+
+    odd = tmp_path / 'odd.txt'
+    odd.write_text('0 1\n2\n')
+    with pytest.raises(ValueError):
+        read_edges(str(odd))
+
+
+def two_cliques(size):
+    """
+    Builds two cliques of size nodes each, not linked to each other.
+    """
+    sources, targets = np.triu_indices(size, 1)
+    return from_edges(np.concatenate([sources, sources + size]), np.concatenate([targets, targets + size]))
+
+
+@pytest.mark.parametrize('mode', ['R', 'S', 'F'])
+def test_reset_graph(mode):
+    graph = two_cliques(30)
+    params = Params(1, 1, 0.9, 0.1, 0, 0, 30, mode)
+    simulation = Simulation(GRAPH_ENGINE)
+    simulation.reset_graph(graph, params, 3)
+    assert simulation.n_persons == graph.size
+    trand = simulation.run()
+
+    # The rumor stays within the clique of the spreader.
+    has_rumor = simulation.rumor_points()[1]
+    assert has_rumor[:30].any() != has_rumor[30:].any()
+    assert trand[-1] == np.count_nonzero(has_rumor) > 1
+
+    simulation.reset_graph(graph, params, 3)
+    assert simulation.generation == 0
+    assert simulation.run() == trand
+
+
+def test_reset_graph_needs_graph_engine():
+    with pytest.raises(ValueError):
+        Simulation(VECTOR_ENGINE).reset_graph(two_cliques(3), Params(1, 1, 1, 0, 0, 0, 10), 0)
@@ -0,0 +1,58 @@
+import json
+
+import numpy as np
+import pytest
+
+from recorder import MAGIC, Recording
+from simulation import ARRAY_ENGINES, OBJECT_ENGINE, Params, Simulation
+
+GENERATIONS = 20
+
+
+def grids(simulation):
+    """
+    Copies who heard the rumor and who is spreading it, as grids.
+    """
+    if simulation.vector is not None:
+        return np.array(simulation.vector.has_rumor), np.array(simulation.vector.is_spreading)
+    population = simulation.population
+    return population.grid(population.has_rumor), population.grid(population.is_spreading)
+
+
+@pytest.mark.parametrize('engine', [OBJECT_ENGINE] + sorted(ARRAY_ENGINES))
+@pytest.mark.parametrize('density', [0.9, 0.05])
+def test_recording_round_trip(simulations, tmp_path, engine, density):
+    params = Params(density, 2, 0.7, 0.2, 0.1, 0, GENERATIONS, 'R', 37, 45)
+    expected = simulations(Simulation(engine))
+    expected.reset(params, 4)
+    occupied = np.array(expected.rumor_grid()[0])
+    frames = []
+    while expected.stop_reason is None and expected.generation < GENERATIONS:
+        frames.append(grids(expected))
+        expected.step()
+
+    path = str(tmp_path / 'run.rec')
+    simulation = simulations(Simulation(engine))
+    simulation.reset(params, 4)
+    simulation.record(path, every=3)
+    simulation.run()
+    simulation.recorder.flush()
+
+    recording = Recording(path)
+    assert recording.shape == occupied.shape
+    assert np.array_equal(recording.occupied, occupied)
+    assert recording.generations.tolist() == list(range(1, len(frames) + 1, 3))
+    for k, generation in enumerate(recording.generations):
+        has_rumor, is_spreading = recording.frame(k)
+        assert np.array_equal(has_rumor, frames[generation - 1][0])
+        assert np.array_equal(is_spreading, frames[generation - 1][1])
+        assert recording.infected[k] == np.count_nonzero(frames[generation - 1][0])
+
+
+def test_other_version_is_rejected(tmp_path):
+    path = str(tmp_path / 'old.rec')
+    header = json.dumps({'version': 1, 'shape': [4, 4], 'planes': ['has_rumor', 'is_spreading']}).encode()
+    with open(path, 'wb') as f:
+        f.write(MAGIC + np.uint64(len(header)).tobytes() + header + bytes(2))
+    with pytest.raises(ValueError, match='version'):
+        Recording(path)
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+import replay
+from recorder import Recorder
+from replay import Replay
+from simulation import VECTOR_ENGINE, Params, Simulation
+
+
+class Entry:
+    """
+    Stands for a Tkinter Entry or Scale of the App.
+    """
+
+    def __init__(self):
+        self.value = None
+
+    def delete(self, first, last):
+        self.value = None
+
+    def insert(self, index, value):
+        self.value = value
+
+    def set(self, value):
+        self.value = value
+
+
+class Trend:
+
+    def reset(self, n_persons):
+        pass
+
+    def show(self, generations, counts):
+        pass
+
+
+class App:
+    """
+    Stands for the App, with the entries a Replay writes to and no window.
+    """
+
+    def __init__(self):
+        self.frame = None
+        self.generation = Entry()
+        self.h_rumor = Entry()
+        self.distribution = Entry()
+        self.seek_scale = Entry()
+        self.trend = Trend()
+
+
+class Renderer:
+    """
+    Keeps the last grid drawn instead of drawing it.
+    """
+
+    def setup(self, occupied, has_rumor):
+        self.shown = has_rumor.copy()
+
+    def draw(self, occupied, has_rumor):
+        self.shown = has_rumor.copy()
+
+
+@pytest.fixture
+def renderer(monkeypatch):
+    monkeypatch.setattr(replay, 'make_renderer', lambda canvas, shape, render_mode: Renderer())
+
+
+def record(path, generations, every):
+    """
+    Records a run, and returns who heard the rumor as each generation began.
+    """
+    simulation = Simulation(VECTOR_ENGINE)
+    simulation.reset(Params(0.8, 1, 0.6, 0.2, 0.1, 0.1, generations, 'R', 30, 30), 3)
+    simulation.record(str(path), every)
+    frames = {}
+    while simulation.generation < generations and simulation.stop_reason is None:
+        frames[simulation.generation + 1] = simulation.rumor_grid()[1].copy()
+        simulation.step()
+    simulation.clear()
+    return frames
+
+
+def test_seek_shows_last_frame_at_or_before(renderer, tmp_path):
+    path = tmp_path / 'run.rec'
+    frames = record(path, 12, every=3)
+    player = Replay(App())
+    player.open(str(path))
+    assert player.generation == 1
+    assert np.array_equal(player.renderer.shown, frames[1])
+
+    for generation, shown in ((8, 7), (10, 10), (2, 1), (100, player.last_generation), (0, 1)):
+        player.seek(generation)
+        assert player.generation == shown
+        assert player.app.generation.value == shown
+        assert np.array_equal(player.renderer.shown, frames[shown])
+
+
+def test_open_empty_recording(renderer, tmp_path):
+    path = tmp_path / 'empty.rec'
+    Recorder(str(path), np.ones((4, 5), dtype=bool)).close()
+    player = Replay(App())
+    with pytest.raises(ValueError, match='recording has no frames'):
+        player.open(str(path))
+    assert not player.is_open
@@ -0,0 +1,21 @@
+import pytest
+
+from simulation import VECTOR_ENGINE, Params, Simulation, replicate_seed, run_replicates
+
+GENERATIONS = 30
+
+
+@pytest.mark.parametrize('params', [
+    Params(0.6, 2, 0.3, 0.25, 0.2, 0.25, GENERATIONS, 'R', 40, 30),
+    Params(0.35, 0, 0.5, 0.3, 0.2, 0, GENERATIONS, 'S', 30, 30),
+])
+def test_replicate_matches_single_run(params):
+    seeds = [replicate_seed(3, k) for k in range(5)]
+    trand = run_replicates(params, seeds, GENERATIONS)
+    assert trand.shape == (len(seeds), GENERATIONS)
+    for k, seed in enumerate(seeds):
+        simulation = Simulation(VECTOR_ENGINE)
+        simulation.reset(params, seed)
+        single = simulation.run()
+        # A single run stops once absorbed; the batch keeps its last count.
+        assert trand[k].tolist() == single + single[-1:] * (GENERATIONS - len(single))
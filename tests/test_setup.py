@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from population import count_neighbors, ranked_skepticism, striped_skepticism
+
+
+def ranked_loop(degree, counts):
+    """
+    The ranking of the per-person set_slow: the persons with the most
+    neighbours first, S4 down to S1, the S1 persons being the candidates.
+    """
+    left = list(counts)
+    skepticism = [1] * len(degree)
+    candidates = []
+    for person in sorted(range(len(degree)), key=lambda person: -degree[person]):
+        for code in (4, 3, 2, 1):
+            if left[code - 1] > 0:
+                left[code - 1] -= 1
+                skepticism[person] = code
+                if code == 1:
+                    candidates.append(person)
+                break
+    return skepticism, candidates
+
+
+def striped_loop(i, j, counts):
+    """
+    The stripes of the per-person set_fast: the persons by position, each
+    turn of 4 taking the first level of its priority that has persons left.
+    """
+    priorities = ((1, 4, 2, 3), (4, 2, 3, 1), (2, 3, 1, 4), (3, 1, 4, 2))
+    left = list(counts)
+    skepticism = [3] * len(i)
+    for turn, person in enumerate(sorted(range(len(i)), key=lambda person: (i[person], j[person]))):
+        for code in priorities[turn % 4]:
+            if left[code - 1] > 0:
+                left[code - 1] -= 1
+                skepticism[person] = code
+                break
+    return skepticism
+
+
+def persons(shape, density, seed):
+    rng = np.random.default_rng(seed)
+    n = int(shape[0] * shape[1] * density)
+    i, j = np.divmod(rng.choice(shape[0] * shape[1], n, replace=False), shape[1])
+    return i, j
+
+
+MIXES = [(0.5, 0.3, 0.2, 0), (0.3, 0.25, 0.2, 0.25), (0.1, 0.1, 0.7, 0.1), (0.2, 0.2, 0.2, 0.2), (0, 0, 0, 1)]
+
+
+@pytest.mark.parametrize('density', [0.05, 0.6, 0.9])
+@pytest.mark.parametrize('mix', MIXES)
+def test_ranking_matches_loop(density, mix):
+    shape = (37, 41)
+    i, j = persons(shape, density, 1)
+    degree = count_neighbors(i, j, shape)
+    counts = [int(i.size * share) for share in mix]
+    skepticism, candidates = ranked_skepticism(degree, counts)
+    expected, expected_candidates = ranked_loop(degree.tolist(), counts)
+    assert skepticism.tolist() == expected
+    assert candidates.tolist() == expected_candidates
+
+
+@pytest.mark.parametrize('density', [0.05, 0.6, 0.9])
+@pytest.mark.parametrize('mix', MIXES)
+def test_stripes_match_loop(density, mix):
+    shape = (37, 41)
+    i, j = persons(shape, density, 2)
+    counts = [int(i.size * share) for share in mix]
+    assert striped_skepticism(i, j, shape, counts).tolist() == striped_loop(i.tolist(), j.tolist(), counts)
+
+
+@pytest.mark.parametrize('density', [0.05, 0.6])
+def test_neighbour_counts_match_loop(density):
+    shape = (37, 41)
+    i, j = persons(shape, density, 3)
+    cells = set(zip(i.tolist(), j.tolist()))
+    expected = [sum((a + di, b + dj) in cells for di in (-1, 0, 1) for dj in (-1, 0, 1) if di or dj)
+                for a, b in zip(i.tolist(), j.tolist())]
+    assert count_neighbors(i, j, shape).tolist() == expected
@@ -0,0 +1,50 @@
+import pytest
+
+from simulation import ABSORBED, FLAT, GENERATION_LIMIT, OBJECT_ENGINE, VECTOR_ENGINE, Params, Simulation
+
+GENERATIONS = 60
+
+
+def full_run(engine, params, seed):
+    """
+    Steps a simulation through every generation, whether it stopped or not.
+    """
+    simulation = Simulation(engine)
+    simulation.reset(params, seed)
+    for _ in range(GENERATIONS):
+        simulation.step()
+    return simulation.trand
+
+
+@pytest.mark.parametrize('engine', [OBJECT_ENGINE, VECTOR_ENGINE])
+def test_absorbed_run_is_prefix_of_full_run(engine):
+    params = Params(0.3, 0, 0.3, 0.25, 0.2, 0.25, GENERATIONS, 'R', 30, 30)
+    simulation = Simulation(engine)
+    simulation.reset(params, 0)
+    trand = simulation.run()
+    assert simulation.stop_reason == ABSORBED
+    assert len(trand) < GENERATIONS
+    full = full_run(engine, params, 0)
+    assert full[:len(trand)] == trand
+    assert set(full[len(trand):]) == {trand[-1]}
+
+
+@pytest.mark.parametrize('engine', [OBJECT_ENGINE, VECTOR_ENGINE])
+def test_flat_run_stops_after_window(engine):
+    params = Params(0.6, 5, 0.3, 0.25, 0.2, 0.25, GENERATIONS, 'R', 30, 30)
+    simulation = Simulation(engine, flat_window=3)
+    simulation.reset(params, 1)
+    trand = simulation.run()
+    assert simulation.stop_reason == FLAT
+    assert len(set(trand[-4:])) == 1
+    assert full_run(engine, params, 1)[:len(trand)] == trand
+
+
+def test_run_stops_at_limit_and_goes_on():
+    params = Params(0.8, 2, 0.7, 0.2, 0.1, 0, GENERATIONS, 'R', 30, 30)
+    simulation = Simulation(VECTOR_ENGINE)
+    simulation.reset(params, 1)
+    assert len(simulation.run(10)) == 10
+    assert simulation.stop_reason == GENERATION_LIMIT
+    assert simulation.run(GENERATIONS) == full_run(VECTOR_ENGINE, params, 1)
+    assert simulation.stop_reason == GENERATION_LIMIT
@@ -0,0 +1,59 @@
+import csv
+import multiprocessing
+import os
+
+import pytest
+
+import sweep
+
+TASKS = sweep.make_tasks([0.6], [0, 2], [(0.5, 0.3, 0.2, 0)], ['R'], 2, 10)
+
+
+def quiet(message):
+    pass
+
+
+def results(path):
+    """
+    Reads the rows of a results file, without the run times.
+    """
+    with open(path, newline='') as f:
+        return sorted(tuple(value for column, value in row.items() if column != 'seconds')
+                      for row in csv.DictReader(f))
+
+
+def crash_replicate_1(task):
+    """
+    Runs a task like sweep.run_task, but kills the worker on replicate 1.
+    """
+    if task[2] == 1:
+        os._exit(1)
+    return RUN_TASK(task)
+
+
+RUN_TASK = sweep.run_task
+
+
+def test_interrupted_sweep_continues(tmp_path):
+    whole = str(tmp_path / 'whole.csv')
+    sweep.sweep(TASKS, whole, workers=2, report=quiet)
+
+    # The interrupted sweep wrote the row of its first run only.
+    part = str(tmp_path / 'part.csv')
+    sweep.sweep(TASKS[:1], part, workers=2, report=quiet)
+    finished, _ = sweep.sweep(TASKS, part, workers=2, report=quiet)
+    assert finished == len(TASKS) - 1
+    assert results(part) == results(whole)
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason='the workers must see the patched run_task')
+def test_sweep_skips_run_that_kills_its_worker(tmp_path, monkeypatch):
+    monkeypatch.setattr(sweep, 'run_task', crash_replicate_1)
+    messages = []
+    path = str(tmp_path / 'sweep.csv')
+    finished, _ = sweep.sweep(TASKS, path, workers=2, report=messages.append)
+
+    healthy = [task for task in TASKS if task[2] != 1]
+    assert finished == len(healthy)
+    assert sweep.finished_keys(path) == {sweep.task_key(*task) for task in healthy}
+    assert sum('skipped' in message for message in messages) == len(TASKS) - len(healthy)
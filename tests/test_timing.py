@@ -0,0 +1,52 @@
+import csv
+
+import pytest
+
+from simulation import VECTOR_ENGINE, Params, Simulation
+from timing import Timing
+
+
+def read_csv(path):
+    with open(path, newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_export_rows_per_generation(tmp_path):
+    timing = Timing(True, keep=2)
+    timing.add('setup', 5.0)
+    for generation, (spread, draw) in enumerate([(1.0, 0.5), (2.0, None), (3.0, 0.25)], 1):
+        timing.begin_generation()
+        timing.add('spread', spread)
+        if draw is not None:
+            timing.add('draw', draw)
+        timing.add('spread', 0.5)
+        timing.end_generation(generation)
+
+    path = tmp_path / 'phases.csv'
+    timing.export(path)
+    # Only the last two generations are kept, and the set-up is not in them.
+    assert read_csv(path) == [['generation', 'spread', 'draw'], ['2', '2.5', '0.0'], ['3', '3.5', '0.25']]
+
+    path = tmp_path / 'summary.csv'
+    timing.export_summary(path)
+    rows = read_csv(path)
+    assert rows[0] == ['phase', 'calls', 'total', 'mean', 'max']
+    assert [(name, int(calls), float(total), float(mean), float(longest))
+            for name, calls, total, mean, longest in rows[1:]] == [
+        ('spread', 6, 7.5, 1.25, 3.0), ('setup', 1, 5.0, 5.0, 5.0), ('draw', 2, 0.75, 0.375, 0.5)]
+
+
+def test_simulation_export_matches_totals(tmp_path):
+    simulation = Simulation(VECTOR_ENGINE)
+    simulation.timing = Timing(True)
+    simulation.reset(Params(0.8, 1, 0.6, 0.2, 0.1, 0.1, 30, 'R', 50, 50), 5)
+    simulation.run()
+
+    path = tmp_path / 'phases.csv'
+    simulation.timing.export(path)
+    rows = read_csv(path)
+    header, rows = rows[0], rows[1:]
+    assert header[0] == 'generation' and not any(name.startswith('setup') for name in header)
+    assert [int(row[0]) for row in rows] == list(range(1, simulation.generation + 1))
+    for column, name in enumerate(header[1:], 1):
+        assert sum(float(row[column]) for row in rows) == pytest.approx(simulation.timing.totals[name])
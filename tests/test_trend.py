@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from trend import TrendBuffer
+
+
+@pytest.mark.parametrize('count', [1, 7, 8, 9, 16, 17, 100, 1000])
+def test_buffer_keeps_every_stride_point(count):
+    buffer = TrendBuffer(capacity=8)
+    for generation in range(count):
+        buffer.append(generation, 2 * generation)
+
+    assert buffer.size <= 8
+    kept = np.arange(0, count, buffer.stride)
+    assert np.array_equal(buffer.x[:buffer.size], kept)
+    assert np.array_equal(buffer.y[:buffer.size], 2 * kept)
+    # The stride is the smallest that fits the points in the buffer.
+    assert buffer.stride == 1 or -(-count // (buffer.stride // 2)) > 8
+
+    x, y = buffer.data()
+    assert x[-1] == count - 1 and y[-1] == 2 * (count - 1)
+    assert np.array_equal(x[:buffer.size], kept)
+    assert len(x) == buffer.size + (kept[-1] != count - 1)
+
+
+def test_empty_buffer():
+    x, y = TrendBuffer().data()
+    assert x.size == 0 and y.size == 0
@@ -0,0 +1,487 @@
+import itertools
+import multiprocessing
+import os
+import threading
+import weakref
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from engine import EMPTY, NEIGHBOURHOOD, STATE_ARRAYS, VectorEngine, deliver
+from timing import OFF
+
+# Words of the control block, written by the engine before each generation.
+COMMAND, STATE_HIGH, STATE_LOW, INC_HIGH, INC_LOW, HAS_UINT32, UINTEGER, DRAWS = range(8)
+
+# Commands of the control block.
+STEP = 1
+STOP = 2
+
+# Columns of the results block, one row per tile.
+INFECTED, ACTIVE = range(2)
+
+# Directions of the halo exchange, the third axis of the halo buffers.
+UP, DOWN = range(2)
+
+# The shared arrays through which the engine and the tiles talk, as opposed
+# to the state arrays.
+EXCHANGE_ARRAYS = ('control', 'results', 'halo', 'sent', 'inside')
+
+MASK = (1 << 64) - 1
+
+# Seconds between two checks that the tiles, or the engine, are still alive.
+POLL = 0.1
+
+# Seconds a tile waits for the others within a generation before giving up, so
+# a tile that hangs cannot block the others forever.
+WAIT_TIMEOUT = 600
+
+# Seconds the tiles get to stop before they are terminated.
+STOP_TIMEOUT = 10
+
+
+def share(arrays, blocks, name, shape, dtype):
+    """
+    Creates an array in a new shared memory block.
+    :param arrays: dict the array is added to.
+    :param blocks: dict the block is added to.
+    :param name: key of the array in both dicts.
+    :param shape: shape of the array.
+    :param dtype: type of the array.
+    :return: the array, filled with zeros.
+    """
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    block = SharedMemory(create=True, size=max(nbytes, 1))
+    blocks[name] = block
+    arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    arrays[name][...] = 0
+    return arrays[name]
+
+
+def attach(layout):
+    """
+    Opens shared memory blocks created by another process.
+    :param layout: dict of (block name, shape, dtype) for each array.
+    :return: (arrays, blocks) -- dicts keyed like layout.
+    """
+    arrays = {}
+    blocks = {}
+    for name, (block_name, shape, dtype) in layout.items():
+        blocks[name] = SharedMemory(name=block_name)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=blocks[name].buf)
+    return arrays, blocks
+
+
+def release(arrays, blocks, unlink=True):
+    """
+    Closes shared memory blocks, and removes them unless other processes still
+    use them.
+    :param arrays: dict of the arrays in the blocks; it is emptied, since a
+    block cannot be closed while arrays use it.
+    :param blocks: dict of the blocks; it is emptied.
+    :param unlink: True to remove the blocks.
+    :return: None.
+    """
+    arrays.clear()
+    for block in blocks.values():
+        block.close()
+        if unlink:
+            block.unlink()
+    blocks.clear()
+
+
+def stop_tiles(processes, channel):
+    """
+    Stops the processes of a TiledEngine and removes the exchange arrays.
+    Tiles that do not stop in time are terminated.
+    :param processes: list of the tile processes; it is emptied.
+    :param channel: dict with the engine's semaphores, barrier, arrays and
+    blocks.
+    :return: None.
+    """
+    if not processes:
+        return
+    arrays = channel['arrays']
+    blocks = channel['blocks']
+    arrays['control'][COMMAND] = STOP
+    for _ in processes:
+        channel['go'].release()
+    for process in processes:
+        process.join(STOP_TIMEOUT)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+    processes.clear()
+    release({name: arrays.pop(name) for name in EXCHANGE_ARRAYS},
+            {name: blocks.pop(name) for name in EXCHANGE_ARRAYS})
+
+
+def shutdown(processes, channel):
+    """
+    Stops the processes of a TiledEngine and removes all its shared memory. It
+    is a function, not a method, so it can run when the engine is collected.
+    :param processes: list of the tile processes; it is emptied.
+    :param channel: dict with the engine's semaphores, barrier, arrays and
+    blocks.
+    :return: None.
+    """
+    stop_tiles(processes, channel)
+    release(channel['arrays'], channel['blocks'])
+
+
+def serve(layout, shape, L, tile, bounds, go, done, wave):
+    """
+    Entry point of a tile process, see Tile.
+    """
+    Tile(layout, shape, L, tile, bounds, go, done, wave).run()
+
+
+class Tile:
+    """
+    This class advances one horizontal band of the grid of a TiledEngine, in
+    its own process. Every generation follows VectorEngine.step on the rows
+    of the band, in the same waves as the other tiles: deliveries to the row
+    above or below the band go to the neighbouring tile through its halo
+    buffer, and each tile takes its random numbers from the point of the
+    shared random stream where the deliveries of the tiles above it end, as
+    the whole grid would in one VectorEngine.
+
+    No wait is unbounded: a tile stops once the engine's process is gone, and
+    gives up a generation when another tile does not join a wave in time.
+    """
+
+    def __init__(self, layout, shape, L, tile, bounds, go, done, wave):
+        """
+        Tile constructor.
+        :param layout: see attach().
+        :param shape: grid dimensions.
+        :param L: number of generations a person waits after spreading.
+        :param tile: number of the tile, counted from the top.
+        :param bounds: int array, the first padded row of each tile and the
+        end of the last.
+        :param go: Semaphore released by the engine once per tile at the
+        beginning of each generation.
+        :param done: Semaphore released by each tile at the end of each
+        generation.
+        :param wave: Barrier of the tiles, passed within a generation.
+        :return: Tile object.
+        """
+        self.arrays, self.blocks = attach(layout)
+        self.L = L
+        self.tile = tile
+        self.tiles = len(bounds) - 1
+        self.go = go
+        self.done = done
+        self.wave = wave
+        columns = shape[1] + 2
+        self.offsets = np.array([di * columns + dj for di, dj in NEIGHBOURHOOD])
+        self.start = int(bounds[tile]) * columns  # Flat index of the first cell of the band.
+        self.stop = int(bounds[tile + 1]) * columns
+        self.spread = np.zeros(self.stop - self.start, dtype=bool)  # Scratch of propagate().
+        self.bit_generator = np.random.PCG64()
+
+    def run(self):
+        """
+        Advances a generation each time the engine asks for one, until it asks
+        to stop, its process is gone, or the generation is given up.
+        :return: None.
+        """
+        engine = multiprocessing.parent_process()
+        try:
+            while True:
+                while not self.go.acquire(timeout=POLL):
+                    if engine is not None and not engine.is_alive():
+                        return
+                if self.arrays['control'][COMMAND] == STOP:
+                    return
+                self.step()
+                self.done.release()
+        except threading.BrokenBarrierError:
+            pass  # A tile died or hung; the engine raises the error.
+        finally:
+            release(self.arrays, self.blocks, unlink=False)
+
+    def state(self):
+        """
+        Reads the whole state of the random generator of the run, as the
+        engine copied it at the beginning of the generation.
+        :return: PCG64 state dict.
+        """
+        control = self.arrays['control']
+        return {'bit_generator': 'PCG64',
+                'state': {'state': int(control[STATE_HIGH]) << 64 | int(control[STATE_LOW]),
+                          'inc': int(control[INC_HIGH]) << 64 | int(control[INC_LOW])},
+                'has_uint32': int(control[HAS_UINT32]), 'uinteger': int(control[UINTEGER])}
+
+    def step(self):
+        """
+        Advances the band by one generation, see VectorEngine.step.
+        :return: None.
+        """
+        arrays = self.arrays
+        start, stop = self.start, self.stop
+        has_rumor = arrays['has_rumor'].ravel()
+        is_spreading = arrays['is_spreading'].ravel()
+        wait_to_spread = arrays['wait_to_spread'].ravel()
+        cooldown = arrays['cooldown'].ravel()
+        results = arrays['results']
+
+        results[self.tile, INFECTED] = np.count_nonzero(has_rumor[start:stop])
+
+        # Persons that spread lately wait L generations (check_spread).
+        waiting = np.flatnonzero(wait_to_spread[start:stop]) + start
+        blocked = waiting[cooldown[waiting] > 0]
+        cooldown[blocked] -= 1
+        is_spreading[blocked] = False
+        wait_to_spread[waiting] = False
+        wait_to_spread[blocked] = True
+
+        drawn = self.propagate(np.flatnonzero(is_spreading[start:stop]) + start)
+
+        # init the received_rumor_from for all persons.
+        arrays['received'].ravel()[start:stop] = 0
+        results[self.tile, ACTIVE] = is_spreading[start:stop].any() or wait_to_spread[start:stop].any()
+        if self.tile == 0:
+            arrays['control'][DRAWS] = drawn
+
+    def propagate(self, fire):
+        """
+        Runs the spreading waves of a generation on the band, in step with the
+        other tiles, see VectorEngine.propagate.
+        :param fire: flat indices of the persons of the band spreading at their
+        turn.
+        :return: number of random numbers drawn by all the tiles.
+        """
+        arrays = self.arrays
+        start, stop = self.start, self.stop
+        skepticism = arrays['skepticism'].ravel()
+        turn = arrays['turn'].ravel()
+        has_rumor = arrays['has_rumor'].ravel()
+        is_spreading = arrays['is_spreading'].ravel()
+        wait_to_spread = arrays['wait_to_spread'].ravel()
+        cooldown = arrays['cooldown'].ravel()
+        received = arrays['received'].ravel()
+
+        state = self.state()
+        spread_lists = []
+        drawn = 0
+        # Waves alternate between two sets of exchange buffers, so a tile may
+        # fill those of the next wave while its neighbours still read those of
+        # this one, and a single barrier per wave is enough: a tile cannot get
+        # two waves ahead of the others.
+        for wave in itertools.count():
+            halo = arrays['halo'][wave % 2]
+            sent = arrays['sent'][wave % 2]
+            inside_counts = arrays['inside'][wave % 2]
+
+            self.spread[fire - start] = True
+            spread_lists.append(fire)
+            wait_to_spread[fire] = True
+            cooldown[fire] = self.L
+            is_spreading[fire] = False
+
+            # Deliver the rumor to the occupied neighbours of the spreaders;
+            # those outside the band are sent to the tile they belong to.
+            sources = np.repeat(fire, self.offsets.size)
+            targets = (fire[:, None] + self.offsets).ravel()
+            occupied = skepticism[targets] != EMPTY
+            targets = targets[occupied]
+            turns = turn[sources[occupied]].astype(np.int64)
+            for direction, outside in ((UP, targets < start), (DOWN, targets >= stop)):
+                count = np.count_nonzero(outside)
+                halo[self.tile, direction, 0, :count] = targets[outside]
+                halo[self.tile, direction, 1, :count] = turns[outside]
+                sent[self.tile, direction] = count
+            inside = (targets >= start) & (targets < stop)
+            targets = [targets[inside]]
+            turns = [turns[inside]]
+            inside_counts[self.tile] = targets[0].size
+            self.wave.wait(WAIT_TIMEOUT)
+
+            # No delivery anywhere convinces nobody: the generation is over.
+            draws = inside_counts.copy()
+            draws[1:] += sent[:-1, DOWN]
+            draws[:-1] += sent[1:, UP]
+            if not draws.any():
+                break
+            for tile, direction in ((self.tile - 1, DOWN), (self.tile + 1, UP)):
+                if 0 <= tile < self.tiles:
+                    count = sent[tile, direction]
+                    targets.append(halo[tile, direction, 0, :count])
+                    turns.append(halo[tile, direction, 1, :count])
+            targets = np.concatenate(targets)
+            turns = np.concatenate(turns)
+
+            # The deliveries of the whole grid draw their random numbers in
+            # the order of their targets, so the tiles above come first.
+            self.bit_generator.state = state
+            self.bit_generator.advance(drawn + int(draws[:self.tile].sum()))
+            generator = np.random.Generator(self.bit_generator)
+            drawn += int(draws.sum())
+            receivers, convinced, convinced_at = deliver(targets, turns, skepticism, received,
+                                                         lambda targets: generator.random(targets.size))
+            has_rumor[receivers] = True
+            before_turn = convinced_at < turn[convinced]
+
+            # Convinced after their turn: they spread next generation.
+            is_spreading[convinced[~before_turn]] = True
+            # Convinced before their turn: they spread in this generation,
+            # unless they are still waiting or spread already.
+            early = convinced[before_turn]
+            fire = early[~wait_to_spread[early] & ~self.spread[early - start]]
+
+        for fire in spread_lists:
+            self.spread[fire - start] = False
+        return drawn
+
+
+class TiledEngine(VectorEngine):
+    """
+    This class advances the automat like VectorEngine, with the same results
+    for the same random generator, but splits the grid into horizontal tiles
+    advanced in parallel by worker processes (see Tile). The state arrays are
+    in shared memory blocks, so the tiles work on the grid in place; each
+    tile writes only its own rows and reads the rows next to it. Within a
+    generation the tiles spread in the same waves as VectorEngine, passing
+    the deliveries that cross a tile border through halo buffers in shared
+    memory, and the random numbers keep the order of the whole grid.
+
+    The processes start with the first step, and stop with close(). If a tile
+    process dies during a step, the others are stopped and the step raises a
+    RuntimeError instead of waiting for it.
+    """
+
+    def __init__(self, shape, L, rng=None, tiles=None):
+        """
+        Engine constructor, see VectorEngine.
+        :param tiles: number of tiles, defaults to the number of cores, or to
+        1 within a worker process (of a sweep, for example), whose siblings
+        use the other cores already.
+        :return: TiledEngine object.
+        """
+        if tiles is None:
+            tiles = (os.cpu_count() or 1) if multiprocessing.parent_process() is None else 1
+        self.tiles = max(min(tiles, shape[0]), 1)
+        self.processes = []
+        self.channel = {'arrays': {}, 'blocks': {}, 'go': None, 'done': None, 'wave': None}
+        self.finalizer = weakref.finalize(self, shutdown, self.processes, self.channel)
+        super().__init__(shape, L, rng)
+
+    def allocate(self, padded):
+        """
+        Creates the state arrays, see VectorEngine, in shared memory.
+        :param padded: shape of the arrays, including the border.
+        :return: None.
+        """
+        super().allocate(padded)
+        self.adopt({name: getattr(self, '_' + name) for name in self.state_arrays})
+
+    def adopt(self, arrays):
+        """
+        Copies state arrays, for example arrays memory-mapped from a
+        checkpoint, into shared memory, in place of the engine's own.
+        :param arrays: dict with an array for each name in state_arrays.
+        :return: None.
+        """
+        self.close()
+        old = dict(self.channel)
+        shared = self.channel['arrays'] = {}
+        blocks = self.channel['blocks'] = {}
+        for name in STATE_ARRAYS:
+            share(shared, blocks, name, arrays[name].shape, arrays[name].dtype)[...] = arrays[name]
+        super().adopt(shared)
+        release(old['arrays'], old['blocks'])
+
+    def start(self):
+        """
+        Creates the exchange buffers and starts a process for each tile.
+        :return: None.
+        """
+        context = multiprocessing.get_context()
+        shared = self.channel['arrays']
+        blocks = self.channel['blocks']
+        capacity = 3 * self.padded[1]  # Deliveries from a row to the next.
+        share(shared, blocks, 'control', (DRAWS + 1,), np.uint64)
+        share(shared, blocks, 'results', (self.tiles, 2), np.int64)
+        share(shared, blocks, 'halo', (2, self.tiles, 2, 2, capacity), np.int64)
+        share(shared, blocks, 'sent', (2, self.tiles, 2), np.int64)
+        share(shared, blocks, 'inside', (2, self.tiles), np.int64)
+        layout = {name: (block.name, shared[name].shape, shared[name].dtype.str) for name, block in blocks.items()}
+
+        bounds = np.linspace(1, self.padded[0] - 1, self.tiles + 1).astype(int)
+        # The engine keeps the semaphores and the barrier: their shared state
+        # would be reused by other locks once no object of this process refers
+        # to them.
+        go = self.channel['go'] = context.Semaphore(0)
+        done = self.channel['done'] = context.Semaphore(0)
+        wave = self.channel['wave'] = context.Barrier(self.tiles)
+        for tile in range(self.tiles):
+            process = context.Process(target=serve, daemon=True,
+                                      args=(layout, self.shape, self.L, tile, bounds, go, done, wave))
+            process.start()
+            self.processes.append(process)
+
+    def close(self):
+        """
+        Stops the tile processes. The state stays readable until the engine
+        is collected, or new state is adopted.
+        :return: None.
+        """
+        stop_tiles(self.processes, self.channel)
+
+    def check(self):
+        """
+        Makes sure every tile process is alive during a step. Otherwise the
+        barrier of the waves is broken, so the other tiles give up the
+        generation, and the processes are stopped.
+        :return: None.
+        """
+        for tile, process in enumerate(self.processes):
+            if not process.is_alive():
+                self.channel['wave'].abort()
+                self.close()
+                raise RuntimeError('Tile %d of the tiled engine stopped with exit code %s.'
+                                   % (tile, process.exitcode))
+
+    @property
+    def absorbed(self):
+        if not self.processes:
+            return super().absorbed
+        return not self.channel['arrays']['results'][:, ACTIVE].any()
+
+    def step(self, timing=OFF):
+        """
+        Advances the engine by one generation, in all the tiles at once.
+        :param timing: Timing to record the phases of the generation in.
+        :return: number of persons who heard the rumor before the spreading.
+        """
+        if not self.processes:
+            self.start()
+        arrays = self.channel['arrays']
+        control = arrays['control']
+        bit_generator = self.rng.bit_generator
+        state = bit_generator.state
+
+        with timing.phase('spread'):
+            control[COMMAND] = STEP
+            control[STATE_HIGH] = state['state']['state'] >> 64
+            control[STATE_LOW] = state['state']['state'] & MASK
+            control[INC_HIGH] = state['state']['inc'] >> 64
+            control[INC_LOW] = state['state']['inc'] & MASK
+            control[HAS_UINT32] = state['has_uint32']
+            control[UINTEGER] = state['uinteger']
+            for _ in range(self.tiles):
+                self.channel['go'].release()
+            for _ in range(self.tiles):
+                while not self.channel['done'].acquire(timeout=POLL):
+                    self.check()
+
+        with timing.phase('count'):
+            infected = int(arrays['results'][:, INFECTED].sum())
+        # advance() drops the half of a 64-bit draw kept for the next 32-bit
+        # one, which the draws of VectorEngine leave alone, so it is restored.
+        bit_generator.advance(int(control[DRAWS]))
+        advanced = bit_generator.state
+        advanced.update(has_uint32=state['has_uint32'], uinteger=state['uinteger'])
+        bit_generator.state = advanced
+        return infected
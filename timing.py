@@ -0,0 +1,191 @@
+import csv
+import time
+from collections import deque
+
+import numpy as np
+
+
+class Phase:
+    """
+    Times one phase of a Timing: use it in a with statement.
+    """
+
+    __slots__ = ('timing', 'name', 'start')
+
+    def __init__(self, timing, name):
+        self.timing = timing
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timing.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class NoPhase:
+    """
+    Stands for a Phase when the timing is off, doing nothing.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_PHASE = NoPhase()
+
+
+class Timing:
+    """
+    This class records the wall time spent in each phase of a run, such as the
+    spreading or the drawing, in total and for each generation. It is off
+    unless enabled; while off, timing a phase costs one call that does nothing.
+
+        with timing.phase('spread'):
+            ...
+
+    A Timing is not shared between threads: a phase timed by one thread would
+    count in the generation another thread is running.
+    """
+
+    def __init__(self, enabled=False, keep=None):
+        """
+        Timing constructor.
+        :param enabled: True to record the phases.
+        :param keep: number of generations whose rows are kept, the latest
+        ones, or None to keep them all. The totals count every generation.
+        :return: Timing object.
+        """
+        self.enabled = enabled
+        self.keep = keep
+        self.totals = {}  # Seconds spent in each phase.
+        self.calls = {}  # Times each phase was timed.
+        self.longest = {}  # Longest time of each phase, in seconds.
+        self.generations = deque(maxlen=keep)  # The generations with a row in rows.
+        self.rows = deque(maxlen=keep)  # Seconds spent in each phase in a generation.
+        self.current = {}  # Seconds spent in each phase in this generation.
+
+    def phase(self, name):
+        """
+        Times a phase, see the class.
+        :param name: name of the phase.
+        :return: context manager.
+        """
+        if self.enabled:
+            return Phase(self, name)
+        return NO_PHASE
+
+    def add(self, name, seconds):
+        """
+        Counts time spent in a phase.
+        :param name: name of the phase.
+        :param seconds: wall time.
+        :return: None.
+        """
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.longest[name] = max(self.longest.get(name, 0.0), seconds)
+        self.current[name] = self.current.get(name, 0.0) + seconds
+
+    def begin_generation(self):
+        """
+        Starts counting the phases of a generation; what was timed since the
+        last generation, such as the set-up, counts only in the totals.
+        :return: None.
+        """
+        self.current = {}
+
+    def end_generation(self, generation):
+        """
+        Keeps the phases timed since begin_generation() as the row of a
+        generation.
+        :param generation: generation number.
+        :return: None.
+        """
+        if self.enabled:
+            self.generations.append(generation)
+            self.rows.append(self.current)
+        self.current = {}
+
+    def clear(self):
+        """
+        Forgets everything recorded so far.
+        :return: None.
+        """
+        self.totals = {}
+        self.calls = {}
+        self.longest = {}
+        self.generations = deque(maxlen=self.keep)
+        self.rows = deque(maxlen=self.keep)
+        self.current = {}
+
+    @property
+    def phases(self):
+        return list(self.totals)
+
+    def series(self, name):
+        """
+        Returns the time spent in a phase in each generation whose row is
+        kept.
+        :param name: name of the phase.
+        :return: float array of seconds, aligned with self.generations.
+        """
+        return np.array([row.get(name, 0.0) for row in self.rows])
+
+    def summary(self):
+        """
+        Sums up each phase.
+        :return: list of (phase, calls, total, mean, longest) rows, in seconds,
+        the slowest phase first.
+        """
+        rows = [(name, self.calls[name], total, total / self.calls[name], self.longest[name])
+                for name, total in list(self.totals.items())]
+        return sorted(rows, key=lambda row: -row[2])
+
+    def table(self):
+        """
+        Formats the summary as a text table, times in milliseconds.
+        :return: str.
+        """
+        lines = ['%-20s %8s %12s %10s %10s' % ('phase', 'calls', 'total ms', 'mean ms', 'max ms')]
+        for name, calls, total, mean, longest in self.summary():
+            lines.append('%-20s %8d %12.2f %10.4f %10.4f' % (name, calls, total * 1e3, mean * 1e3, longest * 1e3))
+        return '\n'.join(lines)
+
+    def export(self, path):
+        """
+        Writes the time of each phase in each generation to a CSV file, one row
+        per generation, times in seconds. Phases outside the generations, such
+        as the set-up, are only in the summary.
+        :param path: path of the CSV file.
+        :return: None.
+        """
+        phases = [name for name in self.phases if any(name in row for row in self.rows)]
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['generation'] + phases)
+            for generation, row in zip(self.generations, self.rows):
+                writer.writerow([generation] + [row.get(name, 0.0) for name in phases])
+
+    def export_summary(self, path):
+        """
+        Writes the summary to a CSV file, one row per phase, times in seconds.
+        :param path: path of the CSV file.
+        :return: None.
+        """
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['phase', 'calls', 'total', 'mean', 'max'])
+            writer.writerows(self.summary())
+
+
+# A Timing that is always off, the default of the functions that take one.
+OFF = Timing()
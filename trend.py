@@ -0,0 +1,170 @@
+import numpy as np
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.figure import Figure
+
+from style import palette
+
+# Most points kept for the chart. Past it, every other point is dropped, so a
+# run of any length is drawn with at most this many points.
+CAPACITY = 2048
+
+# Generations shown on the chart at first; the axis doubles when they run out.
+INITIAL_SPAN = 100
+
+
+class TrendBuffer:
+    """
+    This class keeps the points of the trend chart in fixed-size arrays. It
+    keeps one generation out of every stride, and when the arrays fill up it
+    drops every other point and doubles the stride, so adding a point costs the
+    same however long the run is.
+    """
+
+    def __init__(self, capacity=CAPACITY):
+        """
+        TrendBuffer constructor.
+        :param capacity: most points kept, an even number.
+        :return: TrendBuffer object.
+        """
+        self.x = np.empty(capacity)
+        self.y = np.empty(capacity)
+        self.size = 0
+        self.stride = 1
+        self.count = 0  # Points added, kept or not.
+        self.last = None  # The newest point, kept or not.
+
+    def append(self, x, y):
+        """
+        Adds a point.
+        :return: None.
+        """
+        if self.count % self.stride == 0:
+            if self.size == self.x.size:
+                half = self.size // 2
+                self.x[:half] = self.x[:self.size:2]
+                self.y[:half] = self.y[:self.size:2]
+                self.size = half
+                self.stride *= 2
+            if self.count % self.stride == 0:
+                self.x[self.size] = x
+                self.y[self.size] = y
+                self.size += 1
+        self.count += 1
+        self.last = (x, y)
+
+    def data(self):
+        """
+        Returns the points to draw: the kept ones and the newest one.
+        :return: (x, y) -- two float arrays.
+        """
+        x = self.x[:self.size]
+        y = self.y[:self.size]
+        if self.last is not None and (self.size == 0 or x[-1] != self.last[0]):
+            x = np.append(x, self.last[0])
+            y = np.append(y, self.last[1])
+        return x, y
+
+
+class TrendPlot:
+    """
+    This class draws the percentage of persons who heard the rumor per
+    generation in a chart embedded in the app, updated as the run goes. Only
+    the line is redrawn on an update (blitting), over a saved picture of the
+    axes, which are redrawn only when the generation axis runs out and doubles.
+    """
+
+    def __init__(self, master, width, height):
+        """
+        TrendPlot constructor.
+        :param master: the parent of the tk object.
+        :param width: width of the chart in pixels.
+        :param height: height of the chart in pixels.
+        :return: TrendPlot object.
+        """
+        dpi = 100
+        self.figure = Figure(figsize=(width / dpi, height / dpi), dpi=dpi, facecolor=palette.bg)
+        self.axes = self.figure.add_subplot()
+        self.axes.set_facecolor(palette.canvas_bg)
+        self.axes.set_ylim(0, 100)
+        self.axes.set_xlabel('Generation', color=palette.fg)
+        self.axes.set_ylabel('% heard', color=palette.fg)
+        self.axes.tick_params(colors=palette.fg)
+        self.figure.subplots_adjust(left=0.07, right=0.99, top=0.95, bottom=0.25)
+        self.line, = self.axes.plot([], [], color=palette.red, animated=True)
+
+        self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+        self.widget = self.canvas.get_tk_widget()
+        self.background = None
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+
+        self.buffer = TrendBuffer()
+        self.n_persons = 1
+        self.reset(1)
+
+    def on_draw(self, event):
+        """
+        Saves the picture of the axes after a full draw, for blitting.
+        """
+        self.background = self.canvas.copy_from_bbox(self.axes.bbox)
+        self.axes.draw_artist(self.line)
+
+    def reset(self, n_persons):
+        """
+        Empties the chart for a new run.
+        :param n_persons: number of persons, for the percentages.
+        :return: None.
+        """
+        self.buffer = TrendBuffer()
+        self.n_persons = max(n_persons, 1)
+        self.line.set_data([], [])
+        self.axes.set_xlim(1, INITIAL_SPAN)
+        self.background = None
+        self.canvas.draw_idle()
+
+    def extend(self, first_generation, counts):
+        """
+        Adds the numbers of persons who heard the rumor in some generations,
+        and redraws the line.
+        :param first_generation: generation of counts[0].
+        :param counts: numbers of persons who heard the rumor.
+        :return: None.
+        """
+        if not len(counts):
+            return
+        for generation, count in enumerate(counts, first_generation):
+            self.buffer.append(generation, count * 100 / self.n_persons)
+        self.line.set_data(*self.buffer.data())
+        self.update()
+
+    def show(self, generations, counts):
+        """
+        Shows a whole run at once, as for a recording.
+        :param generations: the generation of each count.
+        :param counts: numbers of persons who heard the rumor.
+        :return: None.
+        """
+        step = max(-(-len(generations) // CAPACITY), 1)
+        self.line.set_data(generations[::step], np.asarray(counts[::step]) * 100 / self.n_persons)
+        self.axes.set_xlim(1, max(int(generations[-1]), 2) if len(generations) else INITIAL_SPAN)
+        self.background = None
+        self.canvas.draw_idle()
+
+    def update(self):
+        """
+        Redraws the line, or the whole chart if the generations outgrew the
+        axis.
+        :return: None.
+        """
+        x, y = self.line.get_data()
+        start, end = self.axes.get_xlim()
+        if len(x) and x[-1] > end:
+            while x[-1] > end:
+                end *= 2
+            self.axes.set_xlim(start, end)
+            self.background = None
+        if self.background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self.background)
+        self.axes.draw_artist(self.line)
+        self.canvas.blit(self.axes.bbox)